@@ -0,0 +1,53 @@
+""" Compare loading a grammar saved with mlangpy.binary against parsing it again.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_binary.py
+
+Loading should be a few times quicker than fused LALR(1) parsing and orders of magnitude quicker than Earley, and
+reading a single rule from a GrammarFile should take the same time however large the grammar is.
+"""
+
+import os
+import tempfile
+import time
+
+from mlangpy import binary
+from mlangpy.metaparsers import parse_ABNF
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEATS = [1, 10, 100]
+
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def main():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        print(f'{"rules":>7} {"text (KiB)":>11} {"file (KiB)":>11} {"earley (ms)":>12} {"lalr (ms)":>10} '
+              f'{"load (ms)":>10} {"one rule (us)":>14}')
+        for repeat in REPEATS:
+            text = open(SAMPLE).read() * repeat
+            metalanguage, earley = timed(lambda: parse_ABNF(text))
+            _, lalr = timed(lambda: parse_ABNF(text, parser='lalr', fused=True))
+
+            with open(path, 'wb') as f:
+                binary.dump(metalanguage, f)
+            _, load = timed(lambda: binary.load(path))
+
+            with binary.GrammarFile(path) as f:
+                _, one_rule = timed(lambda: f[len(f) // 2])
+
+            print(f'{len(metalanguage.ruleset):7} {len(text) / 1024:11.1f} {os.path.getsize(path) / 1024:11.1f} '
+                  f'{earley * 1000:12.1f} {lalr * 1000:10.1f} {load * 1000:10.1f} {one_rule * 1e6:14.1f}')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+""" Measure how fast convert_files() converts a corpus of ABNF grammars to EBNF, with different numbers of workers.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_convert.py
+
+The corpus is the sample ABNF grammars, copied many times over. Each worker compiles its parser once, so with more
+than one CPU the files and rules converted a second should grow with the number of workers.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from mlangpy.batch import convert_files
+
+SAMPLES = 'sample_grammars/abnfs'
+COPIES = 40
+WORKERS = [1, 2, 4]
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for copy in range(COPIES):
+            for name in sorted(os.listdir(SAMPLES)):
+                path = os.path.join(directory, f'{copy}_{name}')
+                shutil.copyfile(os.path.join(SAMPLES, name), path)
+                paths.append(path)
+
+        print(f'{"workers":>7} {"files":>6} {"rules":>6} {"files/s":>8} {"rules/s":>8}')
+        for workers in WORKERS:
+            start = time.perf_counter()
+            results = list(convert_files(paths, 'abnf', 'ebnf', os.path.join(directory, 'out'), workers=workers,
+                                         parser='lalr', force=True))
+            elapsed = time.perf_counter() - start
+            rules = sum(result.rules for result in results if result.ok)
+            print(f'{workers:7} {len(results):6} {rules:6} {len(results) / elapsed:8.1f} {rules / elapsed:8.1f}')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+""" Measure how long desugar() takes as a grammar grows, and how many helper rules it makes.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_desugar.py
+
+desugar() goes over the ruleset once, and looks helpers up in a dict, so its time should grow linearly with the
+number of rules. The grammar is repeated, so the number of helpers shouldn't grow at all.
+"""
+
+import time
+
+from mlangpy.metaparsers import parse_ABNF
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEATS = [1, 10, 100, 1000]
+
+
+def main():
+    print(f'{"rules":>7} {"desugar (ms)":>13} {"helpers":>8}')
+    for repeat in REPEATS:
+        ml = parse_ABNF(open(SAMPLE).read() * repeat, parser='lalr', fused=True)
+        rules = len(ml.ruleset)
+
+        start = time.perf_counter()
+        helpers = ml.desugar()
+        elapsed = time.perf_counter() - start
+
+        print(f'{rules:7} {elapsed * 1000:13.1f} {helpers:8}')
+
+
+if __name__ == '__main__':
+    main()
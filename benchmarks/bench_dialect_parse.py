@@ -0,0 +1,47 @@
+""" Compare parsing grammars with a parser generated from a Metalanguage's syntax (metaparsers.parse_dialect) against
+the fused LALR(1) parsers of the bundled grammars.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_dialect_parse.py
+
+Both build the Ruleset as they parse, so a dialect should parse about as fast as a bundled metalanguage.
+"""
+
+import time
+
+from mlangpy.metaparsers import parse_BNF, parse_EBNF, parse_RBNF, parse_dialect
+
+SAMPLES = [
+    ('bnf', parse_BNF, 'sample_grammars/bnfs/algol.txt'),
+    ('ebnf', parse_EBNF, 'sample_grammars/ebnfs/ebnf_if.txt'),
+    ('rbnf', parse_RBNF, 'sample_grammars/rbnfs/pathmessage.txt'),
+]
+REPEATS = 500
+
+
+def best_of(function, *args, runs=3):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print(f'{"grammar":>8} {"rules":>6} {"bundled (ms)":>13} {"dialect (ms)":>13}')
+    for name, parse_method, path in SAMPLES:
+        metalanguage = parse_method(open(path).read(), parser='lalr')
+        metalanguage.normalise()
+        text = (str(metalanguage.ruleset) + '\n') * REPEATS
+        rules = len(parse_dialect(text, metalanguage).ruleset)
+
+        bundled = best_of(lambda: parse_method(text, parser='lalr', fused=True))
+        dialect = best_of(lambda: parse_dialect(text, metalanguage))
+        print(f'{name:>8} {rules:6} {bundled * 1000:13.1f} {dialect * 1000:13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+""" Compare the peak memory and time of writing a Ruleset out as one string against Ruleset.write.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_export.py
+
+str() builds the whole grammar in memory before any of it is written, while Ruleset.write only holds on to its buffer
+and the rule it's working on, so its peak memory should stay flat as the grammar grows.
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+from mlangpy.metaparsers import parse_ABNF
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEATS = [10, 100, 1000]
+
+
+def measure(write):
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'w') as f:
+            tracemalloc.start()
+            start = time.perf_counter()
+            write(f)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        os.remove(path)
+    return elapsed, peak
+
+
+def main():
+    print(f'{"rules":>7} {"str (ms)":>9} {"str peak (KiB)":>15} {"write (ms)":>11} {"write peak (KiB)":>17}')
+    for repeat in REPEATS:
+        ruleset = parse_ABNF(open(SAMPLE).read() * repeat, parser='lalr', fused=True).ruleset
+
+        str_time, str_peak = measure(lambda f: f.write(str(ruleset)))
+        write_time, write_peak = measure(ruleset.write)
+
+        print(f'{len(ruleset):7} {str_time * 1000:9.1f} {str_peak / 1024:15.1f} {write_time * 1000:11.1f} '
+              f'{write_peak / 1024:17.1f}')
+
+
+if __name__ == '__main__':
+    main()
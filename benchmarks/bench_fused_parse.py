@@ -0,0 +1,55 @@
+""" Compare building a Metalanguage from a parse tree with building it while parsing (fused=True).
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_fused_parse.py
+
+Each sample grammar is repeated so that the timings aren't dominated by per-call overhead.
+"""
+
+import time
+import tracemalloc
+
+from mlangpy.metaparsers import parse_ABNF, parse_BNF, parse_EBNF, parse_RBNF, warm_parsers
+
+SAMPLES = [
+    ('sample_grammars/abnfs/abnf_self_define.txt', parse_ABNF),
+    ('sample_grammars/abnfs/core_abnf.txt', parse_ABNF),
+    ('sample_grammars/ebnfs/ebnf_self_define_no_comments.txt', parse_EBNF),
+    ('sample_grammars/bnfs/ant2.txt', parse_BNF),
+    ('sample_grammars/rbnfs/pathmessage.txt', parse_RBNF),
+]
+REPEAT = 50
+
+
+def measure(parse_method, text, **kwargs):
+    """ Returns (seconds, peak bytes) for a single parse. """
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse_method(text, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Time again without tracemalloc, which slows allocation down considerably
+    start = time.perf_counter()
+    parse_method(text, **kwargs)
+    return min(elapsed, time.perf_counter() - start), peak
+
+
+def main():
+    warm_parsers(['bnf_lalr', 'abnf_lalr', 'ebnf', 'rbnf_lalr'], parser='lalr')
+    print(f'{"grammar":45} {"mode":>6} {"time (s)":>10} {"peak (KiB)":>12}')
+
+    for path, parse_method in SAMPLES:
+        text = '\n'.join([open(path).read()] * REPEAT) + '\n'
+        tree_time, tree_peak = measure(parse_method, text, parser='lalr')
+        fused_time, fused_peak = measure(parse_method, text, parser='lalr', fused=True)
+
+        print(f'{path.split("/")[-1] + f" x{REPEAT}":45} {"tree":>6} {tree_time:10.3f} {tree_peak / 1024:12.0f}')
+        print(f'{"":45} {"fused":>6} {fused_time:10.3f} {fused_peak / 1024:12.0f}'
+              f'   ({1 - fused_time / tree_time:.0%} faster, {1 - fused_peak / tree_peak:.0%} less memory)')
+
+
+if __name__ == '__main__':
+    main()
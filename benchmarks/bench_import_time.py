@@ -0,0 +1,50 @@
+""" Time how long it takes to import parts of mlangpy in a fresh interpreter.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_import_time.py
+
+Importing everything from mlangpy.metalanguages is what importing any one metalanguage used to cost, and importing
+mlangpy.metaparsers shows the cost of loading lark.
+"""
+
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    'import mlangpy.grammar',
+    'from mlangpy.metalanguages.ABNF import ABNF',
+    'from mlangpy.metalanguages import *',
+    'import mlangpy.metaparsers',
+]
+RUNS = 15
+
+SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, 'lark' in sys.modules, sum(name.startswith('mlangpy') for name in sys.modules))
+'''
+
+
+def measure(statement):
+    """ Returns (median seconds, whether lark was imported, number of mlangpy modules imported). """
+    times = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, '-c', SCRIPT.format(statement=statement)], check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+        times.append(float(output[0]))
+    return statistics.median(times), output[1] == 'True', int(output[2])
+
+
+def main():
+    print(f'{"statement":45} {"time (ms)":>10} {"lark":>6} {"modules":>8}')
+    for statement in STATEMENTS:
+        elapsed, lark, modules = measure(statement)
+        print(f'{statement:45} {elapsed * 1000:10.1f} {"yes" if lark else "no":>6} {modules:8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+""" Compare parsing with and without interning symbols (parse_*(..., intern=True)).
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_interning.py
+
+Each sample grammar is repeated, so that its names repeat the way they do in large real grammars, and parsed with
+the fused LALR(1) parser. The time is the best of a few runs, and the memory is what's still allocated once parsing
+has finished (i.e. the Metalanguage and everything in it).
+"""
+
+import gc
+import time
+import tracemalloc
+
+from mlangpy.metaparsers import parse_ABNF, parse_BNF, parse_EBNF, parse_RBNF, warm_parsers
+
+SAMPLES = [
+    ('sample_grammars/abnfs/abnf_self_define.txt', parse_ABNF),
+    ('sample_grammars/abnfs/core_abnf.txt', parse_ABNF),
+    ('sample_grammars/ebnfs/ebnf_self_define_no_comments.txt', parse_EBNF),
+    ('sample_grammars/bnfs/ant2.txt', parse_BNF),
+    ('sample_grammars/rbnfs/pathmessage.txt', parse_RBNF),
+]
+REPEAT = 200
+RUNS = 3
+
+
+def retained(parse_method, text, intern):
+    """ Returns the bytes still allocated after parsing text. """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    metalanguage = parse_method(text, parser='lalr', fused=True, intern=intern)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del metalanguage
+    return after - before
+
+
+def best_time(parse_method, text, intern):
+    times = []
+    for _ in range(RUNS):
+        gc.collect()
+        start = time.perf_counter()
+        parse_method(text, parser='lalr', fused=True, intern=intern)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    warm_parsers(['bnf_lalr', 'abnf_lalr', 'ebnf', 'rbnf_lalr'], parser='lalr')
+    print(f'{"grammar":45} {"intern":>7} {"seconds":>9} {"KiB":>9}')
+
+    for path, parse_method in SAMPLES:
+        text = '\n'.join([open(path).read()] * REPEAT) + '\n'
+        results = {}
+        for intern in (False, True):
+            results[intern] = best_time(parse_method, text, intern), retained(parse_method, text, intern)
+
+        name = path.split('/')[-1] + f' x{REPEAT}'
+        for intern, (seconds, size) in results.items():
+            print(f'{name if not intern else "":45} {"on" if intern else "off":>7} {seconds:9.3f} {size / 1024:9.0f}',
+                  end='')
+            if intern:
+                (off_seconds, off_size) = results[False]
+                print(f'   ({1 - seconds / off_seconds:.0%} faster, {1 - size / off_size:.0%} less memory)', end='')
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+""" Measure how long it takes to wrap a Ruleset in a Metalanguage as the ruleset grows.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_metalanguage_init.py
+
+Metalanguages share their rules with the Ruleset they're made from until they change them, so this should take the
+same time however many rules (and nodes) there are. Normalising, which changes every rule, is shown for comparison,
+along with normalising again, which finds everything is already in the right form and copies nothing.
+"""
+
+import time
+
+from mlangpy.metaparsers import parse_ABNF
+from mlangpy.metalanguages import EBNF, Metalanguage
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEATS = [1, 10, 100, 1000]
+RUNS = 100
+
+
+def main():
+    print(f'{"rules":>7} {"init (us)":>10} {"normalise (ms)":>15} {"again (ms)":>11}')
+    for repeat in REPEATS:
+        ruleset = parse_ABNF(open(SAMPLE).read() * repeat, parser='lalr', fused=True).ruleset
+
+        start = time.perf_counter()
+        for _ in range(RUNS):
+            EBNF(ruleset)
+        init = (time.perf_counter() - start) / RUNS
+
+        ml = Metalanguage(ruleset)
+        start = time.perf_counter()
+        ml.normalise()
+        normalise = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ml.normalise()
+        again = time.perf_counter() - start
+
+        print(f'{len(ruleset):7} {init * 1e6:10.1f} {normalise * 1000:15.1f} {again * 1000:11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+""" Compare the memory used by a Ruleset with a PackedGrammar of the same rules, and the time it takes to walk them.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_packed.py
+
+The packed grammar should use several times less memory, and walking it (counting references to each symbol) should
+be quicker than walking the objects, since no Python object is touched for each node.
+"""
+
+import time
+import tracemalloc
+from collections import Counter
+
+from mlangpy.grammar import Symbol
+from mlangpy.metaparsers import parse_ABNF
+from mlangpy.packed import pack
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEATS = [10, 100, 1000]
+
+
+def measured(f):
+    """ The result of f, how long it takes, and how much memory it's left allocated. Tracing memory slows everything
+    down, so it's timed separately. """
+    start = time.perf_counter()
+    f()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = f()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def count_objects(ruleset):
+    counts = Counter()
+    stack = list(ruleset)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Symbol):
+            counts[node.subject] += 1
+        elif isinstance(node, list):
+            stack += node
+        else:
+            stack += [getattr(node, name) for name in ('left', 'right', 'middle', 'subject', 'terms')
+                      if hasattr(node, name)]
+    return counts
+
+
+def count_packed(packed):
+    counts = Counter(s for s in packed.symbols if s >= 0)
+    return Counter({packed.symbol_table[s][1]: n for s, n in counts.items()})
+
+
+def main():
+    print(f'{"rules":>7} {"nodes":>8} {"objects (KiB)":>14} {"packed (KiB)":>13} {"pack (ms)":>10} '
+          f'{"walk objects (ms)":>18} {"walk packed (ms)":>17}')
+    for repeat in REPEATS:
+        text = open(SAMPLE).read() * repeat
+        ruleset, _, objects_size = measured(lambda: parse_ABNF(text, parser='lalr', fused=True).ruleset)
+        packed, pack_time, packed_size = measured(lambda: pack(ruleset))
+
+        start = time.perf_counter()
+        count_objects(ruleset)
+        walk_objects = time.perf_counter() - start
+
+        start = time.perf_counter()
+        count_packed(packed)
+        walk_packed = time.perf_counter() - start
+
+        print(f'{len(ruleset):7} {packed.node_count:8} {objects_size / 1024:14.1f} {packed_size / 1024:13.1f} '
+              f'{pack_time * 1000:10.1f} {walk_objects * 1000:18.1f} {walk_packed * 1000:17.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+""" Compare normalising a large ruleset in this process with normalising it in a pool of worker processes.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_parallel_normalise.py
+
+Every rule changes, so every rule has to be sent back from the workers, which costs about as much as normalising it.
+The pool should only come out ahead with several cores per worker's share of that cost.
+"""
+
+import os
+import time
+
+from mlangpy.metaparsers import parse_ABNF
+from mlangpy.metalanguages import Metalanguage, RBNF
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEATS = [100, 1000]
+
+
+def main():
+    workers = [None] + [n for n in (2, 4, 8) if n <= (os.cpu_count() or 1) * 2]
+    print(f'{"rules":>7} ' + ' '.join(f'{f"workers={n or 1} (s)":>15}' for n in workers))
+    for repeat in REPEATS:
+        ruleset = parse_ABNF(open(SAMPLE).read() * repeat, parser='lalr', fused=True).ruleset
+        syntax = RBNF(ruleset).syntax
+
+        times = []
+        for n in workers:
+            ml = Metalanguage(ruleset)
+            ml.syntax = syntax
+            start = time.perf_counter()
+            ml.normalise(workers=n)
+            times.append(time.perf_counter() - start)
+
+        print(f'{len(ruleset):7} ' + ' '.join(f'{t:15.2f}' for t in times))
+
+
+if __name__ == '__main__':
+    main()
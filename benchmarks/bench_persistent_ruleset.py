@@ -0,0 +1,61 @@
+""" Measure the memory taken by many versions of a grammar, kept as full copies and as PersistentRulesets.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_persistent_ruleset.py
+
+Each new version changes one term of one rule. Full copies are made with copy.deepcopy, as a Ruleset's versions
+would have to be; PersistentRuleset versions share everything but the changed rule's path to the term.
+"""
+
+import copy
+import gc
+import tracemalloc
+
+from mlangpy.grammar import NonTerminal, PersistentRuleset, replace_at
+from mlangpy.metaparsers import parse_ABNF
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEAT = 20
+VERSIONS = 20
+
+
+def measure(make_versions):
+    """ Returns the bytes still allocated by the versions make_versions() returns. """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    versions = make_versions()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del versions
+    return after - before
+
+
+def main():
+    ruleset = parse_ABNF(open(SAMPLE).read() * REPEAT, parser='lalr', fused=True).ruleset
+    rules = len(ruleset)
+
+    def copies():
+        versions = [ruleset]
+        for i in range(VERSIONS):
+            version = copy.deepcopy(versions[-1])
+            version[i % rules] = replace_at(version[i % rules], ('right', 0, 0), NonTerminal(f'v{i}'))
+            versions.append(version)
+        return versions
+
+    def persistent():
+        versions = [ruleset.freeze()]
+        for i in range(VERSIONS):
+            versions.append(versions[-1].replace(i % rules, ('right', 0, 0), NonTerminal(f'v{i}')))
+        return versions
+
+    print(f'{rules} rules, {VERSIONS} versions each changing one term')
+    full, shared = measure(copies), measure(persistent)
+    print(f'{"deepcopy":20} {full / 1024:10.0f} KiB')
+    print(f'{"PersistentRuleset":20} {shared / 1024:10.0f} KiB   ({shared / VERSIONS:.0f} bytes per version)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+""" Measure how much memory a parsed grammar takes up, per rule.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_rule_memory.py
+
+Each sample grammar is repeated and parsed, and the memory still allocated once parsing has finished (i.e. the
+Metalanguage and everything in it) is divided by the number of rules.
+"""
+
+import gc
+import tracemalloc
+
+from mlangpy.metaparsers import parse_ABNF, parse_BNF, parse_EBNF, parse_RBNF, warm_parsers
+
+SAMPLES = [
+    ('sample_grammars/abnfs/abnf_self_define.txt', parse_ABNF),
+    ('sample_grammars/abnfs/core_abnf.txt', parse_ABNF),
+    ('sample_grammars/ebnfs/ebnf_self_define_no_comments.txt', parse_EBNF),
+    ('sample_grammars/bnfs/ant2.txt', parse_BNF),
+    ('sample_grammars/rbnfs/pathmessage.txt', parse_RBNF),
+]
+REPEAT = 200
+
+
+def retained(parse_method, text):
+    """ Returns (bytes still allocated after parsing text, number of rules). """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    metalanguage = parse_method(text, parser='lalr', fused=True)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, len(metalanguage.ruleset.rules)
+
+
+def main():
+    warm_parsers(['bnf_lalr', 'abnf_lalr', 'ebnf', 'rbnf_lalr'], parser='lalr')
+    print(f'{"grammar":45} {"rules":>7} {"KiB":>9} {"bytes/rule":>11}')
+
+    for path, parse_method in SAMPLES:
+        text = '\n'.join([open(path).read()] * REPEAT) + '\n'
+        size, rules = retained(parse_method, text)
+        print(f'{path.split("/")[-1] + f" x{REPEAT}":45} {rules:7} {size / 1024:9.0f} {size / rules:11.0f}')
+
+
+if __name__ == '__main__':
+    main()
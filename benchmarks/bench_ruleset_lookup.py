@@ -0,0 +1,57 @@
+""" Measure how long Ruleset lookups take as the number of rules grows.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/bench_ruleset_lookup.py
+
+A sample grammar is repeated (with its rules renamed each time, so they're all different) and every rule is then
+looked up with find_rules, find_rules_named and rule_exists, along with a plain scan through the rules for
+comparison. With the index, the time per lookup should stay about the same however many rules there are.
+
+find_rules_for isn't included, since every copy of the grammar has the same right-hand sides and so the number of
+matches (and the time taken to return them) grows with the number of copies.
+"""
+
+import time
+
+from mlangpy.grammar import Ruleset, NonTerminal
+from mlangpy.metaparsers import parse_ABNF
+
+SAMPLE = 'sample_grammars/abnfs/abnf_self_define.txt'
+REPEATS = [1, 10, 100]
+
+
+def grammar(repeat):
+    rules = []
+    for i in range(repeat):
+        for rule in parse_ABNF(open(SAMPLE).read(), parser='lalr', fused=True).ruleset.rules:
+            rule.left[0] = NonTerminal(f'{rule.left[0].subject}-{i}')
+            rules.append(rule)
+    return Ruleset(rules)
+
+
+def main():
+    print(f'{"rules":>7} {"find_rules":>12} {"find_rules_named":>17} {"rule_exists":>12} {"scan":>10}   '
+          f'(microseconds per lookup)')
+    for repeat in REPEATS:
+        ruleset = grammar(repeat)
+        rules = list(ruleset.rules)
+        # Build the index first, which is timed separately
+        start = time.perf_counter()
+        ruleset.rule_exists(rules[0])
+        build = time.perf_counter() - start
+
+        timings = []
+        for lookup in (lambda r: ruleset.find_rules(r), lambda r: ruleset.find_rules_named(r.left),
+                       lambda r: ruleset.rule_exists(r), lambda r: [s for s in rules if s == r]):
+            start = time.perf_counter()
+            for rule in rules:
+                lookup(rule)
+            timings.append((time.perf_counter() - start) / len(rules) * 1e6)
+
+        print(f'{len(rules):7} {timings[0]:12.1f} {timings[1]:17.1f} {timings[2]:12.1f} {timings[3]:10.1f}   '
+              f'(index built in {build * 1000:.1f}ms)')
+
+
+if __name__ == '__main__':
+    main()
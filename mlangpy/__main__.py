@@ -0,0 +1,5 @@
+import sys
+
+from mlangpy.cli import main
+
+sys.exit(main())
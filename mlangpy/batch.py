@@ -0,0 +1,257 @@
+""" Parse (or convert) many grammar files at once, spread over a pool of worker processes.
+
+Each worker compiles the parser it needs once, when it starts, and then reuses it for every file it's given. A failure
+in one file is reported in that file's result rather than stopping the batch.
+"""
+
+import multiprocessing
+import os
+import pickle
+from collections import namedtuple
+
+from mlangpy.conversion import ConversionError, convert
+from mlangpy.metalanguages.Metalanguage import _open_for_writing
+from mlangpy.metaparsers import parse_BNF, parse_EBNF, parse_ABNF, parse_RBNF, warm_parsers, \
+    LALR_GRAMMARS, PARSERS
+
+
+PARSE_METHODS = {
+    'bnf': parse_BNF,
+    'ebnf': parse_EBNF,
+    'abnf': parse_ABNF,
+    'rbnf': parse_RBNF
+}
+
+
+class FileResult(namedtuple('FileResult', ['path', 'metalanguage', 'error'])):
+    """ The outcome of parsing one file.
+
+    Attributes:
+        path (str):                 The file that was parsed.
+        metalanguage (Metalanguage): The parsed grammar, or None if parsing failed.
+        error (FileError):          Why parsing failed, or None if it succeeded.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class FileError(namedtuple('FileError', ['type', 'message', 'line', 'column'])):
+    """ A description of an exception raised while parsing a file.
+
+    Lark's exceptions can't be sent between processes, so the parts that matter are copied into one of these instead.
+
+    Attributes:
+        type (str):     Name of the exception's class, e.g. 'UnexpectedCharacters'.
+        message (str):  The exception's message.
+        line (int):     Line the error was found on, if known.
+        column (int):   Column the error was found at, if known.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_exception(cls, e):
+        return cls(e.__class__.__name__, str(e), getattr(e, 'line', None), getattr(e, 'column', None))
+
+
+# Settings for the current worker process, set by _init_worker
+_worker_options = {}
+
+
+def _init_worker(metalanguage, parser, fused):
+    _worker_options.update(metalanguage=metalanguage, parser=parser, fused=fused)
+
+    if parser in ('earley', 'auto'):
+        warm_parsers([metalanguage])
+    if parser in ('lalr', 'auto'):
+        warm_parsers([LALR_GRAMMARS[metalanguage]], parser='lalr')
+
+
+def _parse_file(path):
+    parse_method = PARSE_METHODS[_worker_options['metalanguage']]
+    try:
+        with open(path) as f:
+            grammar_string = f.read()
+        metalanguage = parse_method(grammar_string, parser=_worker_options['parser'], fused=_worker_options['fused'])
+    except Exception as e:
+        return FileResult(path, None, FileError.from_exception(e))
+    return FileResult(path, metalanguage, None)
+
+
+def _parse_file_in_pool(path):
+    """ _parse_file, with its result pickled here rather than by the pool. A grammar that can't be pickled (say, one
+    whose syntax has a lambda in it) then fails on its own, rather than raising out of the pool's results and ending
+    the whole batch. """
+    result = _parse_file(path)
+    try:
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return pickle.dumps(FileResult(path, None, FileError.from_exception(e)), pickle.HIGHEST_PROTOCOL)
+
+
+def parse_files(paths, metalanguage, workers=None, parser='earley', fused=False, ordered=True):
+    """ Parse each of paths, yielding a FileResult for each one as it's finished.
+
+    Args:
+        paths (list):           Paths of the files to parse.
+        metalanguage (str):     'bnf', 'ebnf', 'abnf' or 'rbnf'.
+        workers (int):          Number of worker processes, os.cpu_count() by default. With 1 (or only one file),
+                                the files are parsed in this process instead.
+        parser (str):           'earley', 'lalr' or 'auto', see metaparsers.parse_*.
+        fused (bool):           See metaparsers.parse_*.
+        ordered (bool):         If True, results come back in the same order as paths (each one as soon as it and
+                                everything before it is done). If False, they come back in the order they finish.
+
+    Returns:
+        A generator of FileResult.
+    """
+    metalanguage = metalanguage.lower()
+    if metalanguage not in PARSE_METHODS:
+        raise ValueError(f'Unknown metalanguage {metalanguage!r}, expected one of {", ".join(PARSE_METHODS)}.')
+    if parser not in PARSERS:
+        raise ValueError(f'Unknown parser {parser!r}, expected one of {", ".join(PARSERS)}.')
+    if fused and parser == 'earley':
+        raise ValueError('Fused parsing is only available with the LALR(1) parser.')
+
+    paths = list(paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+    return _parse_files(paths, metalanguage, workers, parser, fused, ordered)
+
+
+def _parse_files(paths, metalanguage, workers, parser, fused, ordered):
+    if workers == 1:
+        _init_worker(metalanguage, parser, fused)
+        for path in paths:
+            yield _parse_file(path)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(metalanguage, parser, fused)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(_parse_file_in_pool, paths):
+            yield pickle.loads(result)
+
+
+def parse_directory(path, metalanguage, workers=None, parser='earley', fused=False, ordered=True):
+    """ Parse every file in the directory path, see parse_files.
+
+    Files are taken in name order and subdirectories are skipped.
+
+    Returns:
+        A generator of FileResult.
+    """
+    paths = [os.path.join(path, filename) for filename in sorted(os.listdir(path))]
+    return parse_files([p for p in paths if os.path.isfile(p)], metalanguage, workers=workers, parser=parser,
+                       fused=fused, ordered=ordered)
+
+
+class ConvertResult(namedtuple('ConvertResult', ['path', 'output', 'rules', 'error'])):
+    """ The outcome of converting one file.
+
+    Attributes:
+        path (str):         The file that was converted.
+        output (str):       The file the conversion was written to.
+        rules (int):        Number of rules in the converted grammar, or None if it failed (or was skipped).
+        error (FileError):  Why conversion failed, or None if it succeeded.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _init_converter(source, target, parser, desugar):
+    _init_worker(source, parser, parser == 'lalr')
+    _worker_options.update(target=target, desugar=desugar)
+    # Outputs are parsed back with the same parser
+    if parser in ('earley', 'auto'):
+        warm_parsers([target])
+    if parser in ('lalr', 'auto'):
+        warm_parsers([LALR_GRAMMARS[target]], parser='lalr')
+
+
+def _convert_file(paths):
+    path, output = paths
+    try:
+        with open(path) as f:
+            grammar_string = f.read()
+        parsed = PARSE_METHODS[_worker_options['metalanguage']](grammar_string, parser=_worker_options['parser'],
+                                                                fused=_worker_options['fused'])
+        target = _worker_options['target']
+        converted = convert(parsed, target, desugar=_worker_options['desugar'])
+        # Ended with a newline, which ABNF's last rule needs
+        text = str(converted.ruleset) + '\n'
+        # Only write what the target's parser reads back, so a grammar can't be changed without it being noticed
+        try:
+            PARSE_METHODS[target](text, parser=_worker_options['parser'])
+        except Exception as e:
+            raise ConversionError(f"The {target.upper()} it was converted to can't be parsed: {e}") from None
+        with _open_for_writing(output, True) as f:
+            f.write(text)
+    except Exception as e:
+        return ConvertResult(path, output, None, FileError.from_exception(e))
+    return ConvertResult(path, output, len(converted.ruleset), None)
+
+
+def convert_files(paths, source, target, directory, workers=None, parser='auto', desugar=False, force=False):
+    """ Convert each of paths from one metalanguage to another, writing the results to directory, and yield a
+    ConvertResult for each file as it's finished. Results come back in the same order as paths.
+
+    Each output is named after its source, with the target metalanguage as its extension (so grammar.abnf converted
+    to EBNF is written to grammar.ebnf). Grammars are converted by conversion.convert, so constructs the target can't
+    write, like ABNF's repetitions in EBNF, are desugared into helper rules, and names and terminals are respelled to
+    suit it. Each output is parsed back before it's written: a grammar with something in it the target can't write
+    fails with a ConversionError instead.
+
+    Args:
+        paths (list):       Paths of the files to convert.
+        source (str):       Metalanguage the files are written in: 'bnf', 'ebnf', 'abnf' or 'rbnf'.
+        target (str):       Metalanguage to convert them to.
+        directory (str):    Directory to write the converted files to, which is made if it doesn't exist.
+        workers (int):      Number of worker processes, os.cpu_count() by default. With 1 (or only one file), the
+                            files are converted in this process instead.
+        parser (str):       'earley', 'lalr' or 'auto', see metaparsers.parse_*.
+        desugar (bool):     If True, desugar every construct, rather than just those the target can't write.
+        force (bool):       If False, files whose output is newer than they are are skipped, and don't get a result.
+
+    Returns:
+        A generator of ConvertResult.
+    """
+    source = source.lower()
+    target = target.lower()
+    for metalanguage in (source, target):
+        if metalanguage not in PARSE_METHODS:
+            raise ValueError(f'Unknown metalanguage {metalanguage!r}, expected one of {", ".join(PARSE_METHODS)}.')
+    if parser not in PARSERS:
+        raise ValueError(f'Unknown parser {parser!r}, expected one of {", ".join(PARSERS)}.')
+
+    jobs = []
+    outputs = {}
+    for path in paths:
+        output = os.path.join(directory, os.path.splitext(os.path.basename(path))[0] + '.' + target)
+        if output in outputs:
+            raise ValueError(f'{path} and {outputs[output]} would both be converted to {output}.')
+        outputs[output] = path
+        if force or not os.path.exists(output) or os.path.getmtime(output) < os.path.getmtime(path):
+            jobs.append((path, output))
+
+    os.makedirs(directory, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+    return _convert_files(jobs, (source, target, parser, desugar), workers)
+
+
+def _convert_files(jobs, options, workers):
+    if workers == 1:
+        _init_converter(*options)
+        for job in jobs:
+            yield _convert_file(job)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_converter, initargs=options) as pool:
+        yield from pool.imap(_convert_file, jobs)
@@ -0,0 +1,513 @@
+""" A compact binary format for Rulesets and Metalanguages, which is much quicker to load than parsing the grammar again.
+
+Files are laid out in sections, with all integers little-endian:
+
+    header      b'MLPY', the format version and a reserved field (u16 each), then the number of entries (u32) in the
+                strings, classes, leaves and rules sections, and the offsets (u64) of those and the owner section.
+    strings     Every distinct string, once: (count + 1) u32 offsets into the UTF-8 data that follows them.
+    classes     Each class used, as u32 string indexes of its 'module:qualname' and each of its fields, after a u32
+                flag for whether it has a __dict__ and a u32 count of the fields.
+    leaves      Every distinct node without any child nodes (mostly symbols), once: (count + 1) u32 offsets into the
+                records that follow them.
+    rules       (count + 1) u64 offsets into the records that follow them, one record per rule, so that a single rule
+                can be read without reading any of the others.
+    owner       One record giving the class of the Ruleset, and of the Metalanguage, its syntax (apart from anything
+                that isn't a class) and its other settings if it was one.
+
+Records are values in prefix form: a tag byte followed by the value's contents, with unsigned integers written as
+variable-length (LEB128) integers. Nodes are a class index followed by a value for each of the class's fields.
+
+Only classes defined at the top level of a module can be saved. When loading, a class's module is checked before it's
+imported: only mlangpy's own modules and those passed to register_module are allowed. The class must then be a subclass
+of one of the grammar classes, Ruleset, PersistentRuleset or Metalanguage, so loading a file never imports a module or
+creates an object that the program hasn't said it trusts.
+"""
+
+import importlib
+import mmap
+import struct
+
+from mlangpy.grammar import Ruleset, PersistentRuleset, _StructuralHash, _slot_names
+from mlangpy.metalanguages.Metalanguage import Metalanguage
+
+
+MAGIC = b'MLPY'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHIIIIQQQQQ')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+# Value tags. Those up to _CLASS are followed by an unsigned integer.
+_STR, _LEAF, _INT, _NODE, _LIST, _DICT, _CLASS, _NONE, _FALSE, _TRUE, _UNSET = range(11)
+
+_SCALARS = (type(None), bool, int, str)
+_OWNERS = (Ruleset, PersistentRuleset, Metalanguage)
+
+
+class _Unset:
+    """ Stands in for a slot that has no value. """
+
+    def __repr__(self):
+        return '_UNSET_VALUE'
+
+
+_UNSET_VALUE = _Unset()
+
+
+def _has_dict(cls):
+    return any('__dict__' in vars(base) for base in cls.__mro__ if base is not object)
+
+
+def _node(cls, fields, values):
+    """ A new cls with values in its fields, made without calling __init__. """
+    node = _new(cls)
+    node._hash = None
+    for name, value in zip(fields, values):
+        if value is not _UNSET_VALUE:
+            _set(node, name, value)
+    return node
+
+
+_new = object.__new__
+# Skips _StructuralHash.__setattr__, which only matters once a node has been hashed
+_set = object.__setattr__
+
+
+def _write_uint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+class _Writer:
+    """ Builds the sections of a file, interning strings and leaves as it goes. """
+
+    def __init__(self):
+        self.strings = {}
+        # class: (index, fields, has_dict)
+        self.classes = {}
+        self.leaves = {}
+
+    def string(self, s):
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        return index
+
+    def class_info(self, cls):
+        info = self.classes.get(cls)
+        if info is None:
+            if '<locals>' in cls.__qualname__:
+                raise ValueError(f"{cls.__qualname__} can't be saved, since it isn't defined at the top level of a "
+                                 f"module.")
+            info = self.classes[cls] = (len(self.classes), _slot_names(cls), _has_dict(cls))
+            self.string(f'{cls.__module__}:{cls.__qualname__}')
+            for name in info[1]:
+                self.string(name)
+        return info
+
+    def record(self, value):
+        """ value in prefix form, see the module docstring. Written with an explicit stack, so nesting is only limited
+        by memory. """
+        out = bytearray()
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if not self._scalar(out, value):
+                stack += reversed(self._composite(out, value))
+        return bytes(out)
+
+    def _scalar(self, out, value):
+        """ Write value to out if it doesn't contain any other values, returning True if it was written. """
+        if value is None:
+            out.append(_NONE)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif value is _UNSET_VALUE:
+            out.append(_UNSET)
+        elif isinstance(value, str):
+            out.append(_STR)
+            # str() drops subclasses (e.g. Lark's Token), leaving just the text
+            _write_uint(out, self.string(str(value)))
+        elif isinstance(value, int):
+            out.append(_INT)
+            _write_uint(out, value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, type):
+            out.append(_CLASS)
+            _write_uint(out, self.class_info(value)[0])
+        else:
+            return False
+        return True
+
+    def _composite(self, out, value):
+        """ Write the start of value to out, returning the values it contains, which are written after it. """
+        if isinstance(value, list):
+            out.append(_LIST)
+            _write_uint(out, len(value))
+            return value
+
+        if isinstance(value, dict):
+            out.append(_DICT)
+            _write_uint(out, len(value))
+            return [item for pair in value.items() for item in pair]
+
+        if not isinstance(value, _StructuralHash):
+            raise ValueError(f"Can't save {value.__class__.__name__} objects.")
+
+        index, fields, has_dict = self.class_info(value.__class__)
+        values = [getattr(value, name, _UNSET_VALUE) for name in fields]
+        if has_dict:
+            values.append(value.__dict__)
+        elif all(isinstance(v, _SCALARS) or v is _UNSET_VALUE for v in values):
+            leaf = bytearray([_NODE])
+            _write_uint(leaf, index)
+            for v in values:
+                self._scalar(leaf, v)
+            leaf = bytes(leaf)
+            leaf_index = self.leaves.get(leaf)
+            if leaf_index is None:
+                leaf_index = self.leaves[leaf] = len(self.leaves)
+            out.append(_LEAF)
+            _write_uint(out, leaf_index)
+            return []
+
+        out.append(_NODE)
+        _write_uint(out, index)
+        return values
+
+
+def _table(entries, offset_format):
+    """ entries (bytes) preceded by the offset of each of them, and of the end, from the start of the first. """
+    table = bytearray()
+    position = 0
+    for entry in entries:
+        table += offset_format.pack(position)
+        position += len(entry)
+    table += offset_format.pack(position)
+    return bytes(table) + b''.join(entries)
+
+
+def dumps(obj):
+    """ Serialise a Ruleset, PersistentRuleset or Metalanguage.
+
+    Returns:
+        The serialised object as bytes, see load and GrammarFile.
+    """
+    if not isinstance(obj, _OWNERS):
+        raise ValueError(f'Expected a Ruleset, PersistentRuleset or Metalanguage, not {obj.__class__.__name__}.')
+
+    writer = _Writer()
+    if isinstance(obj, Metalanguage):
+        ruleset = obj.ruleset
+        settings = {name: value for name, value in vars(obj).items() if name != 'ruleset' and not name.startswith('_')}
+        # Functions in the syntax (like RBNF's) can't be saved, and are left to the Metalanguage's __init__ to set up
+        syntax = [c for pair in obj.syntax.items() if isinstance(pair[1], type) for c in pair]
+        owner = [ruleset.__class__, obj.__class__, syntax, settings]
+    else:
+        ruleset = obj
+        owner = [ruleset.__class__, None, None, None]
+
+    rules = [writer.record(rule) for rule in ruleset]
+    owner = writer.record(owner)
+    leaves = list(writer.leaves)
+
+    classes = bytearray()
+    for cls, (_, fields, has_dict) in writer.classes.items():
+        classes += _U32.pack(writer.strings[f'{cls.__module__}:{cls.__qualname__}'])
+        classes += _U32.pack(has_dict) + _U32.pack(len(fields))
+        for name in fields:
+            classes += _U32.pack(writer.strings[name])
+
+    sections = [
+        _table([s.encode('utf-8') for s in writer.strings], _U32),
+        bytes(classes),
+        _table(leaves, _U32),
+        _table(rules, _U64),
+        owner
+    ]
+    offsets = []
+    position = _HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(writer.strings), len(writer.classes), len(leaves), len(rules),
+                          *offsets)
+    return header + b''.join(sections)
+
+
+def dump(obj, file):
+    """ Write dumps(obj) to file, a binary file or any other object with a write(bytes) method. """
+    file.write(dumps(obj))
+
+
+# Modules besides mlangpy's own whose classes can be loaded, see register_module
+_modules = set()
+
+
+def register_module(name):
+    """ Allow saved grammars to use classes defined in a module other than mlangpy's, such as custom grammar classes.
+
+    Args:
+        name (str): The module's name, as in its classes' __module__. Its submodules are allowed as well.
+    """
+    _modules.add(name)
+
+
+def _allowed(module_name):
+    return any(module_name == allowed or module_name.startswith(allowed + '.') for allowed in ('mlangpy', *_modules))
+
+
+def _resolve(name):
+    """ The class called name ('module:qualname'), if it's one that can be loaded. """
+    module_name, _, qualname = name.partition(':')
+    if not _allowed(module_name):
+        raise ValueError(f'Saved class {name} is not from mlangpy or a module passed to register_module, so it was '
+                         f'not loaded.')
+    try:
+        value = importlib.import_module(module_name)
+        for part in qualname.split('.'):
+            value = getattr(value, part)
+    except (ImportError, AttributeError):
+        raise ValueError(f'Saved class {name} could not be found.')
+
+    if not (isinstance(value, type) and issubclass(value, (_StructuralHash,) + _OWNERS)):
+        raise ValueError(f'Saved class {name} is not a grammar class.')
+    return value
+
+
+class GrammarFile:
+    """ A saved Ruleset or Metalanguage, whose rules are only read when they're asked for.
+
+    Files are memory mapped, so opening one takes the same time however large it is, and only the parts of it that are
+    used are read from disk.
+
+    Args:
+        source:         Path of the file, or the bytes returned by dumps.
+        intern (bool):  If True, every occurrence of the same leaf (e.g. a symbol) is the same object, as with the
+                        intern option of metaparsers.parse_*. Otherwise each one is a separate object.
+
+    Attributes:
+        version (int):  The format version of the file.
+    """
+
+    def __init__(self, source, intern=False):
+        self._file = self._map = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._data = source
+        else:
+            self._file = open(source, 'rb')
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                self._map = b''
+            self._data = self._map
+
+        try:
+            self._read_header()
+        except BaseException:
+            self.close()
+            raise
+
+        self.intern = intern
+        self._strings = [None] * self._counts[0]
+        self._leaves = [None] * self._counts[2]
+        self._fields = {}
+        self._classes = self._read_classes()
+
+    def _read_header(self):
+        if len(self._data) < _HEADER.size:
+            raise ValueError('Not a saved grammar: the file is too short.')
+        magic, self.version, _, *rest = _HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise ValueError('Not a saved grammar: the file does not start with the right bytes.')
+        if self.version != VERSION:
+            raise ValueError(f'Saved grammar is format version {self.version}, expected {VERSION}.')
+        self._counts = rest[:4]
+        self._offsets = rest[4:]
+
+    def _read_classes(self):
+        classes = []
+        position = self._offsets[1]
+        for _ in range(self._counts[1]):
+            name, has_dict, count = struct.unpack_from('<III', self._data, position)
+            position += 12
+            fields = [self._string(i) for i in struct.unpack_from(f'<{count}I', self._data, position)]
+            position += 4 * count
+            cls = _resolve(self._string(name))
+            # Classes can only be saved if they're defined at the top level of a module, which also makes it
+            # possible for them to change between saving and loading
+            if tuple(fields) != _slot_names(cls) or bool(has_dict) != _has_dict(cls):
+                raise ValueError(f'The fields of {cls.__qualname__} have changed since the grammar was saved.')
+            classes.append((cls, fields, has_dict))
+            self._fields[cls] = fields
+        return classes
+
+    def _entry(self, section, offset_size, index):
+        """ The start and end of entry index of a section made by _table. """
+        unpack = _U32.unpack_from if offset_size == 4 else _U64.unpack_from
+        base = self._offsets[section]
+        table_start = base + offset_size * index
+        data_start = base + offset_size * (self._counts[section] + 1)
+        return data_start + unpack(self._data, table_start)[0], data_start + unpack(self._data, table_start +
+                                                                                          offset_size)[0]
+
+    def _string(self, index):
+        s = self._strings[index]
+        if s is None:
+            start, end = self._entry(0, 4, index)
+            s = self._strings[index] = str(self._data[start:end], 'utf-8')
+        return s
+
+    def _leaf(self, index):
+        leaf = self._leaves[index]
+        if leaf is None:
+            node = self._read(*self._entry(2, 4, index))
+            cls = node.__class__
+            fields = self._fields[cls]
+            # The first one read is kept to copy from, so changes made to the others don't affect it
+            leaf = self._leaves[index] = (node, cls, fields, [getattr(node, name, _UNSET_VALUE) for name in fields])
+        if self.intern:
+            return leaf[0]
+        return _node(*leaf[1:])
+
+    def _read(self, start, end):
+        """ The value whose record is data[start:end]. Read with an explicit stack, so nesting is only limited by
+        memory. """
+        data = bytes(self._data[start:end])
+        string = self._string
+        leaf = self._leaf
+        classes = self._classes
+        position = 0
+        # Lists, dicts and nodes still being read, as [values so far, number of values still to read, tag, class info]
+        stack = []
+        while True:
+            tag = data[position]
+            position += 1
+
+            if tag <= _CLASS:
+                n = data[position]
+                position += 1
+                if n >= 0x80:
+                    n &= 0x7f
+                    shift = 7
+                    while True:
+                        byte = data[position]
+                        position += 1
+                        n |= (byte & 0x7f) << shift
+                        if byte < 0x80:
+                            break
+                        shift += 7
+
+                if tag == _STR:
+                    value = string(n)
+                elif tag == _LEAF:
+                    value = leaf(n)
+                elif tag == _NODE:
+                    info = classes[n]
+                    stack.append([[], len(info[1]) + info[2], _NODE, info])
+                elif tag == _LIST:
+                    stack.append([[], n, _LIST, None])
+                elif tag == _INT:
+                    value = n >> 1 if not n & 1 else -((n + 1) >> 1)
+                elif tag == _DICT:
+                    stack.append([[], n * 2, _DICT, None])
+                else:
+                    value = classes[n][0]
+            elif tag == _NONE:
+                value = None
+            elif tag == _TRUE:
+                value = True
+            elif tag == _FALSE:
+                value = False
+            elif tag == _UNSET:
+                value = _UNSET_VALUE
+            else:
+                raise ValueError(f'Saved grammar is corrupt: unknown tag {tag} at {start + position - 1}.')
+
+            # Add the value to whatever it's part of, finishing that (and so on up) if it's complete. Empty lists,
+            # dicts and nodes are finished straight away.
+            if tag > _DICT or tag < _NODE:
+                if not stack:
+                    return value
+                frame = stack[-1]
+                frame[0].append(value)
+                frame[1] -= 1
+            while stack and not stack[-1][1]:
+                values, _, kind, info = stack.pop()
+                if kind == _NODE:
+                    cls, fields, has_dict = info
+                    value = _node(cls, fields, values)
+                    if has_dict:
+                        value.__dict__.update(values[-1])
+                elif kind == _LIST:
+                    value = values
+                else:
+                    value = dict(zip(values[::2], values[1::2]))
+                if not stack:
+                    return value
+                frame = stack[-1]
+                frame[0].append(value)
+                frame[1] -= 1
+
+    def __len__(self):
+        return self._counts[3]
+
+    def __getitem__(self, index):
+        """ Read rule index. Each call returns a new Rule object. """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Rule index out of range.')
+        return self._read(*self._entry(3, 8, index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def load(self):
+        """ Read the whole of the saved object.
+
+        Returns:
+            The Ruleset, PersistentRuleset or Metalanguage that was saved, equal to (but sharing nothing with) the one
+            passed to dump.
+        """
+        ruleset_class, metalanguage_class, syntax, settings = self._read(self._offsets[4], len(self._data))
+        ruleset = ruleset_class(list(self))
+        if metalanguage_class is None:
+            return ruleset
+
+        metalanguage = metalanguage_class(ruleset)
+        metalanguage.syntax.update(zip(syntax[::2], syntax[1::2]))
+        vars(metalanguage).update(settings)
+        return metalanguage
+
+    def close(self):
+        """ Close the file. Rules that have already been read are unaffected. """
+        if self._map is not None and not isinstance(self._map, bytes):
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._map = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def loads(data, intern=False):
+    """ Load an object from the bytes returned by dumps, see GrammarFile.load. """
+    return GrammarFile(data, intern=intern).load()
+
+
+def load(path, intern=False):
+    """ Load the object saved in the file path, see GrammarFile.load. """
+    with GrammarFile(path, intern=intern) as f:
+        return f.load()
@@ -0,0 +1,255 @@
+""" Transformers that build Metalanguage instances from the parse trees of the bundled Lark grammars.
+
+These are kept apart from mlangpy.metaparsers so that Lark is only imported once something is parsed.
+"""
+
+import threading
+
+from lark import Transformer, Discard
+from mlangpy.grammar import *
+from mlangpy.metalanguages.EBNF import *
+from mlangpy.metalanguages.RBNF import *
+from mlangpy.metalanguages.BNF import *
+from mlangpy.metalanguages.ABNF import *
+
+
+# The SymbolTable for the parse going on in this thread, if it's interning symbols. The builders are shared between
+# parses, so they find the table here rather than holding on to it.
+_interning = threading.local()
+
+
+def _symbol(cls, *args):
+    """ Make the symbol cls(*args), or fetch it from the current parse's SymbolTable if it has one. """
+    table = getattr(_interning, 'table', None)
+    if table is None:
+        return cls(*args)
+    return table.symbol(cls, *args)
+
+
+# TODO update for DefinitionLists
+class BuildBNF(Transformer):
+
+    def start(self, args):
+        return BNF(args[0])
+
+    def syntax(self, args):
+        return Ruleset(args)
+
+    def rule(self, args):
+        return BNFRule(args[0], args[1])
+
+    def elements(self, args):
+        return args[0]
+
+    def alternation(self, args):
+        return DefList(args)
+
+    def concatenation(self, args):
+        return Concat(args)
+
+    def element(self, args):
+        return args[0]
+
+    def non_terminal(self, args):
+        return _symbol(BNFNonTerminal, str(args[0]))
+
+    def terminal(self, args):
+        # "" is the empty string, since a STRING can't have quotes in it
+        return _symbol(BNFTerminal, '' if args[0].type == 'EMPTY_STRING' else str(args[0]))
+
+
+
+class BuildEBNF(Transformer):
+    """ Generate a metalanguages.EBNF.EBNF instance from a parse tree built using ebnf.lark. """
+
+    def start(self, args):
+        return EBNF(args[0])
+
+    def syntax(self, args):
+        return Ruleset([rule for rule in args if rule is not None])
+
+    def bracketed_textual_comment(self, args):
+        # Just drop comments for now. Lark doesn't accept Discard while parsing, which fused parsing relies on, so
+        # they're filtered out by syntax instead.
+        return None
+
+    def syntax_rule(self, args):
+        return EBNFRule(args[0], args[1])
+
+    def meta_id(self, args):
+        # Meta identifiers may contain spaces, so the token picks up any before the next symbol
+        return _symbol(EBNFNonTerminal, args[0].strip())
+
+    def definitions_list(self, args):
+        return DefList(args)
+
+    def single_definition(self, args):
+        return Concat(args)
+
+    def syntactic_term(self, args):
+        if len(args) == 2:
+            return Except(args[0], args[1])
+        return args[0]
+
+    def syntactic_exception(self, args):
+        return args[0]
+
+    def syntactic_factor(self, args):
+        if len(args) == 2:
+            return EBNFFixedRepetition(int(args[0]), args[1])
+        return args[0]
+
+    def syntactic_primary(self, args):
+        return args[0]
+
+    def terminal_string(self, args):
+        quote = args[0][0]
+        return _symbol(EBNFTerminal, args[0][1:-1], quote, quote)
+
+    def special_sequence(self, args):
+        return EBNFSpecialSequence(Concat([Terminal(args[0][1:-1])]))
+
+    def empty_sequence(self, args):
+        return _symbol(EBNFTerminal, '')
+
+    def optional_sequence(self, args):
+        return Optional(args[0])
+
+    def grouped_sequence(self, args):
+        return Group(args[0])
+
+    def repeated_sequence(self, args):
+        return EBNFRepetition(args[0])
+
+
+class BuildABNF(Transformer):
+    """ Generate a metalanguages.ABNF.ABNF instance from a parse tree built using abnf.lark. """
+
+    def start(self, args):
+        return ABNF(args[0])
+
+    def syntax(self, args):
+        return Ruleset(args)
+
+    def rule(self, args):
+        return ABNFRule(args[0], args[1])
+
+    def inc_rule(self, args):
+        return ABNFIncRule(args[0], args[1])
+
+    def rulename(self, args):
+        return _symbol(ABNFNonTerminal, str(args[0]))
+
+    def elements(self, args):
+        return args[0]
+
+    def alternation(self, args):
+        return ABNFDefList(args)
+
+    def concatenation(self, args):
+        return Concat(args)
+
+    def repetition(self, args):
+        return args[0]
+
+    def element(self, args):
+        return args[0]
+
+    def char_val(self, args):
+        return _symbol(ABNFTerminal, str(args[0]))
+
+    def num_val(self, args):
+        return args[0]
+
+    def hex_val(self, args):
+        return args[0]
+
+    def hex_single(self, args):
+        return _symbol(ABNFChar, 'x', str(args[0]))
+
+    def hex_range(self, args):
+        return ABNFCharRange(_symbol(ABNFChar, 'x', str(args[0])), _symbol(ABNFChar, 'x', str(args[1])))
+
+    def c_nl(self, args):
+        raise Discard
+
+    def repetition(self, args):
+        if len(args) != 2:
+            return args[0]
+
+        rep_type_tree = args[0].children[0]
+        if rep_type_tree.data == 'specific':
+            return ABNFRepetition(args[1], left=int(rep_type_tree.children[0]), right=int(rep_type_tree.children[0]))
+        elif rep_type_tree.data == 'variable':
+            if len(rep_type_tree.children) == 3:
+                return ABNFRepetition(args[1], left=int(rep_type_tree.children[0]), right=int(rep_type_tree.children[2]))
+            elif len(rep_type_tree.children) == 1:
+                return ABNFRepetition(args[1])
+            else:
+                if rep_type_tree.children[0].type == 'DEC_NUM':
+                    return ABNFRepetition(args[1], left=int(rep_type_tree.children[0]))
+                else:
+                    return ABNFRepetition(args[1], right=int(rep_type_tree.children[1]))
+        else:
+            raise NotImplementedError()
+
+    def group(self, args):
+        return Group(args[0])
+
+    def option(self, args):
+        return Optional(args[0])
+
+
+class BuildRBNF(Transformer):
+
+    def start(self, args):
+        return RBNF(args[0])
+
+    def syntax(self, args):
+        return Ruleset(args)
+
+    def rule(self, args):
+        return RBNFRule(args[0], args[1])
+
+    def rulename(self, args):
+        return args[0]
+
+    def message(self, args):
+        return _symbol(RBNFMessage, str(args[0]))
+
+    def elements(self, args):
+        return args[0]
+
+    def alternation(self, args):
+        return DefList(args)
+
+    def concatenation(self, args):
+        return Concat(args)
+
+    def element(self, args):
+        return args[0]
+
+    def object(self, args):
+        return _symbol(RBNFObject, str(args[0]))
+
+    def construct(self, args):
+        return _symbol(RBNFConstruct, str(args[0]))
+
+    def option(self, args):
+        return Optional(args[0])
+
+    def group(self, args):
+        return Group(args[0])
+
+    def repetition(self, args):
+        return RBNFRepetition(args[0])
+
+
+# Builders for each grammar, used by metaparsers and the incremental parser. They don't hold any state, so can be
+# shared between parses and threads.
+_builders = {
+    'bnf': BuildBNF(visit_tokens=False),
+    'ebnf': BuildEBNF(visit_tokens=False),
+    'abnf': BuildABNF(),
+    'rbnf': BuildRBNF()
+}
@@ -0,0 +1,87 @@
+""" The mlangpy command.
+
+    mlangpy convert --from abnf --to ebnf grammars/ -o converted/ -j 4
+
+converts every file named (or in every directory named) from one metalanguage to another, in a pool of worker
+processes. See batch.convert_files.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from mlangpy.batch import PARSE_METHODS, convert_files
+from mlangpy.metaparsers import PARSERS
+
+
+def _argument_parser():
+    parser = argparse.ArgumentParser(prog='mlangpy', description='Parse and convert grammars written in metalanguages.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    convert = commands.add_parser('convert', help='convert grammars from one metalanguage to another',
+                                  description='Convert grammars from one metalanguage to another.')
+    convert.add_argument('--from', dest='source', required=True, choices=list(PARSE_METHODS),
+                         help='metalanguage the grammars are written in')
+    convert.add_argument('--to', dest='target', required=True, choices=list(PARSE_METHODS),
+                         help='metalanguage to convert them to')
+    convert.add_argument('paths', nargs='+', metavar='SRC',
+                         help='grammar files, or directories of them (subdirectories are skipped)')
+    convert.add_argument('-o', '--output', required=True, metavar='DIR',
+                         help='directory to write the converted grammars to')
+    convert.add_argument('-j', '--jobs', type=int, default=None, metavar='N',
+                         help='number of worker processes (default: one per CPU)')
+    convert.add_argument('--parser', choices=list(PARSERS), default='auto',
+                         help='parser to read the grammars with (default: auto)')
+    convert.add_argument('--force', action='store_true',
+                         help='convert grammars even if their output is newer than they are')
+    convert.add_argument('--desugar', action='store_true',
+                         help='replace every optional, group and repetition with helper rules, not just those the '
+                              'target metalanguage can\'t write')
+    return parser
+
+
+def _source_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            files += [p for p in (os.path.join(path, name) for name in names) if os.path.isfile(p)]
+        else:
+            files.append(path)
+    return files
+
+
+def convert(args):
+    paths = _source_files(args.paths)
+    start = time.perf_counter()
+    converted = failed = rules = 0
+    for result in convert_files(paths, args.source, args.target, args.output, workers=args.jobs,
+                                parser=args.parser, desugar=args.desugar, force=args.force):
+        if result.ok:
+            converted += 1
+            rules += result.rules
+        else:
+            failed += 1
+            error = result.error
+            where = f':{error.line}:{error.column}' if error.line is not None else ''
+            print(f'{result.path}{where}: {error.type}: {error.message}', file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    skipped = len(paths) - converted - failed
+    rate = (lambda n: n / elapsed) if elapsed > 0 else (lambda n: 0)
+    print(f'Converted {converted} files ({rules} rules) in {elapsed:.2f}s: {rate(converted):.1f} files/s, '
+          f'{rate(rules):.1f} rules/s. {skipped} skipped, {failed} failed.')
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    """ Run the mlangpy command with the arguments argv (sys.argv[1:] by default), returning its exit status. """
+    args = _argument_parser().parse_args(argv)
+    try:
+        if args.command == 'convert':
+            return convert(args)
+    except (OSError, ValueError) as e:
+        print(f'mlangpy: {e}', file=sys.stderr)
+        return 1
@@ -0,0 +1,453 @@
+""" Convert a grammar from one metalanguage to another, in a form the target's own parser can read back.
+
+Putting a ruleset in another Metalanguage and normalising it only changes how each feature is written, which isn't
+enough when the target can't write a feature at all. convert rewrites those too:
+
+    ABNF's =/               The alternatives are added to the rule they extend.
+    ABNF's %x41, %x41-5A    Kept in ABNF. Elsewhere a character becomes a terminal, and a range a group of them (EBNF
+                            writes characters it can't quote, and ranges of them, as special sequences instead).
+    EBNF's 3 * x            Written out as x three times, except in EBNF.
+    Other constructs        Desugared into helper rules if the target doesn't have them (see desugar).
+    Empty alternatives      Written "" in BNF and left empty in EBNF. ABNF and RBNF can't write them, so x | (nothing)
+                            becomes [x].
+    Names and terminals     Respelled to fit the target: ABNF's rule names can't have spaces in them, RBNF's can't
+                            have digits, RBNF's objects are names rather than quoted text, and so on. Every occurrence
+                            of a name is given the same new one, which doesn't clash with any other.
+
+Anything the target still can't write, like an EBNF exception in BNF or a control character in RBNF, raises a
+ConversionError rather than being written in a form the target would read differently, or not at all.
+"""
+
+import copy
+import re
+import unicodedata
+
+from mlangpy.desugar import CONSTRUCTS
+from mlangpy.grammar import BinaryOperator, Bracket, Concat, DefList, Except, Feature, GrammarException, Group, \
+    NonTerminal, Operator, Optional, Repetition, Ruleset, Sequence, Symbol, Terminal, TernaryOperator
+from mlangpy.metalanguages import ABNF, BNF, EBNF, RBNF
+from mlangpy.metalanguages.ABNF import ABNFChar, ABNFCharRange, ABNFIncRule, ABNFRepetition, ABNFRule, \
+    ABNFTerminal
+from mlangpy.metalanguages.BNF import BNFTerminal
+from mlangpy.metalanguages.EBNF import EBNFFixedRepetition, EBNFSpecialSequence, EBNFTerminal
+from mlangpy.metalanguages.RBNF import RBNFObject, RBNFRepetition
+
+
+METALANGUAGES = {
+    'bnf': BNF,
+    'ebnf': EBNF,
+    'abnf': ABNF,
+    'rbnf': RBNF
+}
+
+# The constructs each metalanguage can write. Any others are desugared into helper rules when converting to it.
+NATIVE_CONSTRUCTS = {
+    'bnf': (),
+    'ebnf': (Optional, Group, Repetition),
+    'abnf': (Optional, Group, Repetition, ABNFRepetition),
+    'rbnf': (Optional, Group, Repetition, RBNFRepetition)
+}
+
+# The most characters an ABNF range is written out as a group of
+MAX_RANGE = 256
+
+# The base of the number in each kind of ABNF character value
+_BASES = {'x': 16, 'd': 10, 'b': 2}
+
+_DIGITS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine']
+
+# What the target's parser reads as a rule name (for RBNF, a construct or a message) and as an RBNF object
+_NAMES = {
+    'bnf': re.compile(r'[^<>|":=\n]+'),
+    'ebnf': re.compile(r'[A-Za-z][A-Za-z0-9]*( [A-Za-z0-9]+)*'),
+    'abnf': re.compile(r'[A-Za-z][A-Za-z0-9-]*'),
+    'rbnf': re.compile(r'([a-z]+|[A-Z]+)([- ]([a-z]+|[A-Z]+))*|[A-Z][A-Za-z]+( [A-Za-z]+)*')
+}
+_RBNF_OBJECT = re.compile(r'[A-Z]+(_[A-Z]+)*')
+
+# Characters BNF's terminals can't have in them, since BNF has no way to quote them
+_BNF_UNQUOTABLE = re.compile(r'[<>|":=\s]')
+
+
+class ConversionError(GrammarException):
+    """ Raised when a grammar has something in it that the metalanguage it's being converted to can't write. """
+    pass
+
+
+def convert(metalanguage, target, desugar=False):
+    """ Convert the grammar of metalanguage to the target metalanguage (see the module docstring).
+
+    Args:
+        metalanguage (Metalanguage):    The grammar to convert, which isn't changed.
+        target (str):                   'bnf', 'ebnf', 'abnf' or 'rbnf'.
+        desugar (bool):                 If True, desugar every construct, rather than just those the target can't
+                                        write.
+
+    Returns:
+        A new Metalanguage of the target's class.
+
+    Raises:
+        ConversionError: If the grammar has something in it the target can't write.
+    """
+    target = target.lower()
+    if target not in METALANGUAGES:
+        raise ValueError(f'Unknown metalanguage {target!r}, expected one of {", ".join(METALANGUAGES)}.')
+
+    features = _Features(target)
+    converted = METALANGUAGES[target](Ruleset([features.rule(rule) for rule in _merged(metalanguage.ruleset)]))
+    if desugar:
+        converted.desugar()
+    else:
+        converted.desugar(constructs=[cls for cls in CONSTRUCTS if cls not in NATIVE_CONSTRUCTS[target]])
+    converted.normalise()
+
+    # ABNF's rule names are case-insensitive, so names differing only in case are the same rule
+    spelling = _Spelling(converted, target, str.lower if isinstance(metalanguage, ABNF) else str)
+    rules = list(converted.ruleset)
+    # The names of rules are given out first, those the target can already read before those it can't, so that
+    # they keep their names where they can
+    names = [term.subject for rule in rules for term in rule.left.terms if isinstance(term, NonTerminal)]
+    for name in sorted(names, key=lambda name: not _NAMES[target].fullmatch(name)):
+        spelling.name(name)
+    return METALANGUAGES[target](Ruleset([spelling.rule(rule) for rule in rules]))
+
+
+def _merged(rules):
+    """ rules, with the alternatives of each ABNF incremental rule added to the rule it extends. An incremental rule
+    for a name that isn't defined before it becomes the rule that defines it. """
+    merged = []
+    bases = {}
+    for rule in rules:
+        # ABNF's rule names are case-insensitive
+        name = str(rule.left).lower() if isinstance(rule, (ABNFRule, ABNFIncRule)) else None
+        if isinstance(rule, ABNFIncRule):
+            index = bases.get(name)
+            if index is not None:
+                base = merged[index]
+                new = copy.copy(base)
+                new.right = copy.copy(base.right)
+                new.right.terms = base.right.terms + rule.right.terms
+                merged[index] = new
+                continue
+            rule = ABNFRule(rule.left, rule.right)
+        if name is not None:
+            bases.setdefault(name, len(merged))
+        merged.append(rule)
+    return merged
+
+
+class _Rewriter:
+    """ Rebuilds rules with some of their features replaced, copying only what changes. Subclasses say what each
+    feature is replaced with by overriding the methods below, each of which returns a list of terms. """
+
+    def rule(self, rule):
+        left = self.sequence(rule.left)
+        right = self.definitions(rule.right, nested=False)
+        if left is rule.left and right is rule.right:
+            return rule
+        new = copy.copy(rule)
+        new.left = left
+        new.right = right
+        return new
+
+    def terms(self, term):
+        """ The terms term is replaced with. """
+        if isinstance(term, DefList):
+            definitions = self.definitions(term, nested=True)
+            return [] if definitions is None else [definitions]
+        if isinstance(term, Sequence):
+            return [self.sequence(term)]
+        if not isinstance(term, Feature):
+            raise ConversionError(f"Can't convert {term!r}, which isn't a Feature.")
+        if isinstance(term, Symbol):
+            return self.symbol(term)
+        if isinstance(term, (Bracket, Operator)):
+            return self.bracket(term)
+        if isinstance(term, BinaryOperator):
+            return self.binary(term)
+        if isinstance(term, TernaryOperator):
+            return self.ternary(term)
+        return [term]
+
+    def sequence(self, sequence):
+        terms = [new for term in sequence.terms for new in self.terms(term)]
+        if _same(terms, sequence.terms):
+            return sequence
+        new = copy.copy(sequence)
+        new.terms = terms
+        return new
+
+    def definitions(self, def_list, nested):
+        """ def_list with its definitions rewritten, or None if it's nested in a construct that should be dropped. """
+        definitions = [self.sequence(definition) for definition in def_list.terms]
+        if _same(definitions, def_list.terms):
+            return def_list
+        new = copy.copy(def_list)
+        new.terms = definitions
+        return new
+
+    def symbol(self, symbol):
+        return [symbol]
+
+    def bracket(self, bracket):
+        """ An Optional, Group, Repetition or other bracket, or an operator like RBNF's repetition. """
+        if isinstance(bracket, EBNFSpecialSequence):
+            # Its text is as it is
+            return [bracket]
+        return self.replaced(bracket, 'subject')
+
+    def binary(self, operator):
+        return [operator]
+
+    def ternary(self, operator):
+        if isinstance(operator, ABNFRepetition):
+            return self.replaced(operator, 'right')
+        return [operator]
+
+    def replaced(self, feature, attribute):
+        """ [feature] with the part named attribute rewritten, or [] if there's nothing left of it, in which case
+        feature only matches the empty string. """
+        part = getattr(feature, attribute)
+        terms = self.terms(part)
+        if len(terms) == 1 and terms[0] is part:
+            return [feature]
+        if len(terms) == 1 and isinstance(terms[0], Sequence) and not terms[0].terms:
+            terms = []
+        if not terms:
+            return []
+        new = copy.copy(feature)
+        setattr(new, attribute, terms[0] if len(terms) == 1 else self.group(terms))
+        return [new]
+
+    def group(self, terms):
+        return Group(Concat(terms))
+
+
+class _Features(_Rewriter):
+    """ Rewrites the features the target has no way to write, before the grammar is desugared and normalised. """
+
+    def __init__(self, target):
+        self.target = target
+
+    def symbol(self, symbol):
+        if isinstance(symbol, ABNFChar):
+            return self.characters(symbol, [_code(symbol)])
+        return [symbol]
+
+    def bracket(self, bracket):
+        if isinstance(bracket, EBNFSpecialSequence) and self.target != 'ebnf':
+            raise ConversionError(f"{self.target.upper()} has no special sequences, so can't write {bracket}.")
+        return super().bracket(bracket)
+
+    def binary(self, operator):
+        if isinstance(operator, ABNFCharRange):
+            first = _code(operator.left)
+            last = _code(operator.right)
+            if last < first:
+                raise ConversionError(f'The range {operator} ends before it starts.')
+            if last - first >= MAX_RANGE:
+                raise ConversionError(f"The range {operator} has more than {MAX_RANGE} characters, so can't be "
+                                      f"written in {self.target.upper()}.")
+            return self.characters(operator, range(first, last + 1))
+        if self.target == 'ebnf':
+            return [operator]
+        if isinstance(operator, EBNFFixedRepetition):
+            return self.terms(operator.right) * operator.left
+        if isinstance(operator, Except):
+            raise ConversionError(f"{self.target.upper()} has no exceptions, so can't write {operator}.")
+        return [operator]
+
+    def characters(self, value, codes):
+        """ The terms an ABNF character value (or range) of the characters codes is written as. """
+        if self.target == 'abnf':
+            return [value]
+        try:
+            characters = [chr(code) for code in codes]
+        except (ValueError, OverflowError):
+            raise ConversionError(f'{value} is out of the range of Unicode characters.') from None
+        if self.target == 'ebnf' and not all(character.isprintable() for character in characters):
+            return [EBNFSpecialSequence(Concat([Terminal(str(value))]))]
+        if len(characters) == 1:
+            return [Terminal(characters[0])]
+        return [Group(DefList([Concat([Terminal(character)]) for character in characters]))]
+
+
+def _code(char):
+    try:
+        return int(char.subject, _BASES[char.denom])
+    except (KeyError, ValueError):
+        raise ConversionError(f"Can't read the character value {char}.") from None
+
+
+class _Spelling(_Rewriter):
+    """ Respells the names and terminals of a normalised grammar so that the target can read them, and writes empty
+    alternatives the way the target can.
+
+    Attributes:
+        names (dict):   The new name for each name seen so far, by its key (see key).
+        taken (set):    The names given out so far, as the target compares them.
+    """
+
+    def __init__(self, metalanguage, target, key=str):
+        self.target = target
+        self.key = key
+        self.names = {}
+        self.taken = set()
+        syntax = metalanguage.syntax
+        self.concat = syntax.constructor(Concat) or Concat
+        self.def_list = syntax.constructor(DefList) or DefList
+        self.nonterminal = syntax.constructor(NonTerminal) or NonTerminal
+
+    def name(self, name):
+        """ The name name is written as in the target, the same every time it's asked. """
+        key = self.key(name)
+        new = self.names.get(key)
+        if new is None:
+            fold = str.lower if self.target == 'abnf' else str
+            new = name if _NAMES[self.target].fullmatch(name) else _respelled(name, self.target)
+            candidate = new
+            count = 1
+            while fold(candidate) in self.taken:
+                count += 1
+                candidate = _suffixed(new, count, self.target)
+            new = self.names[key] = candidate
+            self.taken.add(fold(new))
+        return new
+
+    def symbol(self, symbol):
+        if isinstance(symbol, ABNFChar):
+            return [symbol]
+        if isinstance(symbol, NonTerminal):
+            name = self.name(symbol.subject)
+            if name == symbol.subject:
+                return [symbol]
+            return [self.nonterminal(name)]
+        if isinstance(symbol, Terminal):
+            if symbol.subject == '':
+                # Nothing to write, though it may leave an empty alternative
+                return []
+            return getattr(self, f'{self.target}_terminal')(symbol)
+        return [symbol]
+
+    def bnf_terminal(self, terminal):
+        if _BNF_UNQUOTABLE.search(terminal.subject):
+            raise ConversionError(f"BNF can't write the terminal {terminal.subject!r}, as it has no way to quote "
+                                  f"whitespace or any of <>|\":=.")
+        return [terminal]
+
+    def ebnf_terminal(self, terminal):
+        text = terminal.subject
+        if not text.isprintable():
+            raise ConversionError(f"EBNF can't write the terminal {text!r}, as it has no way to quote control "
+                                  f"characters.")
+        # Each string is quoted with whichever quote it doesn't have in it, so one with both is split in two
+        strings = ['']
+        for character in text:
+            if character in '\'"' and ('"' if character == "'" else "'") in strings[-1]:
+                strings.append('')
+            strings[-1] += character
+        new = []
+        for string in strings:
+            quote = "'" if '"' in string else '"'
+            new.append(terminal if (string == text and terminal.left_bound == quote == terminal.right_bound)
+                       else EBNFTerminal(string, quote, quote))
+        return new
+
+    def abnf_terminal(self, terminal):
+        # Quoted strings can have any printable ASCII character but ", and anything else is a character value
+        new = []
+        for string, other in re.findall(r'([\x20\x21\x23-\x7e]+)|(.)', terminal.subject, re.DOTALL):
+            if string:
+                new.append(terminal if string == terminal.subject else ABNFTerminal(string))
+            else:
+                new.append(ABNFChar('x', f'{ord(other):02X}'))
+        return new
+
+    def rbnf_terminal(self, terminal):
+        text = terminal.subject
+        if _RBNF_OBJECT.fullmatch(text):
+            return [terminal]
+        # Runs of letters are kept, separators become underscores, and anything else is named
+        words = []
+        for part in [part for part in re.split(r'[ _-]+', text) if part] or [text]:
+            for letters, other in re.findall(r'([A-Za-z]+)|(.)', part, re.DOTALL):
+                if letters:
+                    words.append(letters.upper())
+                    continue
+                name = unicodedata.name(other, None)
+                if name is None:
+                    raise ConversionError(f"RBNF can't write the terminal {text!r}, as {other!r} has no name to "
+                                          f"give its object.")
+                words += re.findall('[A-Z]+', name)
+        return [RBNFObject('_'.join(words))]
+
+    def definitions(self, def_list, nested):
+        definitions = [self.sequence(definition) for definition in def_list.terms]
+        filled = [definition for definition in definitions if definition.terms]
+        if len(filled) < len(definitions):
+            if nested and not filled:
+                return None
+            if self.target == 'bnf':
+                # One is enough
+                empty = definitions.index(next(d for d in definitions if not d.terms))
+                definitions = [d for i, d in enumerate(definitions) if d.terms or i == empty]
+                definitions[empty] = self.concat([BNFTerminal('')])
+            elif self.target in ('abnf', 'rbnf'):
+                if not filled:
+                    raise ConversionError(f"{self.target.upper()} can't write a rule that only matches the empty "
+                                          f"string.")
+                definitions = [self.concat([Optional(self.def_list(filled))])]
+
+        if _same(definitions, def_list.terms):
+            return def_list
+        new = copy.copy(def_list)
+        new.terms = definitions
+        return new
+
+    def binary(self, operator):
+        # By now, EBNF's fixed repetitions and exceptions are only left in EBNF, and character ranges in ABNF
+        if isinstance(operator, EBNFFixedRepetition):
+            return self.replaced(operator, 'right')
+        if isinstance(operator, Except):
+            new = self.replaced(operator, 'left')
+            new = new and self.replaced(new[0], 'right')
+            if not new:
+                raise ConversionError(f"EBNF can't write the exception {operator} once its empty terminals are "
+                                      f"left out.")
+            return new
+        return [operator]
+
+    def group(self, terms):
+        return Group(self.concat(terms))
+
+
+def _respelled(name, target):
+    """ name, changed to fit the target's rule names. """
+    if target == 'bnf':
+        return re.sub(r'[<>|":=\s]+', ' ', name).strip() or 'rule'
+    if target == 'rbnf':
+        # Words have to be all in lowercase or all in uppercase, and digits are spelled out
+        words = []
+        for word in re.findall('[A-Za-z]+|[0-9]', name):
+            if word.isdigit():
+                words.append(_DIGITS[int(word)])
+            else:
+                words.append(word if word.islower() or word.isupper() else word.lower())
+        return ' '.join(words) or 'rule'
+
+    words = re.findall('[A-Za-z0-9]+', name)
+    if not words or not words[0][0].isalpha():
+        words.insert(0, 'rule')
+    return ('-' if target == 'abnf' else ' ').join(words)
+
+
+def _suffixed(name, count, target):
+    if target == 'abnf':
+        return f'{name}-{count}'
+    if target == 'rbnf':
+        return f'{name} ' + ' '.join(_DIGITS[int(digit)] for digit in str(count))
+    return f'{name} {count}'
+
+
+def _same(terms, others):
+    return len(terms) == len(others) and all(term is other for term, other in zip(terms, others))
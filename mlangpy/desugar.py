@@ -0,0 +1,295 @@
+""" Turn the extended constructs of EBNF, ABNF and RBNF into plain BNF rules, in a single pass over a ruleset.
+
+Optionals, groups and repetitions (including ABNF's n*m and RBNF's '...') are replaced with non-terminals for helper
+rules that define them with alternation and recursion alone:
+
+    Optional        [x]     op N ::= x |
+    Group           (x | y) grp N ::= x | y     (groups of a single definition are written in place instead)
+    Repetition      {x}     rep N ::= x rep N |
+    RBNFRepetition  x...    rep N ::= x rep N | x
+    ABNFRepetition  2*3x    x x op N, where op N ::= x |
+
+Constructs inside constructs are replaced first, so every helper rule is plain too. Helper rules are memoised by what
+they define, so every occurrence of the same construct (ignoring boundaries and syntax) shares one non-terminal.
+
+Helpers are numbered in the order their constructs are first found, from the Metalanguage's op_count, rep_count and
+grp_count, skipping any name already defined. Desugaring in a pool of worker processes gives exactly the same result:
+each worker numbers the helpers for its shard of rules on its own, and they're renamed in order once the shards are
+put back together.
+"""
+
+import copy
+
+from mlangpy.grammar import Concat, DefList, GrammarException, Group, NonTerminal, Optional, Repetition, Rule, Ruleset
+from mlangpy.metalanguages.ABNF import ABNFRepetition
+from mlangpy.metalanguages.Metalanguage import _map_shards
+from mlangpy.metalanguages.RBNF import RBNFRepetition
+
+
+# Every class of construct that can be desugared
+CONSTRUCTS = (Optional, Group, Repetition, ABNFRepetition, RBNFRepetition)
+
+# The Metalanguage counter each kind of helper is numbered from
+COUNTERS = {'op': 'op_count', 'grp': 'grp_count', 'rep': 'rep_count', 'rep1': 'rep_count'}
+
+
+class _Shard:
+    """ Desugars rules, keeping the helpers it's made for them. The definitions of rules it changes are rebuilt with
+    concat, as the helpers' are, so that they're all written the same way.
+
+    Attributes:
+        helpers (list): (kind, non-terminal, definitions) of each helper, in the order they were made. The
+                        definitions are tuples of terms, and refer to helpers by the same non-terminal objects as the
+                        rules do, so renaming a helper's non-terminal renames it everywhere.
+    """
+
+    def __init__(self, nonterminal, concat=Concat, constructs=CONSTRUCTS):
+        self.nonterminal = nonterminal
+        self.concat = concat
+        self.constructs = constructs
+        self.helpers = []
+        self._memo = {}
+
+    def rule(self, rule):
+        """ The desugared form of rule, or None if it doesn't have any constructs in it. """
+        definitions = []
+        changed = False
+        for definition in rule.right.terms:
+            terms = self.terms(definition.terms)
+            if terms is None:
+                terms = definition.terms
+            else:
+                changed = True
+            definitions.append(terms)
+        if not changed:
+            return None
+        definitions = [self.concat(list(terms)) for terms in definitions]
+
+        new = copy.copy(rule)
+        new.right = copy.copy(rule.right)
+        new.right.terms = definitions
+        return new
+
+    def terms(self, terms):
+        """ terms with every construct in them replaced, or None if there aren't any.
+
+        Works with an explicit stack of frames, one for each construct being taken apart: [construct, its parts (lists
+        of terms), index of the part being looked at, index of the next term in it, the parts done so far, the terms
+        of the part being done].
+        """
+        if not any(isinstance(term, CONSTRUCTS) for term in terms):
+            return None
+
+        stack = [[None, [terms], 0, 0, [], []]]
+        while True:
+            frame = stack[-1]
+            parts = frame[1]
+            if frame[2] < len(parts):
+                part = parts[frame[2]]
+                if frame[3] < len(part):
+                    term = part[frame[3]]
+                    frame[3] += 1
+                    if isinstance(term, CONSTRUCTS):
+                        stack.append([term, _parts(term), 0, 0, [], []])
+                    else:
+                        frame[5].append(term)
+                else:
+                    frame[4].append(frame[5])
+                    frame[5] = []
+                    frame[2] += 1
+                    frame[3] = 0
+                continue
+
+            stack.pop()
+            if not stack:
+                result = frame[4][0]
+                return None if _same(result, terms) else result
+            stack[-1][5] += self._replace(frame[0], frame[4])
+
+    def _replace(self, construct, definitions):
+        """ The terms construct is replaced with, given its parts with their own constructs replaced. """
+        if not isinstance(construct, self.constructs):
+            return [_rebuilt(construct, definitions)]
+        if isinstance(construct, Optional):
+            return [self._helper('op', definitions)]
+        if isinstance(construct, Group):
+            if len(definitions) == 1:
+                return definitions[0]
+            return [self._helper('grp', definitions)]
+        if isinstance(construct, Repetition):
+            return [self._helper('rep', definitions)]
+        if isinstance(construct, RBNFRepetition):
+            return [self._helper('rep1', definitions)]
+
+        # ABNFRepetition, whose bounds are its left and middle
+        terms = definitions[0]
+        least = construct.left or 0
+        most = construct.middle
+        result = terms * least
+        if most == '':
+            result.append(self._helper('rep', definitions))
+        elif most < least:
+            raise GrammarException(f'Repetition {construct} has a maximum less than its minimum.')
+        else:
+            # Each optional repetition after the minimum is inside the one before
+            tail = None
+            for _ in range(most - least):
+                tail = self._helper('op', [terms + [tail] if tail is not None else terms])
+            if tail is not None:
+                result.append(tail)
+        return result
+
+    def _helper(self, kind, definitions):
+        """ The non-terminal for the helper rule of kind defining definitions, made the first time it's needed. """
+        definitions = tuple(tuple(terms) for terms in definitions)
+        key = (kind, definitions)
+        nonterminal = self._memo.get(key)
+        if nonterminal is None:
+            # Named for now, to tell helpers apart until they're given their real names, in a way that can't be
+            # mistaken for a symbol of the grammar
+            nonterminal = self._memo[key] = self.nonterminal(f'\0{kind} {len(self.helpers)}')
+            self.helpers.append((kind, nonterminal, definitions))
+        return nonterminal
+
+
+def _parts(term):
+    """ The parts of the construct term to desugar, as lists of terms. """
+    if isinstance(term, (Optional, Group, Repetition)):
+        subject = term.subject
+        if isinstance(subject, DefList):
+            return [definition.terms for definition in subject.terms]
+        return [subject.terms]
+    if isinstance(term, ABNFRepetition):
+        return [[term.right]]
+    # RBNFRepetition
+    return [[term.subject]]
+
+
+def _same(terms, others):
+    return len(terms) == len(others) and all(term is other for term, other in zip(terms, others))
+
+
+def _rebuilt(construct, definitions):
+    """ A construct that isn't being desugared, with its parts replaced by definitions (or construct itself, if they're
+    the same). """
+    if all(_same(terms, part) for terms, part in zip(definitions, _parts(construct))):
+        return construct
+
+    new = copy.copy(construct)
+    if isinstance(construct, (Optional, Group, Repetition)):
+        subject = copy.copy(construct.subject)
+        if isinstance(subject, DefList):
+            subject.terms = [copy.copy(definition) for definition in subject.terms]
+            for definition, terms in zip(subject.terms, definitions):
+                definition.terms = terms
+        else:
+            subject.terms = definitions[0]
+        new.subject = subject
+        return new
+
+    # Repetitions of a single element, which has to be grouped if it's become more than one
+    terms = definitions[0]
+    element = terms[0] if len(terms) == 1 else Group(Concat(terms))
+    if isinstance(construct, ABNFRepetition):
+        new.right = element
+    else:
+        new.subject = element
+    return new
+
+
+# The rules and syntax of the current worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(rules, nonterminal, concat, constructs):
+    _worker.update(rules=rules, nonterminal=nonterminal, concat=concat, constructs=constructs)
+
+
+def _desugar_shard(shard):
+    start, stop = shard
+    desugarer = _Shard(_worker['nonterminal'], _worker['concat'], _worker['constructs'])
+    return [desugarer.rule(rule) for rule in _worker['rules'][start:stop]], desugarer.helpers
+
+
+def desugar(metalanguage, workers=None, constructs=CONSTRUCTS):
+    """ Replace the optionals, groups and repetitions in the ruleset of metalanguage with helper rules (see the
+    module docstring). Rules with constructs in them are replaced with new ones, so the Ruleset the Metalanguage was
+    made from isn't changed, and the helper rules are added to the end of the ruleset.
+
+    Args:
+        metalanguage (Metalanguage):    The Metalanguage to desugar.
+        workers (int):                  If more than 1, desugar shards of the rules in a pool of this many processes
+                                        (unless there's only one CPU), with the same result. The rules and syntax have
+                                        to be picklable.
+        constructs (tuple):             The classes of construct to desugar, from CONSTRUCTS. Others are left as they
+                                        are, though constructs inside them are still desugared.
+
+    Returns:
+        The number of helper rules added.
+    """
+    constructs = tuple(constructs)
+    for cls in constructs:
+        if not issubclass(cls, CONSTRUCTS):
+            raise ValueError(f"Can't desugar {cls.__name__}, expected subclasses of "
+                             f"{', '.join(c.__name__ for c in CONSTRUCTS)}.")
+
+    # Helpers are made the way normalise() would make them, e.g. RBNF's non-terminals are RBNFConstructs
+    syntax = metalanguage.syntax
+    nonterminal = syntax.constructor(NonTerminal) or NonTerminal
+    concat = syntax.constructor(Concat) or Concat
+    def_list = syntax.constructor(DefList) or DefList
+    rule_class = syntax.constructor(Rule) or Rule
+    rules = list(metalanguage.ruleset)
+
+    shards = _map_shards(_desugar_shard, _init_worker, (rules, nonterminal, concat, constructs), len(rules),
+                         workers if workers is not None and len(rules) > 1 else 1, _worker)
+
+    taken = {str(rule.left.terms[0].subject) for rule in rules if len(rule.left.terms) == 1}
+    named = {}
+    helper_rules = []
+    for _, shard_helpers in shards:
+        # Helpers are in the order they were made, which puts any helper before the ones that use it, so they've
+        # all got their real names by the time they're looked up
+        for kind, helper, definitions in shard_helpers:
+            key = (kind, definitions)
+            name = named.get(key)
+            if name is None:
+                name = named[key] = _next_name(metalanguage, kind, taken)
+                helper_rules.append(_helper_rule(rule_class, def_list, concat, kind, helper, definitions))
+            helper.subject = name
+
+    index = 0
+    for results, _ in shards:
+        for new in results:
+            if new is not None:
+                metalanguage.ruleset[index] = new
+                metalanguage._owned[id(new)] = new
+            index += 1
+
+    metalanguage.ruleset += Ruleset(helper_rules)
+    return len(helper_rules)
+
+
+def _next_name(metalanguage, kind, taken):
+    counter = COUNTERS[kind]
+    prefix = 'rep' if kind == 'rep1' else kind
+    while True:
+        count = getattr(metalanguage, counter)
+        setattr(metalanguage, counter, count + 1)
+        name = f'{prefix} {count}'
+        if name not in taken:
+            taken.add(name)
+            return name
+
+
+def _helper_rule(rule_class, def_list, concat, kind, nonterminal, definitions):
+    if kind == 'op':
+        right = [concat(list(terms)) for terms in definitions] + [concat([])]
+    elif kind == 'grp':
+        right = [concat(list(terms)) for terms in definitions]
+    elif kind == 'rep':
+        right = [concat(list(terms) + [nonterminal]) for terms in definitions] + [concat([])]
+    else:
+        right = [concat(list(terms) + [nonterminal]) for terms in definitions] + \
+                [concat(list(terms)) for terms in definitions]
+    return rule_class(nonterminal, def_list(right))
@@ -0,0 +1,81 @@
+""" Guess which metalanguage a grammar is written in from what its text looks like, without parsing it. """
+
+import re
+from collections import namedtuple
+
+
+# Only this much of the text is looked at, which is plenty to tell the metalanguages apart
+SAMPLE_SIZE = 65536
+
+# Candidates in the order they're preferred when their scores are tied
+METALANGUAGES = ('bnf', 'ebnf', 'abnf', 'rbnf')
+
+# (pattern, {metalanguage: weight}). Each match of a pattern adds its weights to the metalanguages' scores.
+SIGNATURES = [
+    # <name> ::= starts a rule in BNF and RBNF
+    (r'<[^<>\n]+>\s*::=', {'bnf': 3, 'rbnf': 3}),
+    # '...' after a non-terminal or option is RBNF's repetition
+    (r'[>\]]\s*\.\.\.', {'rbnf': 4}),
+    # RBNF objects are upper case, with underscores
+    (r'<[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)*>', {'rbnf': 1}),
+    # name = at the start of a line starts a rule in ABNF and EBNF, and only EBNF allows spaces in the name
+    (r'^[ \t]*[A-Za-z][A-Za-z0-9-]*[ \t]*=(?!=)', {'abnf': 2, 'ebnf': 2}),
+    (r'^[ \t]*[A-Za-z][A-Za-z0-9]*(?: [A-Za-z0-9]+)+[ \t]*=', {'ebnf': 2}),
+    # ABNF's incremental alternatives, numeric values, repetitions and alternation
+    (r'=/', {'abnf': 4}),
+    (r'%[xdbXDB][0-9A-Fa-f]', {'abnf': 4}),
+    (r'(?<![\w*])\d*\*\d*(?=[A-Za-z("%\[])', {'abnf': 1}),
+    (r'\s/\s', {'abnf': 1}),
+    # EBNF rules end with ';', and comments are bracketed with (* *)
+    (r';[ \t]*$', {'ebnf': 3}),
+    (r'\(\*', {'ebnf': 2}),
+    # EBNF concatenation
+    (r'(?:["\'\w\]})])\s*,\s*(?:["\'\w\[{(])', {'ebnf': 1}),
+]
+
+_signatures = [(re.compile(pattern, re.MULTILINE), weights) for pattern, weights in SIGNATURES]
+
+# Strips out everything RBNF allows in a definition, so whatever's left over are BNF's bare terminals
+_RBNF_SYNTAX = re.compile(r'<[^<>\n]*>|::=|\.\.\.|[\[\]()|]')
+
+
+class Candidate(namedtuple('Candidate', ['metalanguage', 'confidence'])):
+    """ A metalanguage that a grammar might be written in.
+
+    Attributes:
+        metalanguage (str):     'bnf', 'ebnf', 'abnf' or 'rbnf'.
+        confidence (float):     Between 0 and 1. The confidences of all the candidates for a text add up to 1 (or are
+                                all 0, if nothing about the text looked like any of them).
+    """
+    __slots__ = ()
+
+
+def detect_metalanguage(text):
+    """ Rank the metalanguages by how likely it is that text is written in each of them.
+
+    This only looks for lexical signatures, like '::=' between '<...>' and a definition, or ABNF's '=/' and '%x', so
+    it's much quicker than trying to parse text. It doesn't check that text is valid.
+
+    Args:
+        text (str): The grammar.
+
+    Returns:
+        A list of Candidate for every metalanguage, most likely first.
+    """
+    sample = text[:SAMPLE_SIZE]
+    scores = dict.fromkeys(METALANGUAGES, 0)
+
+    for pattern, weights in _signatures:
+        count = sum(1 for _ in pattern.finditer(sample))
+        for metalanguage, weight in weights.items():
+            scores[metalanguage] += weight * count
+
+    # BNF has terminals written straight into definitions, which RBNF doesn't allow
+    if scores['bnf']:
+        scores['bnf'] += len(_RBNF_SYNTAX.sub(' ', sample).split())
+
+    total = sum(scores.values())
+    candidates = [Candidate(metalanguage, scores[metalanguage] / total if total else 0.0)
+                  for metalanguage in METALANGUAGES]
+    # sorted is stable, so ties stay in METALANGUAGES order
+    return sorted(candidates, key=lambda candidate: -candidate.confidence)
@@ -0,0 +1,226 @@
+""" Lark grammars and Transformers generated from the syntax of a Metalanguage, so that grammars written in a custom
+dialect can be parsed the same way as the built-in metalanguages (see metaparsers.parse_dialect).
+
+The notation a syntax gives each part of a grammar is worked out by building an example of it with the syntax's
+constructor and looking at how it's written: the production and terminator of its Rule, the separators of its Concat
+and DefList, the boundaries of each class of Symbol, and the symbols either side of each bracket or operator (anything
+else in the syntax that's made from a single subject, like Optional or RBNF's repetitions). Entries that can't be made
+that way, like Except, which takes two subjects, are left out of the grammar.
+
+The grammar is LALR(1). Metalanguages whose rules aren't terminated, like BNF and ABNF, rely on the lexer to find where
+each rule starts: a symbol followed by the production symbol is lexed as the name of a new rule rather than as part of
+the definition before it.
+"""
+
+import re
+from collections import namedtuple
+
+from mlangpy.grammar import Concat, DefList, DefinitionList, NonTerminal, Rule, Ruleset, Sequence, Symbol, Terminal
+
+
+# Stands in for the subject of a bracket while its notation is worked out
+_MARK = '\0'
+
+
+class _SymbolForm(namedtuple('_SymbolForm', ['constructor', 'left', 'right'])):
+    """ The notation of a class of Symbol: its constructor, and the boundaries it puts either side of its subject. """
+    __slots__ = ()
+
+
+class _BracketForm(namedtuple('_BracketForm', ['constructor', 'open', 'close', 'single'])):
+    """ The notation of a bracket or operator: its constructor, and the symbols it puts before and after its subject.
+    If single, its subject is a single term (like the '...' of RBNF), otherwise any definitions list. """
+    __slots__ = ()
+
+
+class Notation(namedtuple('Notation', ['rule', 'production', 'terminator', 'concat', 'separator', 'def_list',
+                                       'alternation', 'symbols', 'rule_names', 'brackets'])):
+    """ How a syntax writes each part of a grammar.
+
+    Attributes:
+        rule:               Constructor for rules.
+        production (str):   The production symbol, e.g. '::='.
+        terminator (str):   The symbol ending each rule, or '' if rules aren't terminated.
+        concat:             Constructor for definitions.
+        separator (str):    The symbol between the terms of a definition, or '' if they're only separated by space.
+        def_list:           Constructor for definitions lists.
+        alternation (str):  The symbol between definitions.
+        symbols (list):     _SymbolForm of each way of writing a symbol. Classes written the same way are read as the
+                            first of them in the syntax, preferring non-terminals.
+        rule_names (list):  Indices in symbols of the symbols that can name a rule: the non-terminals, or every symbol
+                            if there aren't any.
+        brackets (list):    _BracketForm of each bracket and operator. Those written the same way as one before them
+                            are left out.
+    """
+    __slots__ = ()
+
+
+def notation(syntax):
+    """ Work out the Notation of syntax (see the module docstring). """
+    rule = syntax.get(Rule, Rule)
+    example = rule(NonTerminal(''), [])
+    concat = syntax.get(Concat, Concat)
+    def_list = syntax.get(DefList, DefList)
+
+    symbols = []
+    brackets = []
+    seen = set()
+    # Non-terminals first, so they're the ones used when a terminal is written the same way
+    keys = sorted(syntax, key=lambda cls: not (isinstance(cls, type) and issubclass(cls, NonTerminal)))
+    for cls in keys:
+        if not isinstance(cls, type) or issubclass(cls, (Sequence, DefinitionList, Rule)):
+            continue
+        constructor = syntax[cls]
+        if issubclass(cls, Symbol):
+            form = _symbol_form(constructor)
+        else:
+            form = _bracket_form(constructor)
+        if form is None:
+            continue
+        key = (form[1:], isinstance(form, _SymbolForm))
+        if key not in seen:
+            seen.add(key)
+            (symbols if isinstance(form, _SymbolForm) else brackets).append(form)
+
+    rule_names = [i for i, form in enumerate(symbols) if _is_nonterminal(form.constructor)] or \
+        list(range(len(symbols)))
+    return Notation(rule, example.prod.strip(), example.terminator.strip(), concat, concat([]).separator.strip(),
+                    def_list, def_list([]).separator.strip(), symbols, rule_names, brackets)
+
+
+def _symbol_form(constructor):
+    try:
+        symbol = constructor('x')
+    except Exception:
+        return None
+    if not isinstance(symbol, Symbol):
+        return None
+    return _SymbolForm(constructor, symbol.left_bound.strip(), symbol.right_bound.strip())
+
+
+def _is_nonterminal(constructor):
+    return isinstance(constructor('x'), NonTerminal)
+
+
+def _bracket_form(constructor):
+    """ The _BracketForm of constructor, trying a definitions list as its subject first, then a single term. """
+    for single, subject in ((False, Concat([Terminal(_MARK)])), (True, Terminal(_MARK))):
+        try:
+            written = str(constructor(subject))
+        except Exception:
+            continue
+        if written.count(_MARK) != 1:
+            continue
+        before, after = (part.strip() for part in written.split(_MARK))
+        if before and after or single and (before or after):
+            return _BracketForm(constructor, before, after, single)
+    return None
+
+
+def _literal(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _regexp(pattern):
+    return '/' + pattern.replace('/', '\\/') + '/'
+
+
+def build_lark_grammar(syntax):
+    """ Returns the text of an LALR(1) Lark grammar that recognises grammars written in syntax. See build_transformer
+    for building a Ruleset from its parse trees. """
+    form = notation(syntax)
+
+    # Characters that can't be part of a symbol that has no boundary to end it
+    special = set(form.production + form.terminator + form.separator + form.alternation)
+    for symbol in form.symbols:
+        special.update(symbol.left + symbol.right)
+    for bracket in form.brackets:
+        special.update(bracket.open + bracket.close)
+    word = '[^' + ''.join(re.escape(c) for c in sorted(special)) + r'\s]+'
+    if form.separator:
+        # Terms are separated by a symbol, so a name can have spaces in it (like EBNF's meta identifiers)
+        word = f'{word}(?:[ \\t]+{word})*'
+
+    lines = [
+        '%ignore /[ \\t\\r\\n]+/',
+        '',
+        'start: rule*',
+        'rule: _rule_name ' + _literal(form.production) + ' alternation' +
+        (' ' + _literal(form.terminator) if form.terminator else ''),
+        '_rule_name: ' + ' | '.join(f'rule_name_{i}' for i in form.rule_names),
+        'alternation: concatenation (' + _literal(form.alternation) + ' concatenation)*',
+    ]
+    if form.separator:
+        lines.append('concatenation: (_term (' + _literal(form.separator) + ' _term)*)?')
+    else:
+        lines.append('concatenation: _term*')
+
+    primaries = [f'symbol_{i}' for i in range(len(form.symbols))]
+    terms = []
+    for i, bracket in enumerate(form.brackets):
+        parts = [_literal(bracket.open)] if bracket.open else []
+        parts.append('_term' if bracket.single else 'alternation')
+        if bracket.close:
+            parts.append(_literal(bracket.close))
+        lines.append(f'bracket_{i}: ' + ' '.join(parts))
+        # Postfix operators take the term before them, so can apply to each other; the rest are whole terms already
+        (terms if bracket.single and not bracket.open else primaries).append(f'bracket_{i}')
+    lines.append('_term: ' + ' | '.join(primaries + terms))
+    lines.append('')
+
+    lookahead = r'(?=[ \t\r\n]*' + re.escape(form.production) + ')'
+    for i, symbol in enumerate(form.symbols):
+        if symbol.right:
+            pattern = re.escape(symbol.left) + '[^' + re.escape(symbol.right[0]) + r'\n]*' + re.escape(symbol.right)
+        else:
+            pattern = re.escape(symbol.left) + word
+        lines.append(f'symbol_{i}: SYMBOL_{i}')
+        lines.append(f'SYMBOL_{i}: ' + _regexp(pattern))
+        if i in form.rule_names:
+            # Lexed in preference to SYMBOL_i where it's followed by the production symbol
+            lines.append(f'rule_name_{i}: RULE_NAME_{i}')
+            lines.append(f'RULE_NAME_{i}.2: ' + _regexp(f'(?:{pattern}){lookahead}'))
+
+    return '\n'.join(lines) + '\n'
+
+
+def build_transformer(syntax):
+    """ Returns a lark Transformer that builds a Ruleset, in the form syntax gives it, from a parse tree of the grammar
+    from build_lark_grammar(syntax). """
+    from lark import Transformer
+
+    form = notation(syntax)
+    methods = {
+        'start': lambda self, args: Ruleset(args),
+        'rule': lambda self, args: form.rule(args[0], args[1]),
+        'alternation': lambda self, args: form.def_list(args),
+        'concatenation': lambda self, args: form.concat(list(args)),
+    }
+    for i, symbol in enumerate(form.symbols):
+        methods[f'symbol_{i}'] = methods[f'rule_name_{i}'] = _symbol_builder(symbol)
+    for i, bracket in enumerate(form.brackets):
+        methods[f'bracket_{i}'] = _bracket_builder(bracket)
+
+    return type('BuildDialect', (Transformer,), methods)()
+
+
+def _symbol_builder(symbol):
+    constructor = symbol.constructor
+    start = len(symbol.left)
+    stop = -len(symbol.right) or None
+
+    def build(self, args):
+        return constructor(str(args[0])[start:stop])
+    return build
+
+
+def _bracket_builder(bracket):
+    constructor = bracket.constructor
+
+    def build(self, args):
+        subject = args[0]
+        if not bracket.single and len(subject.terms) == 1:
+            # Brackets of a single definition hold it directly, as Optional([...]) would
+            subject = subject.terms[0]
+        return constructor(subject)
+    return build
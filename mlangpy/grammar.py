@@ -2,19 +2,201 @@
 
 """
 
-from typing import List
-from pathlib import Path
 import copy
-import textwrap
-from ordered_set import OrderedSet
+from bisect import insort
 
 
 class GrammarException(Exception):
     pass
 
 
+# Bumped whenever a node whose hash may be part of another cached hash is changed, which makes every cached hash stale
+_epoch = 0
+
+
+def invalidate_hashes():
+    """ Throw away every cached hash.
+
+    Assigning to any node's attributes (e.g. symbol.subject = 'x'), and item assignment and += on Sequences and
+    DefinitionLists, are noticed automatically. Anything else that changes a node after it's been hashed (e.g.
+    concat.terms.append(x)) needs to be followed by a call to this.
+    """
+    global _epoch
+    _epoch += 1
+
+
+_slots = {}
+
+
+def _slot_names(cls):
+    """ Names of the slots of cls and its bases, base classes first, apart from _hash (and __dict__ and
+    __weakref__). This is what copying, pickling and mlangpy.binary save of a node. """
+    names = _slots.get(cls)
+    if names is None:
+        names = []
+        for base in reversed(cls.__mro__):
+            slots = base.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            names += [name for name in slots if name not in ('_hash', '__dict__', '__weakref__')]
+        names = _slots[cls] = tuple(names)
+    return names
+
+
+# Sets an attribute without going through _StructuralHash.__setattr__, for nodes that are still being built
+_set = object.__setattr__
+
+
+class _StructuralHash:
+    """ Mixin for the grammar classes, caching the hash from _structural_hash() until something changes.
+
+    Hashes follow equality, so they're worked out from the same parts of a node that __eq__ compares (ignoring
+    boundaries and syntax), tagged with the class that defines __eq__ so that related classes hash the same.
+
+    A cached hash is stored along with the epoch it was worked out in. Changing a node that was hashed in the current
+    epoch starts a new one, since any node containing it might have cached a hash that depends on it. Nodes that
+    haven't been hashed since the last change don't need to, so building new nodes never invalidates anything.
+    Lists held by a node can't be watched, so changes made to them in place need a call to invalidate_hashes().
+
+    Assigning an attribute goes through __setattr__ to check for this, so __init__ methods set theirs with _set
+    instead, keeping the check off the path that builds every node. For the same reason they leave _hash unset until
+    there's a hash to cache.
+    """
+    __slots__ = ('_hash',)
+
+    def __setattr__(self, name, value):
+        global _epoch
+        object.__setattr__(self, name, value)
+        # _changed(), inlined
+        cached = getattr(self, '_hash', None)
+        if cached is not None and cached[0] == _epoch:
+            _epoch += 1
+
+    def _changed(self):
+        """ Start a new epoch if this node's hash is cached in the current one. """
+        global _epoch
+        cached = getattr(self, '_hash', None)
+        if cached is not None and cached[0] == _epoch:
+            _epoch += 1
+
+    def __hash__(self):
+        cached = getattr(self, '_hash', None)
+        if cached is not None and cached[0] == _epoch:
+            return cached[1]
+
+        value = self._structural_hash()
+        object.__setattr__(self, '_hash', (_epoch, value))
+        return value
+
+    def _structural_hash(self):
+        return object.__hash__(self)
+
+    def _known_unequal(self, other):
+        """ Returns True if both hashes are cached and differ. Hashes aren't worked out just for this, since __eq__
+        usually finds a difference sooner than hashing would. """
+        mine = getattr(self, '_hash', None)
+        theirs = getattr(other, '_hash', None)
+        return mine is not None and theirs is not None and mine[0] == theirs[0] == _epoch and mine[1] != theirs[1]
+
+    def __copy__(self):
+        # Much quicker than copy's default of going through __reduce_ex__ and __getstate__
+        cls = self.__class__
+        new = cls.__new__(cls)
+        for name in _slot_names(cls):
+            try:
+                object.__setattr__(new, name, getattr(self, name))
+            except AttributeError:
+                pass
+        object.__setattr__(new, '_hash', None)
+        if hasattr(self, '__dict__'):
+            new.__dict__.update(self.__dict__)
+        return new
+
+    def __getstate__(self):
+        # Cached hashes mean nothing in another process (or epoch), so they're left out of copies and pickles
+        slots = {'_hash': None}
+        for name in _slot_names(type(self)):
+            if hasattr(self, name):
+                slots[name] = getattr(self, name)
+        return getattr(self, '__dict__', None), slots
+
+    def __reduce_ex__(self, protocol):
+        # Pickling just the values of the slots, in order, is about twice as quick (both ways) as going through
+        # __getstate__, and makes smaller pickles. Nodes with slots that aren't set still use __getstate__.
+        cls = self.__class__
+        try:
+            values = tuple([getattr(self, name) for name in _slot_names(cls)])
+        except AttributeError:
+            return object.__reduce_ex__(self, protocol)
+        if hasattr(self, '__dict__'):
+            return _restore, (cls, values), self.__dict__
+        return _restore, (cls, values)
+
+
+def _restore(cls, values):
+    """ Make a cls with values in its slots (see _StructuralHash.__reduce_ex__), without calling __init__. """
+    node = cls.__new__(cls)
+    set_slot = object.__setattr__
+    set_slot(node, '_hash', None)
+    for name, value in zip(_slot_names(cls), values):
+        set_slot(node, name, value)
+    return node
+
+
+def iter_str(node):
+    """ Yield the pieces of str(node) in order, without recursion, so nesting is only limited by memory.
+
+    Classes whose __str__ is _str_from_parts describe their string with _str_parts(), a list of strings and child
+    nodes, which are expanded here with an explicit stack. Anything else (symbols, or subclasses that override
+    __str__) is converted with str().
+    """
+    return iter(_str_pieces(node))
+
+
+def _str_pieces(node):
+    """ The pieces iter_str yields, as a list. Building a list is much quicker than yielding each piece. """
+    pieces = []
+    append = pieces.append
+    stack = [node]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        item = pop()
+        cls = item.__class__
+        if cls is str:
+            append(item)
+            continue
+        to_str = cls.__str__
+        if to_str is _str_from_parts:
+            parts = item._str_parts()
+            parts.reverse()
+            extend(parts)
+        elif to_str is Symbol.__str__:
+            # Symbols are most of a grammar, so save calling str() on each
+            append(item.left_bound)
+            append(str(item.subject))
+            append(item.right_bound)
+        else:
+            append(str(item))
+    return pieces
+
+
+def _str_from_parts(self):
+    return ''.join(_str_pieces(self))
+
+
+def _joined(items, separator):
+    """ items with separator between each of them, as parts for iter_str. """
+    parts = []
+    for item in items:
+        parts.append(item)
+        parts.append(separator)
+    return parts[:-1]
+
+
 # TODO this may have broken things!!
-class Feature:
+class Feature(_StructuralHash):
+    __slots__ = ()
 
     def __add__(self, other):
         if not (issubclass(self.__class__, Feature) and issubclass(other.__class__, Feature)):
@@ -27,73 +209,113 @@ class Feature:
 
 
 class Operator(Feature):
+    __slots__ = ('subject', 'operator_sym', 'prepend')
 
     def __init__(self, subject, operator_sym, prepend=False):
         if not issubclass(subject.__class__, Feature):
             raise GrammarException(f'{self.__class__.__name__} objects require a Feature object as the subject.')
-        self.subject = subject
-        self.operator_sym = operator_sym
-        self.prepend = prepend
+        _set(self, 'subject', subject)
+        _set(self, 'operator_sym', operator_sym)
+        _set(self, 'prepend', prepend)
 
-    def __str__(self):
+    __str__ = _str_from_parts
+
+    def _str_parts(self):
         if self.prepend:
-            return f'{self.operator_sym}{self.subject}'
+            return [self.operator_sym, self.subject]
         else:
-            return f'{self.subject}{self.operator_sym}'
+            return [self.subject, self.operator_sym]
 
     def __eq__(self, other):
         return (issubclass(self.__class__, other.__class__) or issubclass(other.__class__, self.__class__)) and \
             self.subject == other.subject
 
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((Operator, self.subject))
+
 
 class BinaryOperator(Feature):
+    __slots__ = ('left', 'right', 'operator_sym')
 
     def __init__(self, left, right, operator_sym):
-        self.left = left
-        self.right = right
-        self.operator_sym = operator_sym
+        _set(self, 'left', left)
+        _set(self, 'right', right)
+        _set(self, 'operator_sym', operator_sym)
 
-    def __str__(self):
-        return f'{self.left}{self.operator_sym}{self.right}'
+    __str__ = _str_from_parts
+
+    def _str_parts(self):
+        return [self.left, self.operator_sym, self.right]
+
+    def __eq__(self, other):
+        return (issubclass(self.__class__, other.__class__) or issubclass(other.__class__, self.__class__)) and \
+            self.left == other.left and self.right == other.right
+
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((BinaryOperator, self.left, self.right))
 
 
 class TernaryOperator(Feature):
+    __slots__ = ('left', 'middle', 'right', 'operator1_sym', 'operator2_sym')
 
     def __init__(self, left, middle, right, operator1_sym, operator2_sym):
-        self.left = left
-        self.middle = middle
-        self.right = right
+        _set(self, 'left', left)
+        _set(self, 'middle', middle)
+        _set(self, 'right', right)
 
         assert isinstance(operator1_sym, str) and isinstance(operator2_sym, str)
-        self.operator1_sym = operator1_sym
+        _set(self, 'operator1_sym', operator1_sym)
         self.operator2_sym = operator2_sym
 
-    def __str__(self):
-        return f'{self.left}{self.operator1_sym}{self.middle}{self.operator2_sym}{self.right}'
+    __str__ = _str_from_parts
+
+    def _str_parts(self):
+        return [self.left, self.operator1_sym, self.middle, self.operator2_sym, self.right]
+
+    def __eq__(self, other):
+        return (issubclass(self.__class__, other.__class__) or issubclass(other.__class__, self.__class__)) and \
+            self.left == other.left and self.middle == other.middle and self.right == other.right
+
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((TernaryOperator, self.left, self.middle, self.right))
 
 
 class Bracket(Feature):
     """
     Abstract representation of a feature that can encompass more than one term.
     """
+    __slots__ = ('subject', 'left_bound', 'right_bound')
 
     def __init__(self, subject, left_bound, right_bound):
         if not issubclass(subject.__class__, Concat) and not issubclass(subject.__class__, DefList):
             raise GrammarException(f'{self.__class__.__name__} objects require a Concat or DefList as the subject.')
 
-        self.subject = subject
+        _set(self, 'subject', subject)
 
         assert isinstance(left_bound, str) and isinstance(right_bound, str)
-        self.left_bound = left_bound
-        self.right_bound = right_bound
+        _set(self, 'left_bound', left_bound)
+        _set(self, 'right_bound', right_bound)
 
-    def __str__(self):
-        return f'{self.left_bound}{self.subject}{self.right_bound}'
+    __str__ = _str_from_parts
+
+    def _str_parts(self):
+        return [self.left_bound, self.subject, self.right_bound]
 
     def __eq__(self, other):
         return (issubclass(self.__class__, other.__class__) or issubclass(other.__class__, self.__class__)) and \
                self.subject == other.subject
 
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((Bracket, self.subject))
+
     def __repr__(self):
         return f'{self.__class__.__name__}({repr(self.subject)})'
 
@@ -108,12 +330,13 @@ class Symbol(Feature):
 
 
     """
+    __slots__ = ('subject', 'left_bound', 'right_bound')
 
     def __init__(self, subject, left_bound='', right_bound=''):
         assert isinstance(left_bound, str) and isinstance(right_bound, str)
-        self.subject = subject
-        self.left_bound = left_bound
-        self.right_bound = right_bound
+        _set(self, 'subject', subject)
+        _set(self, 'left_bound', left_bound)
+        _set(self, 'right_bound', right_bound)
 
     def __str__(self):
         """
@@ -134,15 +357,24 @@ class Symbol(Feature):
         Returns:
             True if either is a descendant of the other, and both have the same subjects.
         """
+        if self is other:
+            # Common with interned symbols, see SymbolTable
+            return True
         return (issubclass(self.__class__, other.__class__) or issubclass(other.__class__, self.__class__)) and \
                self.subject == other.subject
 
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((Symbol, self.subject))
+
     def __repr__(self):
         return f'{self.__class__.__name__}({repr(self.subject)})'
 
 
 class Terminal(Symbol):
     """ Subclass of Symbol that represents terminal symbols in a grammar. Defaults to BNF syntax. """
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='', right_bound=''):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
@@ -150,12 +382,39 @@ class Terminal(Symbol):
 
 class NonTerminal(Symbol):
     """ Subclass of Symbol that represents non-terminal symbols in a grammar. Defaults to BNF syntax. """
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='/', right_bound='/'):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
 
 
+class SymbolTable:
+    """ Interns symbols, so that every symbol made through the table with the same class and arguments is the same
+    object. A grammar names the same few symbols over and over, so this saves a lot of memory on large grammars, and
+    lets equality checks between them stop at an identity check.
+
+    Symbols shared this way mustn't be changed in place (replace them instead, as Metalanguage.normalise does), or the
+    change shows up everywhere they're used.
+    """
+    __slots__ = ('_symbols',)
+
+    def __init__(self):
+        self._symbols = {}
+
+    def symbol(self, cls, *args):
+        """ Returns the symbol cls(*args), creating it if this is the first time it's been asked for. """
+        key = (cls,) + args
+        symbol = self._symbols.get(key)
+        if symbol is None:
+            symbol = self._symbols[key] = cls(*args)
+        return symbol
+
+    def __len__(self):
+        return len(self._symbols)
+
+
 class Optional(Bracket):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='[', right_bound=']'):
         if isinstance(subject, list):
@@ -164,6 +423,7 @@ class Optional(Bracket):
 
 
 class Group(Bracket):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='(', right_bound=')'):
         if isinstance(subject, list):
@@ -172,19 +432,22 @@ class Group(Bracket):
 
 
 class Repetition(Bracket):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='{', right_bound='}'):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
 
 
 class Except(BinaryOperator):
+    __slots__ = ()
 
     def __init__(self, left, right, operator='-'):
         super().__init__(left, right, operator)
 
 
-class Sequence:
+class Sequence(_StructuralHash):
     """ Abstract representation of a sequence of Features. """
+    __slots__ = ('terms', 'separator')
 
     def __init__(self, terms, separator=' '):
         # Sequence can be initialised:
@@ -195,23 +458,25 @@ class Sequence:
         if not isinstance(terms, list):
             raise GrammarException(f'{self.__class__.__name__} can only be instantiated with a list of terms.')
 
-        self.terms = terms
-        self.separator = separator
+        _set(self, 'terms', terms)
+        _set(self, 'separator', separator)
 
-    def __str__(self):
-        return self.separator.join([str(term) for term in self.terms])
+    __str__ = _str_from_parts
+
+    def _str_parts(self):
+        return _joined(self.terms, self.separator)
 
     def __eq__(self, other):
         """ Two sequences are equal if all of their terms are equal. """
         if not (issubclass(other.__class__, self.__class__) or issubclass(self.__class__, other.__class__)):
             return False
 
-        if len(self.terms) != len(other.terms):
+        if len(self.terms) != len(other.terms) or self._known_unequal(other):
             return False
 
         try:
             for i in range(0, len(self.terms)):
-                if self.terms[i] != other.terms[i]:
+                if self.terms[i] is not other.terms[i] and self.terms[i] != other.terms[i]:
                     return False
 
             return True
@@ -219,11 +484,17 @@ class Sequence:
         except IndexError:
             return False
 
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((Sequence, tuple(self.terms)))
+
     def __getitem__(self, index):
         return self.terms[index]
 
     def __setitem__(self, index, value):
         self.terms[index] = value
+        self._changed()
 
     def __len__(self):
         return len(self.terms)
@@ -243,6 +514,7 @@ class Sequence:
             self.terms += other.terms
         else:
             self.terms.append(other)
+        self._changed()
 
         return self
 
@@ -252,14 +524,15 @@ class Sequence:
         return f'{r}({terms})'
 
 class Concat(Sequence):
+    __slots__ = ()
 
     def __init__(self, terms, separator=' '):
         if not isinstance(terms, list):
             #if not issubclass(terms.__class__, Feature):
             #    raise GrammarException(f'{self.__class__.__name__} objects may only contain Feature or DefList objects.')
-            self.terms = [terms]
+            _set(self, 'terms', [terms])
         elif issubclass(terms.__class__, self.__class__):
-            self.terms = terms.terms
+            _set(self, 'terms', terms.terms)
         else:
             #for term in terms:
             #    if not issubclass(term.__class__, Feature):
@@ -267,12 +540,13 @@ class Concat(Sequence):
             #            f'Lists used to instantiate {self.__class__.__name__} objects must only contain Feature or DefList objects.'
             #        )
 
-            self.terms = terms
+            _set(self, 'terms', terms)
 
-        self.separator = separator
+        _set(self, 'separator', separator)
 
 
 class DefList(Sequence):
+    __slots__ = ()
 
     def __init__(self, terms, separator='|'):
         for term in terms:
@@ -280,12 +554,12 @@ class DefList(Sequence):
                 raise GrammarException(f'{self.__class__.__name__} requires that all terms be Concat instances.')
         super().__init__(terms, separator=separator)
 
-    def __str__(self):
-        """ Override Sequence __str__ to ensure nice spacing. """
-        return f' {self.separator} '.join(str(term) for term in self.terms)
+    def _str_parts(self):
+        """ Override Sequence _str_parts to ensure nice spacing. """
+        return _joined(self.terms, f' {self.separator} ')
 
 
-class DefinitionList:
+class DefinitionList(_StructuralHash):
     """ Represents a sequence of definitions A | B | ... | M.
 
     Args:
@@ -298,6 +572,7 @@ class DefinitionList:
         definitions: A list of Sequences corresponding to individual definitions (A, B, ... M).
         alternation: The syntax to be used for string representations of the DefinitionList instance.
     """
+    __slots__ = ('definitions', 'alt')
 
     def __init__(self, definitions, alternation='|'):
         defs = []
@@ -313,11 +588,13 @@ class DefinitionList:
         for d in defs:
             assert issubclass(d.__class__, Sequence)
 
-        self.definitions = defs
-        self.alt = alternation
+        _set(self, 'definitions', defs)
+        _set(self, 'alt', alternation)
 
-    def __str__(self):
-        return f' {self.alt} '.join([str(sequence) for sequence in self.definitions])
+    __str__ = _str_from_parts
+
+    def _str_parts(self):
+        return _joined(self.definitions, f' {self.alt} ')
 
     def __eq__(self, other):
         """ Two DefinitionLists are considered equal if they both contain the same elements.
@@ -329,7 +606,7 @@ class DefinitionList:
         if not (issubclass(self.__class__, other.__class__) or issubclass(other.__class__, self.__class__)):
             return False
 
-        if len(self.definitions) != len(other.definitions):
+        if len(self.definitions) != len(other.definitions) or self._known_unequal(other):
             return False
 
         try:
@@ -342,17 +619,23 @@ class DefinitionList:
         except IndexError:
             return False
 
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((DefinitionList, tuple(self.definitions)))
+
     def __getitem__(self, index: int):
         return self.definitions[index]
 
     def __setitem__(self, index: int, value):
         self.definitions[index] = value
+        self._changed()
 
     def __len__(self):
         return len(self.definitions)
 
 
-class Rule:
+class Rule(_StructuralHash):
     """ A representation of a production rule.
 
     Args:
@@ -371,54 +654,185 @@ class Rule:
         terminator (str): The symbol used to denote the terminator symbol. Defaults to ''.
 
     """
+    __slots__ = ('left', 'right', 'prod', 'terminator')
 
     def __init__(self, left, right, production='->', terminator=''):
-
         # If left isn't a Sequence, make it one (of length 1)
         if not issubclass(left.__class__, Sequence):
-            self.left = Sequence([left])
-        else: self.left = left
+            _set(self, 'left', Sequence([left]))
+        else: _set(self, 'left', left)
 
         # If right is a list, use it to instantiate a DefinitionList,
         # If right isn't a list or a DefinitionList, put it in a Sequence on its own and use it to instantiate a DL,
         # If right is a DefinitionList, it's fine the way it is.
         if isinstance(right, list):
-            self.right = DefList(right)
+            _set(self, 'right', DefList(right))
         elif not issubclass(right.__class__, DefList):
-            self.right = DefList([right])
+            _set(self, 'right', DefList([right]))
         else:
-            self.right = right
+            _set(self, 'right', right)
 
-        self.prod = production
-        self.terminator = terminator
+        _set(self, 'prod', production)
+        _set(self, 'terminator', terminator)
 
     def is_equivalent_to(self, other):
         return self.right == other.right
 
-    def __str__(self):
+    __str__ = _str_from_parts
+
+    def _str_parts(self):
         """
         Returns:
-            A string representation of the rule using its assigned syntax.
+            The parts of a string representation of the rule using its assigned syntax, see iter_str.
         """
-        return f'{self.left} {self.prod} {self.right} {self.terminator}'
+        return [self.left, ' ', self.prod, ' ', self.right, ' ', self.terminator]
 
     # EXPERIMENTAL consider differently named rules equal
     def __eq__(self, other):
         """ Rules are equal modulo any syntactic differences. """
         return (issubclass(self.__class__, other.__class__) or issubclass(other.__class__, self.__class__)) and \
-               self.left == other.left and self.right == other.right
+               not self._known_unequal(other) and self.left == other.left and self.right == other.right
+
+    __hash__ = _StructuralHash.__hash__
+
+    def _structural_hash(self):
+        return hash((Rule, self.left, self.right))
 
     def __repr__(self):
         return f'{self.__class__.__name__}({repr(self.left)}, {repr(self.right)})'
 
+def write_rules(rules, stream, buffer_size=65536):
+    """ Write rules to stream, one per line, as Ruleset.__str__ would but without building the whole string.
+
+    Each rule is serialised with iter_str, and the rules are collected until there are at least buffer_size
+    characters before being written, so memory use is bounded by the buffer and the largest rule.
+
+    Args:
+        rules:              An iterable of Rule.
+        stream:             A text file or any other object with a write(str) method.
+        buffer_size (int):  Number of characters to collect before each write.
+    """
+    pending = []
+    size = 0
+    for i, rule in enumerate(rules):
+        if i:
+            pending.append('\n')
+        text = ''.join(_str_pieces(rule))
+        pending.append(text)
+        size += len(text)
+        if size >= buffer_size:
+            stream.write(''.join(pending))
+            pending = []
+            size = 0
+    if pending:
+        stream.write(''.join(pending))
+
+
+class _RuleList(list):
+    """ The list behind Ruleset.rules. It notes when it's changed directly, so that the Ruleset knows to rebuild its
+    indexes, and when it's shared between Rulesets by Ruleset.copy(), so that they know to copy it before changing it.
+    A list that's been handed out by Ruleset.rules is never shared, since whoever has it can change it without asking
+    either Ruleset.
+    """
+
+    changed = False
+    shared = False
+    handed_out = False
+
+
+def _noting_change(name):
+    method = getattr(list, name)
+
+    def mutate(self, *args, **kwargs):
+        self.changed = True
+        return method(self, *args, **kwargs)
+
+    mutate.__name__ = name
+    return mutate
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend', 'insert', 'pop', 'remove',
+              'clear', 'sort', 'reverse'):
+    setattr(_RuleList, _name, _noting_change(_name))
+
+
+class _RuleIndex:
+    """ Rules grouped by the hash of the whole rule, of their left-hand side and of their right-hand side.
+
+    Each distinct Rule object is in each table once, along with the positions it's at in the Ruleset, so that lookups
+    can return matches in the same order (and as many times) as a scan through the rules would.
+
+    Attributes:
+        epoch: The hash epoch the index is up to date with.
+    """
+
+    def __init__(self, rules):
+        self.by_rule = {}
+        self.by_left = {}
+        self.by_right = {}
+        # id(rule) -> (keys, sorted list of positions)
+        self.entries = {}
+        for position, rule in enumerate(rules):
+            self.add(rule, position)
+        self.epoch = _epoch
+
+    def _tables(self):
+        return self.by_rule, self.by_left, self.by_right
+
+    def _insert(self, rule):
+        keys = (hash(rule), hash(rule.left), hash(rule.right))
+        for table, key in zip(self._tables(), keys):
+            table.setdefault(key, []).append(rule)
+        return keys
+
+    def _delete(self, rule, keys):
+        for table, key in zip(self._tables(), keys):
+            bucket = table[key]
+            # Not bucket.remove(rule), which would remove the first *equal* rule
+            del bucket[next(i for i, r in enumerate(bucket) if r is rule)]
+            if not bucket:
+                del table[key]
+
+    def add(self, rule, position):
+        entry = self.entries.get(id(rule))
+        if entry is None:
+            self.entries[id(rule)] = (self._insert(rule), [position])
+        else:
+            insort(entry[1], position)
+
+    def remove(self, rule, position):
+        keys, positions = self.entries[id(rule)]
+        positions.remove(position)
+        if not positions:
+            self._delete(rule, keys)
+            del self.entries[id(rule)]
+
+    def update(self, rule):
+        """ Move rule to wherever its current hashes put it. """
+        keys, positions = self.entries[id(rule)]
+        self._delete(rule, keys)
+        self.entries[id(rule)] = (self._insert(rule), positions)
+
+    def lookup(self, table, key, match):
+        found = [(position, rule) for rule in table.get(key, ()) if match(rule)
+                 for position in self.entries[id(rule)][1]]
+        found.sort(key=lambda pair: pair[0])
+        return [rule for _, rule in found]
+
+
 class Ruleset:
     """ A class representing a collection of Rule objects.
 
+    Rules are indexed by their hashes (see _StructuralHash), so find_rules, find_rules_for and rule_exists take the
+    same time however many rules there are. The index is built the first time it's needed, kept up to date by
+    __setitem__ and +=, and rebuilt if the rules list is changed directly or a hashed node changes. Metalanguage code
+    that changes one rule in place between lookups can call reindex(rule) instead, to avoid rebuilding it all.
+
     Args:
         rules: A list-like object, specifically one that can be passed to OrderedSet.
 
     Attributes:
-        rules (OrderedSet): The set of production rules in the Ruleset.
+        rules (list): The production rules in the Ruleset.
 
     """
 
@@ -429,7 +843,98 @@ class Ruleset:
                     'A Ruleset requires a list-like object containing only Rule instances as its rules paramater.'
                 )
 
-        self.rules = list(rules)
+        self.rules = rules
+
+    @property
+    def rules(self):
+        # Whoever asked for the list may change it, now or after a copy()
+        self._own_rules()
+        self._rules.handed_out = True
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = _RuleList(rules)
+        self._index = None
+
+    def copy(self):
+        """ Returns a new Ruleset with the same Rule objects in it.
+
+        This takes the same time however many rules there are: the list of rules is shared until either Ruleset
+        changes it, and the rules themselves are always shared, so they should be replaced rather than changed in
+        place (see Metalanguage). The exception is a list that's been got from self.rules, which stays self's alone
+        (the new Ruleset gets a copy of it), since it may still be changed through that reference.
+        """
+        new = self.__class__.__new__(self.__class__)
+        if self._rules.handed_out:
+            new._rules = _RuleList(self._rules)
+        else:
+            self._rules.shared = True
+            new._rules = self._rules
+        new._index = None
+        return new
+
+    def _own_rules(self):
+        """ Copy the list of rules if it's shared with another Ruleset, before it's changed. """
+        if self._rules.shared:
+            rules = _RuleList(self._rules)
+            rules.changed = self._rules.changed
+            self._rules = rules
+
+    def index_of(self, rule):
+        """ Returns the position of rule (the object itself, not just an equal rule) in the Ruleset.
+
+        Raises:
+            ValueError: If rule isn't in the Ruleset.
+        """
+        try:
+            entry = self._current_index().entries.get(id(rule))
+        except TypeError:
+            self._index = None
+            entry = None
+            for position, r in enumerate(self._rules):
+                if r is rule:
+                    return position
+        if entry is None:
+            raise ValueError(f'{rule!r} is not in the Ruleset.')
+        return entry[1][0]
+
+    def _current_index(self):
+        if self._index is None or self._rules.changed or self._index.epoch != _epoch:
+            self._index = _RuleIndex(self._rules)
+            self._rules.changed = False
+        return self._index
+
+    def _lookup(self, table, key, match):
+        """ Rules in the table of the index named table whose key() is equal to key, and for which match() is True. """
+        try:
+            index = self._current_index()
+            return index.lookup(getattr(index, table), key(), match)
+        except TypeError:
+            # Something in the rules (or what's being looked for) can't be hashed, e.g. a list where a Feature
+            # should be. Fall back to checking every rule.
+            self._index = None
+            return [rule for rule in self._rules if match(rule)]
+
+    def reindex(self, rule=None):
+        """ Bring the index up to date after rules in the Ruleset have been changed in place.
+
+        Args:
+            rule (Rule):    If given, only this rule is re-indexed, and it's taken to be the only one that has changed
+                            since the index was last up to date (it doesn't have to be in the Ruleset). Otherwise
+                            the index is rebuilt when it's next used.
+        """
+        if rule is None or self._index is None or self._rules.changed:
+            self._index = None
+            return
+
+        if id(rule) in self._index.entries:
+            try:
+                self._index.update(rule)
+            except TypeError:
+                self._index = None
+                return
+        self._index.epoch = _epoch
 
     def find_rules(self, rule):
         """ Returns rules equal to the one provided. See Rule __eq__ for equality check.
@@ -439,12 +944,7 @@ class Ruleset:
         Returns:
             A list of matching rules.
         """
-        ret = []
-        for r in self.rules:
-            if r == rule:
-                ret.append(r)
-
-        return ret
+        return self._lookup('by_rule', lambda: hash(rule), lambda r: r == rule)
 
     def find_rules_for(self, def_list):
         """ Returns rules whose right-hand side is equal to def_list.
@@ -455,7 +955,18 @@ class Ruleset:
         if not issubclass(def_list.__class__, DefList):
             raise GrammarException('The right-hand side of a rule must be a DefList.')
 
-        return [rule for rule in self.rules if rule.right == def_list]
+        return self._lookup('by_right', lambda: hash(def_list), lambda rule: rule.right == def_list)
+
+    def find_rules_named(self, left):
+        """ Returns rules whose left-hand side is equal to left.
+
+        Args:
+            left: A Sequence (or a single Feature) to find the rules for.
+        """
+        if not issubclass(left.__class__, Sequence):
+            left = Sequence([left])
+
+        return self._lookup('by_left', lambda: hash(left), lambda rule: rule.left == left)
 
     def rule_exists(self, new_rule):
         """ Returns True if new_rule already exists in the ruleset.
@@ -463,10 +974,7 @@ class Ruleset:
         Args:
             new_rule (Rule): The rule to be checked.
         """
-        for rule in self.rules:
-            if rule == new_rule:
-                return True
-        return False
+        return bool(self.find_rules(new_rule))
 
     def update_rules(self, production=None, alternation=None, terminator=None):
         """ Update the production, alternation and terminator syntax for all Rules in the Ruleset. Syntax will not
@@ -478,16 +986,20 @@ class Ruleset:
             terminator:     New terminator symbol.
 
         """
-        for rule in self.rules:
+        for rule in self._rules:
             if production:
                 rule.prod = production
             if alternation:
-                rule.right.alt = alternation
+                rule.right.separator = alternation
             if terminator:
                 rule.terminator = terminator
 
     def __str__(self):
-        return '\n'.join(str(rule) for rule in self.rules)
+        return '\n'.join(str(rule) for rule in self._rules)
+
+    def write(self, stream, buffer_size=65536):
+        """ Write str(self) to stream a rule at a time, see write_rules. """
+        write_rules(self._rules, stream, buffer_size)
 
     def __eq__(self, other: 'Ruleset') -> bool:
         """ Two Rulesets are deemed equal if they contain exactly the same Rules.
@@ -498,39 +1010,316 @@ class Ruleset:
         Returns:
             True if Rulesets are equal, False otherwise.
         """
-        if len(self.rules) != len(other.rules):
+        if len(self._rules) != len(other._rules):
             return False
 
-        for i in range(0, len(self.rules)):
-            if self.rules[i] != other.rules[i]:
+        for i in range(0, len(self._rules)):
+            if self._rules[i] != other._rules[i]:
                 return False
 
         return True
 
+    def __hash__(self):
+        """ Rulesets hash their rules every time, since self.rules is often changed directly. Each Rule's hash is
+        cached though, so this is cheap unless the rules have changed. """
+        return hash((Ruleset, tuple(self._rules)))
+
     def __len__(self):
         """ The length of a Ruleset object is the length of its collection of Rules. """
-        return len(self.rules)
+        return len(self._rules)
 
     def __getitem__(self, index: int):
-        return self.rules[index]
+        return self._rules[index]
 
     def __setitem__(self, index: int, value):
-        self.rules[index] = value
+        self._own_rules()
+        if self._index is None or not isinstance(index, int) or self._rules.changed:
+            self._rules[index] = value
+            return
+
+        position = range(len(self._rules))[index]
+        old = self._rules[position]
+        list.__setitem__(self._rules, position, value)
+        try:
+            self._index.remove(old, position)
+            self._index.add(value, position)
+        except TypeError:
+            self._index = None
+
+    def __getstate__(self):
+        # The index is keyed by id(), so it has to be rebuilt for a copy
+        state = self.__dict__.copy()
+        state['_index'] = None
+        return state
 
     def __add__(self, other):
         # Addition is only defined for Rulesets and Rules.
         if issubclass(other.__class__, Ruleset):
-            return self.__class__(self.rules + other.rules)
+            return self.__class__(self._rules + other._rules)
         elif issubclass(other.__class__, Rule):
-            return self.__class__(self.rules + [other])
+            return self.__class__(self._rules + [other])
         else:
             raise NotImplemented
 
+    def __iadd__(self, other):
+        # Add to this Ruleset in place, indexing the new rules if there's an index already
+        if issubclass(other.__class__, Ruleset):
+            new_rules = list(other._rules)
+        elif issubclass(other.__class__, Rule):
+            new_rules = [other]
+        else:
+            return NotImplemented
+
+        self._own_rules()
+        for rule in new_rules:
+            if self._index is not None and not self._rules.changed:
+                try:
+                    self._index.add(rule, len(self._rules))
+                except TypeError:
+                    self._index = None
+            list.append(self._rules, rule)
+        return self
+
     def __radd__(self, other):
         # Addition is only defined for Rulesets and Rules
         if issubclass(other.__class__, Ruleset):
-            return self.__class__(other.rules + self.rules)
+            return self.__class__(other._rules + self._rules)
         elif issubclass(other.__class__, Rule):
-            return self.__class__([other] + self.rules)
+            return self.__class__([other] + self._rules)
         else:
             raise NotImplemented
+
+    def freeze(self):
+        """ Returns a PersistentRuleset with the same rules. """
+        return PersistentRuleset(self._rules)
+
+
+def replace_at(node, path, value):
+    """ Returns a copy of node with the part of it at path replaced by value. Nothing is changed in place: only the
+    nodes along path are copied, and everything else is shared with node.
+
+    Args:
+        node:           A Rule, Sequence, DefinitionList or Feature.
+        path (tuple):   The steps from node to the part being replaced. An int indexes the terms of a Sequence (or
+                        the definitions of a DefinitionList), and a str names an attribute, e.g. ('right', 0, 1) is
+                        the second term of the first definition of a Rule.
+        value:          The new part.
+    """
+    if not path:
+        return value
+
+    step, rest = path[0], path[1:]
+    new = copy.copy(node)
+    if isinstance(step, int):
+        name = 'definitions' if isinstance(node, DefinitionList) else 'terms'
+        items = list(getattr(node, name))
+        items[step] = replace_at(items[step], rest, value)
+        setattr(new, name, items)
+    else:
+        setattr(new, step, replace_at(getattr(node, step), rest, value))
+    return new
+
+
+# Persistent vectors are tries of tuples, with up to 2 ** _BITS children per node
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+
+
+class _PVector:
+    """ An immutable list that shares structure between versions. Getting, setting and appending take O(log n) time,
+    and setting or appending copies only the log n tuples on the path to the item. """
+    __slots__ = ('size', 'shift', 'root')
+
+    def __init__(self, size, shift, root):
+        self.size = size
+        self.shift = shift
+        self.root = root
+
+    @classmethod
+    def from_iterable(cls, items):
+        level = [tuple(items)]
+        level = [level[0][i:i + _WIDTH] for i in range(0, len(level[0]), _WIDTH)] or [()]
+        size = sum(len(leaf) for leaf in level)
+        shift = 0
+        while len(level) > 1:
+            level = [tuple(level[i:i + _WIDTH]) for i in range(0, len(level), _WIDTH)]
+            shift += _BITS
+        return cls(size, shift, level[0])
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        node = self.root
+        for shift in range(self.shift, 0, -_BITS):
+            node = node[(index >> shift) & _MASK]
+        return node[index & _MASK]
+
+    def __iter__(self):
+        return self._iter(self.root, self.shift)
+
+    def _iter(self, node, shift):
+        if shift == 0:
+            yield from node
+        else:
+            for child in node:
+                yield from self._iter(child, shift - _BITS)
+
+    def set(self, index, value):
+        return _PVector(self.size, self.shift, self._set(self.root, self.shift, index, value))
+
+    def _set(self, node, shift, index, value):
+        i = (index >> shift) & _MASK
+        if shift:
+            value = self._set(node[i], shift - _BITS, index, value)
+        return node[:i] + (value,) + node[i + 1:]
+
+    def append(self, value):
+        if self.size == 1 << (self.shift + _BITS):
+            # Full, so start a new level
+            return _PVector(self.size + 1, self.shift + _BITS, (self.root, self._path(self.shift, value)))
+        return _PVector(self.size + 1, self.shift, self._append(self.root, self.shift, self.size, value))
+
+    def _append(self, node, shift, index, value):
+        if shift == 0:
+            return node + (value,)
+        i = (index >> shift) & _MASK
+        if i < len(node):
+            return node[:i] + (self._append(node[i], shift - _BITS, index, value),)
+        return node + (self._path(shift - _BITS, value),)
+
+    def _path(self, shift, value):
+        node = (value,)
+        for _ in range(0, shift, _BITS):
+            node = (node,)
+        return node
+
+    def equal_to(self, other):
+        """ Item by item equality, skipping any subtries the two have in common. """
+        if self.size != other.size:
+            return False
+        if self.shift != other.shift:
+            return list(self) == list(other)
+        return self._equal(self.root, other.root, self.shift)
+
+    def _equal(self, a, b, shift):
+        if a is b:
+            return True
+        if len(a) != len(b):
+            return False
+        if shift == 0:
+            return all(x is y or x == y for x, y in zip(a, b))
+        return all(self._equal(x, y, shift - _BITS) for x, y in zip(a, b))
+
+
+class PersistentRuleset:
+    """ An immutable collection of Rule objects. Methods that would change it return a new PersistentRuleset instead,
+    which shares everything that hasn't changed with the old one, so keeping many versions of a grammar only costs
+    as much as the changes between them.
+
+    The Rules (and everything in them) are shared between versions too, so they mustn't be changed in place. Use
+    replace() (or replace_at()) to make changed copies of them instead.
+
+    Args:
+        rules: An iterable of Rule objects.
+    """
+    __slots__ = ('_rules', '_hash')
+
+    def __init__(self, rules=()):
+        rules = list(rules)
+        for rule in rules:
+            if not issubclass(rule.__class__, Rule):
+                raise GrammarException('A PersistentRuleset can only contain Rule instances.')
+        self._rules = _PVector.from_iterable(rules)
+        self._hash = None
+
+    @classmethod
+    def _from_vector(cls, rules):
+        new = cls.__new__(cls)
+        new._rules = rules
+        new._hash = None
+        return new
+
+    def set(self, index, rule):
+        """ Returns a new version with the rule at index replaced by rule. """
+        if not issubclass(rule.__class__, Rule):
+            raise GrammarException('A PersistentRuleset can only contain Rule instances.')
+        return self._from_vector(self._rules.set(self._position(index), rule))
+
+    def replace(self, index, path, value):
+        """ Returns a new version with part of the rule at index replaced, see replace_at. """
+        index = self._position(index)
+        return self._from_vector(self._rules.set(index, replace_at(self._rules[index], path, value)))
+
+    def append(self, rule):
+        """ Returns a new version with rule added to the end. """
+        if not issubclass(rule.__class__, Rule):
+            raise GrammarException('A PersistentRuleset can only contain Rule instances.')
+        return self._from_vector(self._rules.append(rule))
+
+    def delete(self, index):
+        """ Returns a new version without the rule at index. This has to rebuild the version, so takes O(n) time. """
+        index = self._position(index)
+        return self.__class__(rule for i, rule in enumerate(self._rules) if i != index)
+
+    def thaw(self):
+        """ Returns a (mutable) Ruleset with the same rules. """
+        return Ruleset(list(self._rules))
+
+    def _position(self, index):
+        # Supports negative indices, and raises IndexError for ones that are out of range
+        return range(len(self._rules))[index]
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._rules[i] for i in range(len(self._rules))[index]]
+        return self._rules[self._position(index)]
+
+    def __iter__(self):
+        return iter(self._rules)
+
+    def __str__(self):
+        return '\n'.join(str(rule) for rule in self._rules)
+
+    def write(self, stream, buffer_size=65536):
+        """ Write str(self) to stream a rule at a time, see write_rules. """
+        write_rules(self._rules, stream, buffer_size)
+
+    def __eq__(self, other):
+        """ Equal to another PersistentRuleset or Ruleset with equal rules in the same order, see Ruleset __eq__. """
+        if isinstance(other, PersistentRuleset):
+            return self._rules.equal_to(other._rules)
+        if isinstance(other, Ruleset):
+            return len(self) == len(other) and all(a == b for a, b in zip(self._rules, other._rules))
+        return NotImplemented
+
+    def __hash__(self):
+        # The same as Ruleset's, but it never changes so only has to be worked out once
+        if self._hash is None:
+            self._hash = hash((Ruleset, tuple(self._rules)))
+        return self._hash
+
+    def __getstate__(self):
+        # The cached hash means nothing in another process
+        return self._rules
+
+    def __setstate__(self, state):
+        self._rules = state
+        self._hash = None
+
+    def __add__(self, other):
+        if issubclass(other.__class__, Rule):
+            return self.append(other)
+        if isinstance(other, (Ruleset, PersistentRuleset)):
+            rules = self._rules
+            for rule in other:
+                rules = rules.append(rule)
+            return self._from_vector(rules)
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({list(self._rules)!r})'
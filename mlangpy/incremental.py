@@ -0,0 +1,252 @@
+""" Keep a parsed grammar up to date as its text is edited, re-parsing only the rules an edit touches. """
+
+from bisect import bisect_left, bisect_right
+
+from lark.exceptions import UnexpectedEOF, UnexpectedInput
+
+from mlangpy.builders import _builders
+from mlangpy.grammar import Ruleset
+from mlangpy.metalanguages import BNF, EBNF, ABNF, RBNF
+from mlangpy.metaparsers import PARSERS, _parse_piece, _shift_error
+from mlangpy.splitting import RuleText, _splitter
+
+
+METALANGUAGES = {
+    'bnf': BNF,
+    'ebnf': EBNF,
+    'abnf': ABNF,
+    'rbnf': RBNF
+}
+
+
+class _Spans:
+    """ Where each span of the text starts, and the index in the ruleset of the first rule parsed from it.
+
+    An edit moves every span after it, so rather than updating them all, the shift is only recorded: entries from
+    pivot onwards are stored without it. The next edit moves the pivot to itself, which only touches the entries
+    between the two edits, so an edit takes time in proportion to how far it is from the last one (a few spans, while
+    typing) rather than to the size of the grammar.
+
+    Attributes:
+        pivot (int):        Index of the first entry stored without the shift.
+        shift (int):        How far the spans from pivot onwards have moved in the text.
+        rule_shift (int):   How far their first rules have moved in the ruleset.
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._first_rules = []
+        self.pivot = 0
+        self.shift = 0
+        self.rule_shift = 0
+
+    def __len__(self):
+        return len(self._starts)
+
+    def start(self, i):
+        return self._starts[i] + self.shift if i >= self.pivot else self._starts[i]
+
+    def first_rule(self, i):
+        return self._first_rules[i] + self.rule_shift if i >= self.pivot else self._first_rules[i]
+
+    def bisect_left(self, offset):
+        """ Index of the first span starting at or after offset. """
+        i = bisect_left(self._starts, offset, 0, self.pivot)
+        if i == self.pivot:
+            i = bisect_left(self._starts, offset - self.shift, self.pivot)
+        return i
+
+    def bisect_right(self, offset):
+        """ Index of the first span starting after offset. """
+        i = bisect_right(self._starts, offset, 0, self.pivot)
+        if i == self.pivot:
+            i = bisect_right(self._starts, offset - self.shift, self.pivot)
+        return i
+
+    def replace(self, first, last, starts, counts, rule_index, shift, rule_shift):
+        """ Replace spans first to last (exclusive) with ones starting at starts, with counts rules each from
+        rule_index onwards, and move the spans after them by shift in the text and rule_shift in the ruleset. """
+        self._move_pivot(last)
+        first_rules = []
+        for count in counts:
+            first_rules.append(rule_index)
+            rule_index += count
+
+        self._starts[first:last] = starts
+        self._first_rules[first:last] = first_rules
+        self.pivot = first + len(starts)
+        self.shift += shift
+        self.rule_shift += rule_shift
+
+    def _move_pivot(self, to):
+        starts = self._starts
+        first_rules = self._first_rules
+        if to > self.pivot:
+            for i in range(self.pivot, to):
+                starts[i] += self.shift
+                first_rules[i] += self.rule_shift
+        else:
+            for i in range(to, self.pivot):
+                starts[i] -= self.shift
+                first_rules[i] -= self.rule_shift
+        self.pivot = to
+
+
+class ParseSession:
+    """ A grammar's text along with the Metalanguage parsed from it, which can be edited a piece at a time.
+
+    The text is split into rules as in mlangpy.splitting, and the session remembers which span of the text each rule
+    came from. An edit re-splits the text from the span before it until the spans line up with the old ones again, and
+    only the rules in between are re-parsed. Every other rule keeps its existing Rule object, and nothing else about
+    the grammar is looked at, so an edit takes about as long however big the grammar is.
+
+    Args:
+        text (str):             The grammar.
+        metalanguage (str):     'bnf', 'ebnf', 'abnf' or 'rbnf'.
+        parser (str):           'earley', 'lalr' or 'auto', see metaparsers.parse_*.
+        fused (bool):           See metaparsers.parse_*.
+
+    Attributes:
+        text (str):                     The current text.
+        metalanguage (Metalanguage):    The grammar parsed from text. Its ruleset is updated in place by edit().
+    """
+
+    def __init__(self, text, metalanguage, parser='earley', fused=False):
+        self.grammar = metalanguage.lower()
+        if self.grammar not in METALANGUAGES:
+            raise ValueError(f'Unknown metalanguage {metalanguage!r}, expected one of {", ".join(METALANGUAGES)}.')
+        if parser not in PARSERS:
+            raise ValueError(f'Unknown parser {parser!r}, expected one of {", ".join(PARSERS)}.')
+        if fused and parser == 'earley':
+            raise ValueError('Fused parsing is only available with the LALR(1) parser.')
+        self.parser = parser
+        self.fused = fused
+
+        # The span of text each rule came from, and the text of each span. Spans with nothing but whitespace and
+        # comments have no rules.
+        self._spans = _Spans()
+        self._texts = []
+        self._length = 0
+        # The whole text, put together when it's asked for
+        self._text = ''
+        self.metalanguage = METALANGUAGES[self.grammar](Ruleset([]))
+        self._is_blank = _splitter(self.grammar).is_blank
+        self.edit(0, 0, text)
+
+    @property
+    def text(self):
+        """ The current text. """
+        if self._text is None:
+            self._text = ''.join(self._texts)
+        return self._text
+
+    @property
+    def ruleset(self):
+        return self.metalanguage.ruleset
+
+    def edit(self, offset, length, replacement):
+        """ Replace length characters of the text, starting at offset, with replacement.
+
+        If the new text can't be parsed, the exception is raised (with its position in the new text) and the session
+        is left as it was.
+
+        Args:
+            offset (int):       Position of the first character to replace.
+            length (int):       Number of characters to replace.
+            replacement (str):  Text to put in their place.
+
+        Returns:
+            A list of the new Rule objects, in the order they appear in the ruleset.
+        """
+        if offset < 0 or length < 0 or offset + length > self._length:
+            raise ValueError(f'Edit at {offset} of length {length} is outside of the text (length {self._length}).')
+
+        delta = len(replacement) - length
+        old_end = offset + length
+
+        # Start from the span before the one containing offset, since the edit could remove the start of the rule it's
+        # in and join the two together.
+        spans = self._spans
+        first = max(0, spans.bisect_right(offset) - 2)
+        start = spans.start(first) if len(spans) else 0
+        # Old spans that start at or after the end of the edit, and so are unchanged apart from their position
+        following = spans.bisect_left(old_end)
+
+        # Only the text of the spans the edit touches is put together, never the whole text
+        old = ''.join(self._texts[first:following])
+        edited = old[:offset - start] + replacement + old[old_end - start:]
+        pieces, last = self._resplit(edited, start, following, delta)
+
+        rules = []
+        for piece in pieces:
+            if self._is_blank(piece.text):
+                rules.append([])
+                continue
+            try:
+                rules.append(_parse_piece(self.grammar, piece, _builders[self.grammar], self.parser, self.fused))
+            except (UnexpectedInput, UnexpectedEOF) as e:
+                # The spans before first haven't changed, so their lines can be counted in their old texts
+                _shift_error(e, self._position(first))
+                raise
+
+        # Everything's parsed, so update the session
+        rule_count = len(self.ruleset.rules)
+        rule_index = spans.first_rule(first) if first < len(spans) else rule_count
+        rule_stop = spans.first_rule(last) if last < len(spans) else rule_count
+        new_rules = [rule for span_rules in rules for rule in span_rules]
+        self.ruleset.rules[rule_index:rule_stop] = new_rules
+        spans.replace(first, last, [piece.offset for piece in pieces], [len(span_rules) for span_rules in rules],
+                      rule_index, delta, len(new_rules) - (rule_stop - rule_index))
+        self._texts[first:last] = [piece.text for piece in pieces]
+
+        self._length += delta
+        self._text = None
+        return new_rules
+
+    def _resplit(self, edited, start, following, delta):
+        """ Split the edited text from start, then the old spans from following onwards, until a boundary falls at the
+        (shifted) start of one of the old spans.
+
+        Returns:
+            A tuple of the new pieces, and the index of the first old span that's still valid (len(self._spans) if
+            there isn't one).
+        """
+        spans = self._spans
+        splitter = _splitter(self.grammar)
+        splitter.keep_blank = True
+        splitter.offset = start
+        # Lines and columns are relative to start, and only worked out properly if there's an error
+        splitter.line = splitter.column = 1
+
+        # The (shifted) starts of the old spans are where the new split can line up with the old one again
+        sync_points = {}
+        pieces = []
+        chunk = edited
+        for k in range(following, len(spans)):
+            sync_points[spans.start(k) + delta] = k
+            new_pieces = splitter.feed(chunk)
+            chunk = self._texts[k]
+
+            # Once a rule ends where an old span started, the rest of the text will split exactly as it did before.
+            # Rules only end when the next one starts, so this may only be seen a span later.
+            for i, piece in enumerate(new_pieces):
+                if piece.end in sync_points:
+                    return pieces + new_pieces[:i + 1], sync_points[piece.end]
+            pieces += new_pieces
+
+        pieces += splitter.feed(chunk)
+        pieces += splitter.close()
+        return pieces, len(spans)
+
+    def _position(self, first):
+        """ A RuleText giving the line and column of the start of span first, for moving errors into place. Only the
+        texts of the spans before it are looked at, without putting them together. """
+        texts = self._texts[:first]
+        line = sum(text.count('\n') for text in texts) + 1
+        column = 1
+        for text in reversed(texts):
+            newline = text.rfind('\n')
+            column += len(text) - newline - 1
+            if newline != -1:
+                break
+        return RuleText('', 0, line, column)
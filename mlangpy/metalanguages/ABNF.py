@@ -1,34 +1,40 @@
 from ..grammar import *
+from ..grammar import _set
 from .Metalanguage import Metalanguage
 
 # We don't need to define new classes for Concat, Group or Optional - the syntax is the same.
 
 
 class ABNFDefList(DefList):
+    __slots__ = ()
 
     def __init__(self, terms, separator='/'):
         super().__init__(terms, separator=separator)
 
 
 class ABNFRule(Rule):
+    __slots__ = ()
 
     def __init__(self, left, right, production='=', terminator=''):
         super().__init__(left, right, production=production, terminator=terminator)
 
 
 class ABNFIncRule(Rule):
+    __slots__ = ()
 
     def __init__(self, left, right, production='=/', terminator=''):
         super().__init__(left, right, production=production, terminator=terminator)
 
 
 class ABNFTerminal(Terminal):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='"', right_bound='"'):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
 
 
 class ABNFNonTerminal(NonTerminal):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='', right_bound=''):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
@@ -38,6 +44,8 @@ class ABNFRepetition(TernaryOperator):
     """ Model ABNF specific and variable repetition in one - this is possible because specific repetition
         is just a special case of variable repetition.
     """
+    __slots__ = ('compact',)
+
     def __init__(self, subject, left='', right='', compact=True, operator1_sym='*', operator2_sym=''):
         if not (isinstance(left, int) or left == ''):
             raise GrammarException(f'{self.__class__.__name__} requires an integer or \'\' as its left argument.')
@@ -46,20 +54,21 @@ class ABNFRepetition(TernaryOperator):
         if not issubclass(subject.__class__, Feature):
             raise GrammarException(f'{self.__class__.__name__} requires a Feature as its subject argument.')
         super().__init__(left, right, subject, operator1_sym, operator2_sym)
-        self.compact = compact
+        _set(self, 'compact', compact)
 
-    def __str__(self):
+    def _str_parts(self):
         if self.compact and self.left != '' and self.left == self.middle:
-            return f'{self.left}{self.right}'
+            return [self.left, self.right]
         else:
-            return super().__str__()
+            return super()._str_parts()
 
 
 class ABNFChar(Terminal):
+    __slots__ = ('denom', 'char_sym')
 
     def __init__(self, denom, subject, left_bound='', right_bound='', char_sym='%'):
-        self.denom = denom
-        self.char_sym = char_sym
+        _set(self, 'denom', denom)
+        _set(self, 'char_sym', char_sym)
         super().__init__(str(subject), left_bound=left_bound, right_bound=right_bound)
 
     def __str__(self):
@@ -67,6 +76,7 @@ class ABNFChar(Terminal):
 
 
 class ABNFCharRange(BinaryOperator):
+    __slots__ = ()
 
     def __init__(self, left, right, operator_sym='-'):
         if not issubclass(left.__class__, ABNFChar):
@@ -81,27 +91,35 @@ class ABNFCharRange(BinaryOperator):
 
 # Will this being a Sequence cause equality issues?
 class ABNFCharConcat(Sequence):
-    pass
+    __slots__ = ()
 
 
 class ABNFComment(Symbol):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound=';', right_bound='\n'):
         super().__init__(subject, left_bound, right_bound)
 
 
+def grouped_repetition(x):
+    """ An ABNFRepetition of any number of x, which is grouped since it can only repeat a single element. """
+    return ABNFRepetition(Group(x))
+
+
 class ABNF(Metalanguage):
 
     def __init__(self, ruleset, normalise=False):
         super().__init__(ruleset, syntax_dict={
             Concat: Concat,
             DefList: ABNFDefList,
-            Rule: Rule,
+            Rule: ABNFRule,
             Terminal: ABNFTerminal,
             NonTerminal: ABNFNonTerminal,
+            # Characters aren't made from their subject alone, so they're left as they are
+            ABNFChar: None,
 
             # Auxiliary
             Optional: Optional,
             Group: Group,
-            Repetition: ABNFRepetition,
+            Repetition: grouped_repetition,
         }, normalise=normalise)
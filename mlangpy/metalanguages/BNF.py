@@ -3,18 +3,25 @@ from .Metalanguage import Metalanguage
 
 
 class BNFRule(Rule):
+    __slots__ = ()
 
     def __init__(self, left, right, production='::=', terminator=''):
         super().__init__(left, right, production=production, terminator=terminator)
 
 
 class BNFTerminal(Terminal):
+    __slots__ = ()
 
     def __init__(self, subject):
         super().__init__(subject, left_bound='', right_bound='')
 
+    def __str__(self):
+        # The empty string is written "", as BNF has no other way to write it
+        return super().__str__() or '""'
+
 
 class BNFNonTerminal(NonTerminal):
+    __slots__ = ()
 
     def __init__(self, subject):
         super().__init__(subject, left_bound='<', right_bound='>')
@@ -2,42 +2,59 @@ from ..grammar import *
 from .Metalanguage import Metalanguage
 
 class EBNFTerminal(Terminal):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='"', right_bound='"'):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
 
 
 class EBNFDefinitionList(DefinitionList):
+    __slots__ = ()
 
     def __init__(self, definitions, alternation='|'):
         super().__init__(definitions, alternation=alternation)
 
 
 class EBNFNonTerminal(NonTerminal):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='', right_bound=''):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
 
 
-class EBNFConcat(Sequence):
+class EBNFConcat(Concat):
+    __slots__ = ()
 
     def __init__(self, terms, separator=', '):
         super().__init__(terms, separator=separator)
 
 
 class EBNFRule(Rule):
+    __slots__ = ()
 
     def __init__(self, left, right, production='=', terminator=';'):
         super().__init__(left, right, production=production, terminator=terminator)
 
 
 class EBNFRepetition(Repetition):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='{', right_bound='}'):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
 
 
+class EBNFFixedRepetition(BinaryOperator):
+    """ A syntactic factor of the form 3 * "a", i.e. exactly 3 repetitions of the right-hand side. """
+    __slots__ = ()
+
+    def __init__(self, left, right, operator_sym=' * '):
+        if not isinstance(left, int):
+            raise GrammarException(f'{self.__class__.__name__} requires an integer as its left argument.')
+        super().__init__(left, right, operator_sym)
+
+
 class EBNFSpecialSequence(Bracket):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='?', right_bound='?'):
         super().__init__(subject, left_bound=left_bound, right_bound=right_bound)
@@ -48,6 +65,8 @@ class EBNF(Metalanguage):
     def __init__(self, ruleset: Ruleset, normalise=False):
         super().__init__(ruleset, syntax_dict={
                 # Core
+                Concat: EBNFConcat,
+                DefList: DefList,
                 Sequence: Concat,
                 DefinitionList: EBNFDefinitionList,
                 Rule: EBNFRule,
@@ -1,12 +1,158 @@
+import copy
+import os
+import tempfile
+from contextlib import contextmanager
 from mlangpy.grammar import *
+from mlangpy.grammar import _slot_names
+
+
+def _copy_sequence(sequence):
+    new = copy.copy(sequence)
+    new.terms = list(sequence.terms)
+    return new
+
+
+def _copy_rule(rule):
+    """ Copy the parts of rule that the Metalanguage methods change in place: the Rule itself, its left-hand side,
+    its definition list and the definitions in it. The Features in them are shared. """
+    new = copy.copy(rule)
+    new.left = _copy_sequence(rule.left)
+    new.right = _copy_sequence(rule.right)
+    new.right.terms = [_copy_sequence(definition) for definition in rule.right.terms]
+    return new
+
+
+def _umask(probe_path):
+    """ The process's umask, found without changing it. os.umask can only read it by setting it, and any other thread
+    that creates a file in between gets the wrong permissions.
+
+    Args:
+        probe_path (str):   A path no file has, which is created and removed if the umask can't be read from /proc.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+
+    # Otherwise see what it takes away from a new file's permissions. That misses the execute bits, which don't
+    # matter for files.
+    fd = os.open(probe_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        return 0o666 & ~os.fstat(fd).st_mode
+    finally:
+        os.close(fd)
+        os.remove(probe_path)
+
+
+@contextmanager
+def _open_for_writing(path, atomic):
+    """ Open path as a text file to write to.
+
+    With atomic, the file is written under a temporary name in the same directory and only renamed to path once it's
+    complete, so path is never left half-written (it's untouched if anything goes wrong).
+    """
+    if not atomic:
+        with open(path, 'w') as f:
+            yield f
+        return
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        # mkstemp makes files only the owner can read, so give it the permissions a plain open() would have
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o666 & ~_umask(tmp_path + '.umask')
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, mode)
+        else:
+            os.chmod(tmp_path, mode)
+
+        with os.fdopen(fd, 'w') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class _Syntax(dict):
+    """ The dict behind Metalanguage.syntax. It caches the constructor each class of feature is normalised with, and
+    throws the cache away whenever it's changed.
+
+    Attributes:
+        version (int):  Counts the changes made to the dict.
+    """
+    # Class attributes, since unpickling fills the dict through __setitem__ before the instance's own are restored
+    version = 0
+    _constructors = None
+
+    def constructor(self, cls):
+        """ The value for the first class in the MRO of cls that's a key, or None if there isn't one. """
+        constructors = self._constructors
+        if constructors is None:
+            constructors = self._constructors = {}
+        try:
+            return constructors[cls]
+        except KeyError:
+            pass
+
+        constructor = None
+        for base in cls.__mro__:
+            if base in self:
+                constructor = self[base]
+                break
+        constructors[cls] = constructor
+        return constructor
+
+    def __reduce__(self):
+        # The cache is rebuilt as it's needed, and may not be picklable anyway
+        return self.__class__, (dict(self),), {'version': self.version}
+
+
+def _noting_change(name):
+    method = getattr(dict, name)
+
+    def mutate(self, *args, **kwargs):
+        self.version += 1
+        self._constructors = None
+        return method(self, *args, **kwargs)
+
+    mutate.__name__ = name
+    return mutate
+
+
+for _name in ('__setitem__', '__delitem__', '__ior__', 'clear', 'pop', 'popitem', 'setdefault', 'update'):
+    if hasattr(dict, _name):
+        setattr(_Syntax, _name, _noting_change(_name))
 
 
 class Metalanguage:
     """ The Metalanguage class provides a base for representing various metalanguages.
 
+    The ruleset starts off sharing its rules with the Ruleset it was made from (see Ruleset.copy), so making a
+    Metalanguage takes the same time however big the ruleset is. Methods that change a rule (e.g. normalise) copy it
+    first, so the original Ruleset is never changed. Code changing rules of the ruleset in place itself should do the
+    same, e.g. with m.ruleset[i] = copy.deepcopy(m.ruleset[i]).
+
+    This goes for the remove_* methods and eliminate_groups too: the rule they're given is replaced in the ruleset by a
+    changed copy, and left as it was, so look it up in the ruleset again (e.g. m.ruleset[i]) to see the changes. Only
+    a rule that isn't in the ruleset is changed in place.
+
+    normalise() remembers which rules it left in normal form, and the classes of feature in each, so the next call only
+    looks at rules that have been replaced or added since, or that contain a class whose constructor in the syntax has
+    changed. Rules changed in place rather than replaced need to be passed to mark_changed().
+
     Attributes:
         ruleset (Ruleset):  A set of production rules.
-        syntax (dict):      A number of syntax settings.
+        syntax (dict):      A number of syntax settings, mapping each class of feature to the constructor that
+                            normalise() rebuilds it with. Features use the entry for the nearest class in their MRO.
     """
 
     def __init__(self, ruleset, syntax_dict=None, normalise=False):
@@ -20,7 +166,14 @@ class Metalanguage:
             normalise:          Set to True to immediately attempt to normalise the Ruleset to correspond to syntax
                                 settings.
         """
-        self.ruleset = copy.deepcopy(ruleset)
+        self.ruleset = ruleset.copy()
+        # Rules that have been copied by _writable, by id
+        self._owned = {}
+        # What normalise() last did: (rule, classes of feature looked up in it) of the rules it left normal, by id,
+        # the constructor each of those classes had, and the form it gave rules
+        self._normal = {}
+        self._resolved = {}
+        self._form = None
         if not syntax_dict:
             self.syntax = {
                 # Essential for all grammars
@@ -44,110 +197,241 @@ class Metalanguage:
 
         if normalise: self.normalise()
 
-    # TODO Method for automatically creating a lark file for recognising grammars using the current
-    #       syntax of the Metalanguage instance. However, on its own the grammar won't be able to be
-    #       used to generate a Ruleset instance since a Transformer subclass is needed, with method
-    #       names corresponding to the lark file and non-terminal names. For this we need:
-    #           a) a 'standard' for lark files, such that e.g. an EBNF grammar is a superset of
-    #               a BNF grammar.
-    #           b) a metaprogram that can, given information about a lark file, generate a Transformer
-    #               subclass for said lark file.
-    def build_lark_grammar(self):
-        """ Create a lark file that will recognise grammars of the Metalanguage instance's syntax. """
-
-        # Instantiate instances of syntax objects so we can see their notation
-        nt = self.syntax[NonTerminal]('')
-        t = self.syntax[Terminal]('')
-        seq = self.syntax[Sequence]([])
-        def_list = self.syntax[DefinitionList]([])
-
-        rule = self.syntax[Rule]([], [])
-        if rule.terminator.strip():
-            terminator = rule.terminator
-        else:
-            terminator = '(" "|/' + '\t' + '/)'
+    @property
+    def syntax(self):
+        return self._syntax
 
-        r = f'''
-        syntax: syntax_rule+
-        syntax_rule: non_terminal _PRODUCTION def_list " " ~ 1
+    @syntax.setter
+    def syntax(self, syntax):
+        # Assigning another Metalanguage's syntax shares it, as it would a plain dict
+        if not isinstance(syntax, _Syntax):
+            syntax = _Syntax(syntax)
+        self._syntax = syntax
 
-        def_list: def (_ALTERNATE def)
-        def: term (_CONCATENATE term)*
+    def build_lark_grammar(self):
+        """ Returns an LALR(1) Lark grammar that recognises grammars written in the Metalanguage's syntax. See
+        dialects.build_lark_grammar, and metaparsers.parse_dialect to parse with it. """
+        from mlangpy.dialects import build_lark_grammar
+        return build_lark_grammar(self.syntax)
 
-        term: non_terminal | terminal
-        non_terminal: _NT_LEFT_BOUND WORD (" " WORD)* _NT_RIGHT_BOUND
-        terminal: _T_LEFT_BOUND WORD _T_RIGHT_BOUND
+    def build_transformer(self):
+        """ Returns a lark Transformer that builds a Ruleset from parse trees of build_lark_grammar()'s grammar. """
+        from mlangpy.dialects import build_transformer
+        return build_transformer(self.syntax)
 
+    def export_lark_file(self, filename, atomic=False):
+        """ Write build_lark_grammar() to filename.
 
-        _PRODUCTION:        "{rule.prod}"
-        _TERMINATOR:        "{terminator}"
-        _ALTERNATE:         "{def_list.alt}"
-        _CONCATENATE:       "{seq.separator}"
-        _NT_LEFT_BOUND:     "{nt.left_bound}"
-        _NT_RIGHT_BOUND:    "{nt.right_bound}"
-        _T_LEFT_BOUND:      "{t.left_bound}"
-        _T_RIGHT_BOUND:     "{t.right_bound}"
+        Args:
+            filename (str): Path of the file to write.
+            atomic (bool):  If True, write to a temporary file and rename it over filename once it's complete.
+        """
+        with _open_for_writing(filename, atomic) as f:
+            f.write(self.build_lark_grammar())
 
-        %import common.WORD
-        '''
-        return textwrap.dedent(r)
+    def _writable(self, rule, index=None):
+        """ Returns a copy of rule that can be changed in place, having put it in rule's place in the ruleset.
 
-    def export_lark_file(self, filename):
-        f = open(filename, 'w')
-        f.write(self.build_lark_grammar())
+        Rules are only copied once, so a rule this has already returned is returned as it is. So is a rule that isn't
+        in the ruleset, which belongs to whoever passed it in.
 
-    def normalise(self):
-        """ Convert the ruleset so that it complies with self.syntax. """
+        Args:
+            rule (Rule):    A rule in self.ruleset.
+            index (int):    Its position in self.ruleset, if known.
+        """
+        if self._owned.get(id(rule)) is rule:
+            return rule
+        if index is None:
+            try:
+                index = self.ruleset.index_of(rule)
+            except ValueError:
+                return rule
+
+        new = _copy_rule(rule)
+        self.ruleset[index] = new
+        self._owned[id(new)] = new
+        return new
+
+    def normalise(self, workers=None):
+        """ Convert the ruleset so that it complies with self.syntax.
+
+        Rules that change are replaced with new ones, so the Ruleset this was made from is left as it was. Features
+        that are already in the form the syntax gives them are kept as they are (see normalise_term), as are rules
+        that are. Rules are only looked at if they've changed since the last call, or contain features whose
+        constructor has (see the class docstring), so normalising again after a small change is quick.
 
-        # Instantiate an empty rule of the form stored in the syntax dictionary to access production, alternation
-        # and termination symbols
-        rf = self.syntax[Rule]([], [])
+        Args:
+            workers (int):  If more than 1, the rules to look at are split into shards and normalised by a pool of
+                            this many processes (unless there's only one CPU). The syntax and rules have to be
+                            picklable. The result is the same as normalising in this process, except that rules that
+                            changed no longer share their features with any others. Sending the changed rules back
+                            costs about as much as normalising them, so this only pays off with many cores, or
+                            constructors that do a lot of work.
+        """
+        syntax = self.syntax
+        form = _rule_form(syntax)
+
+        # Work out what's changed since last time. A new form for rules changes all of them.
+        if form != self._form:
+            self._normal = {}
+            self._resolved = {}
+        constructor_for = syntax.constructor
+        resolved = self._resolved
+        changed = {cls for cls, constructor in resolved.items() if constructor_for(cls) is not constructor}
+        for cls in changed:
+            resolved[cls] = constructor_for(cls)
+
+        old_normal = self._normal
+        normal = {}
+        dirty = []
+        for index in range(len(self.ruleset)):
+            rule = self.ruleset[index]
+            entry = old_normal.get(id(rule))
+            if entry is not None and entry[0] is rule and changed.isdisjoint(entry[1]):
+                normal[id(rule)] = entry
+            else:
+                dirty.append(index)
+
+        rules = [self.ruleset[index] for index in dirty]
+        if workers is not None and workers > 1 and len(rules) > 1:
+            results = _normalise_in_pool(syntax, rules, workers)
+        else:
+            settings = _Settings()
+            results = (self._normalise_rule(rule, form, settings) for rule in rules)
+
+        # Rules mostly contain the same classes, so their sets are shared
+        class_sets = {}
+        for index, rule, (new, classes) in zip(dirty, rules, results):
+            classes = class_sets.setdefault(classes, classes)
+            for cls in classes:
+                if cls not in resolved:
+                    resolved[cls] = constructor_for(cls)
+            if new is None:
+                normal[id(rule)] = (rule, classes)
+            else:
+                self.ruleset[index] = new
+                self._owned[id(new)] = new
+                normal[id(new)] = (new, classes)
+
+        self._normal = normal
+        self._form = form
+
+    def _normalise_rule(self, rule, form, settings):
+        """ Normalise one rule for normalise().
+
+        Returns:
+            The normalised rule, or None if rule is already normal, and a frozenset of the classes of feature
+            looked up in the syntax while normalising it.
+        """
+        concat, prod, separator, terminator = form
+        constructor_for = self.syntax.constructor
+        classes = set()
+
+        # Handle left-hand side
+        terms = []
+        for feature in rule.left.terms:
+            classes.add(feature.__class__)
+            constructor = constructor_for(feature.__class__)
+            if constructor is not None:
+                feature = settings.rebuilt(feature, constructor, feature.subject)
+            terms.append(feature)
+        left = settings.rebuilt(rule.left, concat, terms)
+
+        # Handle right-hand side
+        definitions = [settings.rebuilt(definition, concat,
+                                        [self.normalise_term(term, settings, classes) for term in definition.terms])
+                       for definition in rule.right.terms]
+        if all(new is old for new, old in zip(definitions, rule.right.terms)) \
+                and (separator is None or rule.right.separator == separator):
+            right = rule.right
+        else:
+            right = copy.copy(rule.right)
+            right.terms = definitions
+            if separator is not None:
+                right.separator = separator
+
+        classes = frozenset(classes)
+        if left is rule.left and right is rule.right \
+                and (prod is None or rule.prod == prod) and (terminator is None or rule.terminator == terminator):
+            return None, classes
+
+        # Update the form of the rule, as Ruleset.update_rules would
+        new = copy.copy(rule)
+        new.left = left
+        new.right = right
+        if prod is not None:
+            new.prod = prod
+        if terminator is not None:
+            new.terminator = terminator
+        return new, classes
+
+    def desugar(self, workers=None, constructs=None):
+        """ Replace optionals, groups and repetitions with helper rules in plain BNF, in one pass over the ruleset.
+        Every occurrence of the same construct shares one helper. See mlangpy.desugar for details.
 
-        # Update the form of rules
-        self.ruleset.update_rules(production=rf.prod, alternation=rf.right.separator, terminator=rf.terminator)
+        Args:
+            workers (int):      If more than 1, desugar shards of the rules in a pool of this many processes, with the
+                                same result.
+            constructs (list):  The classes of construct to desugar, or None for all of them (see
+                                mlangpy.desugar.CONSTRUCTS).
 
-        # Now, go through each rule (LHS and RHS) and transform features to their
-        # corresponding notations in self.syntax
+        Returns:
+            The number of helper rules added.
+        """
+        # Imported here to avoid a circular import, since it needs the classes of the other metalanguages
+        from mlangpy.desugar import desugar, CONSTRUCTS
+        return desugar(self, workers=workers, constructs=CONSTRUCTS if constructs is None else constructs)
 
-        for rule in self.ruleset:
+    def mark_changed(self, rule=None):
+        """ Tell normalise() that rule has been changed in place, so it has to be looked at again. Rules that are
+        replaced (as the Metalanguage's own methods do) don't need this.
 
-            # Handle left-hand side
-            rule.left = self.syntax[Concat](rule.left.terms)
-            for i in range(0, len(rule.left)):
-                for feature in self.syntax:
-                    if isinstance(rule.left[i], feature):
-                        rule.left[i] = self.syntax[feature](rule.left[i].subject)
+        Args:
+            rule (Rule):    A rule in self.ruleset, or None for all of them.
+        """
+        if rule is None:
+            self._normal = {}
+        else:
+            self._normal.pop(id(rule), None)
 
-            # Handle right-hand side
-            for i in range(0, len(rule.right)):
-                rule.right[i] = self.syntax[Concat](rule.right[i].terms)
-                for j in range(0, len(rule.right[i])):
-                    rule.right[i][j] = self.normalise_term(rule.right[i][j])
+    def export_ruleset(self, path, atomic=False):
+        """ Write the ruleset to path, a rule at a time (see Ruleset.write), so the whole grammar is never held as
+        one string.
 
-    def export_ruleset(self, path):
-        serialised_grammar = str(self.ruleset)
-        f = open(path, 'w')
-        f.write(serialised_grammar)
+        Args:
+            path (str):     Path of the file to write.
+            atomic (bool):  If True, write to a temporary file and rename it over path once it's complete.
+        """
+        with _open_for_writing(path, atomic) as f:
+            self.ruleset.write(f)
 
     def eliminate_groups(self):
-
-        for rule in self.ruleset:
-            for definition in rule.right:
-                for i in range(0, len(definition)):
-                    if issubclass(definition[i].__class__, Group):
-                        new_nt = NonTerminal(f'grp {definition[i]}')
+        """ Replace every group in the ruleset with a non-terminal for a new rule defining it. Rules with groups in
+        them are replaced by changed copies (see the class docstring). """
+
+        index = 0
+        while index < len(self.ruleset):
+            rule = self.ruleset[index]
+            for d in range(0, len(rule.right)):
+                for i in range(0, len(rule.right[d])):
+                    term = rule.right[d][i]
+                    if issubclass(term.__class__, Group):
+                        new_nt = NonTerminal(f'grp {term}')
 
                         new_rule = self.syntax[Rule](
                             self.syntax[Sequence]([new_nt]),
                             self.syntax[DefinitionList]([
-                                self.syntax[Sequence](definition[i].subject)
+                                self.syntax[Sequence](term.subject)
                             ])
                         )
 
-                        definition[i] = new_nt
+                        rule = self._writable(rule, index)
+                        rule.right[d][i] = new_nt
                         self.ruleset += new_rule
+            index += 1
 
     def remove_optionals_from_term(self, term, recursive=False):
+        from ordered_set import OrderedSet
         new_rules = OrderedSet()
 
         if issubclass(term.__class__, Optional):
@@ -157,49 +441,68 @@ class Metalanguage:
         return term, new_rules
 
     def remove_optionals(self, rule):
-        for definition in rule.right:
-            for i in range(0, len(definition)):
-                if issubclass(definition[i].__class__, Optional):
+        """ Replace the optionals in rule with non-terminals for rules defining them, adding those that aren't in the
+        ruleset already.
+
+        rule itself isn't changed if it's in the ruleset: a changed copy takes its place there (see the class
+        docstring).
+        """
+        for d in range(0, len(rule.right)):
+            for i in range(0, len(rule.right[d])):
+                term = rule.right[d][i]
+                if issubclass(term.__class__, Optional):
 
                     # check to see if there's a definition already
-                    looking_for = Rule([], [definition[i].subject, []])
-                    matching = self.ruleset.find_rules(looking_for)
+                    looking_for = DefList(_definitions(term.subject) + [Concat([])])
+                    matching = self.ruleset.find_rules_for(looking_for)
 
+                    rule = self._writable(rule)
                     if matching:
-                        definition[i] = matching[0].left[0]
+                        rule.right[d][i] = matching[0].left[0]
+                        self.ruleset.reindex(rule)
                     else:
                         new_nt = self.syntax[NonTerminal](f'op {self.op_count}')
                         self.op_count += 1
 
                         new_rule = self.syntax[Rule](
                             new_nt,
-                            [definition[i].subject,
-                             []]
+                            looking_for
                         )
 
-                        definition[i] = new_nt
+                        rule.right[d][i] = new_nt
+                        self.ruleset.reindex(rule)
                         self.ruleset += new_rule
 
     def remove_groups_from(self, rule):
+        """ Replace the groups in rule with non-terminals for the rules in the ruleset that define them. rule itself
+        isn't changed if it's in the ruleset: a changed copy takes its place there (see the class docstring).
+
+        Returns:
+            A list of new rules for the groups that had no rule defining them, which haven't been added to the
+            ruleset, and whose groups are left in the rule.
+        """
         new_rules = []
 
-        for concat in rule.right:
-            for i in range(0, len(concat)):
-                if issubclass(concat[i].__class__, Group):
+        for d in range(0, len(rule.right)):
+            for i in range(0, len(rule.right[d])):
+                term = rule.right[d][i]
+                if issubclass(term.__class__, Group):
 
                     # check to see if there's a definition already
-                    looking_for = DefList([concat[i].subject])
+                    looking_for = DefList([term.subject])
                     matching = self.ruleset.find_rules_for(looking_for)
 
                     if matching:
-                        concat[i] = matching[0].left[0]
+                        rule = self._writable(rule)
+                        rule.right[d][i] = matching[0].left[0]
+                        self.ruleset.reindex(rule)
                     else:
                         new_nt = self.syntax[NonTerminal](f'grp {self.grp_count}')
                         self.rep_count += 1
 
                         new_rule = self.syntax[Rule](
                             new_nt,
-                            [concat[i].subject]
+                            [term.subject]
                         )
 
                         new_rules.append(new_rule)
@@ -207,43 +510,195 @@ class Metalanguage:
         return new_rules
 
     def remove_repetitions(self, rule):
+        """ Replace the repetitions in rule with non-terminals for new recursive rules defining them.
 
-        for definition in rule.right:
-            for i in range(0, len(definition)):
-                if issubclass(definition[i].__class__, Repetition):
-
-                    # check to see if there's a definition already
-                    looking_for = Rule([], [definition[i].subject, []])
-                    matching = self.ruleset.find_rules(looking_for)
+        rule itself isn't changed if it's in the ruleset: a changed copy takes its place there (see the class
+        docstring).
+        """
 
-                    if matching:
-                        definition[i] = matching[0].left[0]
-                        continue
+        for d in range(0, len(rule.right)):
+            for i in range(0, len(rule.right[d])):
+                term = rule.right[d][i]
+                if issubclass(term.__class__, Repetition):
 
+                    # A rule defining the repetition refers to itself by name, so one that's already there can't be
+                    # looked up by its right-hand side: each repetition gets a new rule
+                    rule = self._writable(rule)
                     new_nt = self.syntax[NonTerminal](f'rep {self.rep_count}')
                     self.rep_count += 1
 
                     new_rule = self.syntax[Rule](
                         new_nt,
-                        [[definition[i].subject, new_nt], []]
+                        [Concat(c.terms + [new_nt]) for c in _definitions(term.subject)] + [Concat([])]
                     )
 
-                    definition[i] = new_nt
+                    rule.right[d][i] = new_nt
+                    self.ruleset.reindex(rule)
                     self.ruleset += new_rule
 
-    def normalise_term(self, term):
+    def normalise_term(self, term, settings=None, classes=None):
+        """ Returns term in the form given by self.syntax.
 
-        new_term = term
-        for sy in self.syntax:
-            if issubclass(term.__class__, sy):
-                if issubclass(term.__class__, Concat) or issubclass(term.__class__, DefList):
-                    children = []
-                    for t in term.terms:
-                        children.append(self.normalise_term(t))
-
-                    new_term = self.syntax[sy](children)
+        Each feature is rebuilt by the constructor the syntax has for it (see syntax), from its normalised terms if
+        it's a Concat or DefList, or else its normalised subject. Features without a constructor are returned as
+        they are, without looking inside them, and so are binary and ternary operators (like EBNF's exceptions),
+        which don't have a subject. So is a feature that's already an instance of its constructor, with
+        the same settings (bounds, operator symbols and so on) that the constructor gives, and parts that didn't
+        change, since rebuilding it would only make an equal copy. This works with an explicit stack, so it takes
+        linear time and isn't limited by the recursion limit.
 
+        Args:
+            term (Feature):         The feature to normalise.
+            settings (_Settings):   The constructors' settings, when normalising many terms, to save working them
+                                    out again.
+            classes (set):          If given, the class of every feature (and subject) looked up in the syntax is
+                                    added to it.
+        """
+        if settings is None:
+            settings = _Settings()
+        rebuilt = settings.rebuilt
+        constructor_for = self.syntax.constructor
+        note = set().add if classes is None else classes.add
+        # Normalised features, waiting for whatever they're part of
+        done = []
+        # Features still to do, along with their constructor once their parts have been put on the stack
+        stack = [(term, None)]
+        while stack:
+            feature, constructor = stack.pop()
+            if constructor is not None:
+                if isinstance(feature, (Concat, DefList)):
+                    start = len(done) - len(feature.terms)
+                    terms = done[start:]
+                    del done[start:]
+                    done.append(rebuilt(feature, constructor, terms))
+                else:
+                    done.append(rebuilt(feature, constructor, done.pop()))
+                continue
+
+            cls = feature.__class__
+            note(cls)
+            constructor = constructor_for(cls)
+            if constructor is None or isinstance(feature, (BinaryOperator, TernaryOperator)):
+                done.append(feature)
+            elif isinstance(feature, (Concat, DefList)):
+                stack.append((feature, constructor))
+                stack.extend((t, None) for t in reversed(feature.terms))
+            else:
+                cls = feature.subject.__class__
+                note(cls)
+                if constructor_for(cls) is None:
+                    # e.g. a Symbol's text, which is as it is
+                    done.append(rebuilt(feature, constructor, feature.subject))
                 else:
-                    new_term = self.syntax[sy](self.normalise_term(term.subject))
+                    stack.append((feature, constructor))
+                    stack.append((feature.subject, None))
+
+        return done[0]
+
+
+def _definitions(subject):
+    """ The subject of an optional or repetition as a list of definitions (Concats). """
+    if issubclass(subject.__class__, DefList):
+        return list(subject.terms)
+    if issubclass(subject.__class__, Concat):
+        return [subject]
+    return [Concat([subject])]
+
+
+def _rule_form(syntax):
+    """ The Concat constructor, and production, separator and terminator (or None, to leave a rule's as it is) that
+    normalise() gives rules. Unlike the others, an empty terminator is given to rules too, since a metalanguage whose
+    rules aren't terminated (like ABNF) has to take the terminators off rules from one whose rules are. """
+    # Instantiate an empty rule of the form stored in the syntax dictionary to access production, alternation
+    # and termination symbols
+    rf = syntax[Rule]([], [])
+    # A rule made from a list gets a plain DefList, so its separator is the one the syntax's DefList gives instead
+    separator = syntax[DefList]([]).separator if DefList in syntax else rf.right.separator
+    return syntax[Concat], rf.prod or None, separator or None, rf.terminator
+
+
+# What the current worker process is normalising, set by _init_normalise_worker
+_worker = {}
+
 
-        return new_term
\ No newline at end of file
+def _init_normalise_worker(syntax, rules):
+    _worker.update(metalanguage=Metalanguage(Ruleset([]), syntax), form=_rule_form(syntax), settings=_Settings(),
+                   rules=rules)
+
+
+def _normalise_shard(shard):
+    metalanguage = _worker['metalanguage']
+    form = _worker['form']
+    settings = _worker['settings']
+    start, stop = shard
+    return [metalanguage._normalise_rule(rule, form, settings) for rule in _worker['rules'][start:stop]]
+
+
+def _normalise_in_pool(syntax, rules, workers):
+    """ _normalise_rule for each of rules, in a pool of worker processes, in order. """
+    results = _map_shards(_normalise_shard, _init_normalise_worker, (dict(syntax), rules), len(rules), workers,
+                          _worker)
+    return [result for shard in results for result in shard]
+
+
+def _map_shards(function, initializer, initargs, count, workers, state):
+    """ Split range(count) into a few shards per worker and call function((start, stop)) for each one in a pool of
+    worker processes, set up by initializer(*initargs).
+
+    The pool uses multiprocessing's default start method, so initargs may have to be pickled. With no more than one
+    worker, or one CPU to run them on, function is called for the whole range in this process instead, and the state
+    initializer set up is cleared afterwards.
+
+    Args:
+        state (dict):   The module-level dict initializer puts its state in.
+
+    Returns:
+        A list of the results for each shard, in order.
+    """
+    # Imported here as it's only needed for this
+    import multiprocessing
+
+    if workers <= 1 or os.cpu_count() == 1:
+        initializer(*initargs)
+        try:
+            return [function((0, count))]
+        finally:
+            state.clear()
+
+    size = -(-count // (workers * 4))
+    shards = [(start, min(start + size, count)) for start in range(0, count, size)]
+    with multiprocessing.Pool(min(workers, len(shards)), initializer=initializer, initargs=initargs) as pool:
+        return pool.map(function, shards)
+
+
+class _Settings:
+    """ What normalise_term needs to tell whether rebuilding a feature would change it: the settings (every field
+    apart from the one holding its parts) that each class of constructor gives the features it makes. These are taken
+    from the first feature each constructor makes, so constructors are assumed not to choose them from the parts. """
+
+    def __init__(self):
+        self._defaults = {}
+
+    @staticmethod
+    def _of(feature):
+        cls = feature.__class__
+        part = 'terms' if isinstance(feature, (Concat, DefList)) else 'subject'
+        return tuple(getattr(feature, name, None) for name in _slot_names(cls) if name != part)
+
+    def rebuilt(self, feature, constructor, parts):
+        """ feature with its parts replaced by parts, in the form constructor gives it: feature itself if that
+        wouldn't change anything, or else constructor(parts). """
+        new = None
+        defaults = self._defaults.get(constructor)
+        if defaults is None and feature.__class__ is constructor:
+            # The first time, see what the constructor does
+            new = constructor(parts)
+            defaults = self._defaults[constructor] = self._of(new)
+
+        if feature.__class__ is constructor and self._of(feature) == defaults:
+            old = feature.terms if isinstance(feature, (Concat, DefList)) else feature.subject
+            if old is parts or (isinstance(parts, list) and len(old) == len(parts)
+                                and all(part is term for part, term in zip(parts, old))):
+                return feature
+
+        return constructor(parts) if new is None else new
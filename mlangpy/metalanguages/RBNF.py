@@ -7,6 +7,7 @@ symbols_mapping = {
 }
 
 class RBNFObject(Terminal):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='<', right_bound='>'):
         # TODO implement RBNF naming convention fully:
@@ -18,6 +19,7 @@ class RBNFObject(Terminal):
 
 
 class RBNFConstruct(NonTerminal):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='<', right_bound='>'):
         # TODO implement RBNF naming convention fully:
@@ -28,6 +30,7 @@ class RBNFConstruct(NonTerminal):
 
 
 class RBNFMessage(NonTerminal):
+    __slots__ = ()
 
     def __init__(self, subject, left_bound='<', right_bound='>'):
         # TODO implement RBNF naming convention fully:
@@ -36,23 +39,32 @@ class RBNFMessage(NonTerminal):
 
 
 class RBNFRule(Rule):
+    __slots__ = ()
 
     def __init__(self, left, right, production='::=', terminator=''):
         super().__init__(left, right, production=production, terminator=terminator)
 
 
 class RBNFConcat(Concat):
+    __slots__ = ()
 
     def __init__(self, terms, separator=' '):
         super().__init__(terms, separator=separator)
 
 
 class RBNFRepetition(Operator):
+    __slots__ = ()
 
     def __init__(self, subject, operator_sym='...'):
         super().__init__(subject, operator_sym=operator_sym)
 
 
+def grouped_repetition(x):
+    """ An RBNFRepetition of x, grouped so that it's clear what's repeated. This is a function rather than a lambda
+    so that RBNF's syntax can be pickled (e.g. to send it to worker processes). """
+    return RBNFRepetition(Group(x))
+
+
 class RBNF(Metalanguage):
 
     def __init__(self, ruleset, normalise=False):
@@ -61,6 +73,9 @@ class RBNF(Metalanguage):
             Concat: RBNFConcat,
             DefList: DefList,
             Rule: RBNFRule,
+            # Terminals and non-terminals from other metalanguages become objects and constructs
+            Terminal: RBNFObject,
+            NonTerminal: RBNFConstruct,
             RBNFObject: RBNFObject,
             RBNFConstruct: RBNFConstruct,
             RBNFMessage: RBNFMessage,
@@ -69,8 +84,8 @@ class RBNF(Metalanguage):
             Optional: Optional,
             Group: Group,
 
-            # Use anonymous functions to combine notations
+            # Use functions to combine notations
             # Here, eliminate ambiguity by explicitly grouping
-            Repetition: lambda x: RBNFRepetition(Group(x))
-            #Repetition: RBNFRepetition
+            Repetition: grouped_repetition,
+            RBNFRepetition: RBNFRepetition
         }, normalise=normalise)
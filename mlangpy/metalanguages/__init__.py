@@ -1,5 +1,53 @@
-from .Metalanguage import *
-from .ABNF import *
-from .BNF import *
-from .EBNF import *
-from .RBNF import *
+""" Classes for the parts of some standard metalanguages.
+
+Each metalanguage's module is only imported when one of its names is first used, so importing one metalanguage
+doesn't import all of the others.
+"""
+
+import importlib
+import sys
+import types
+
+from mlangpy import grammar
+
+# The module each name is defined in
+_exports = {}
+for _module, _names in {
+    'Metalanguage': ['Metalanguage'],
+    'ABNF': ['ABNFDefList', 'ABNFRule', 'ABNFIncRule', 'ABNFTerminal', 'ABNFNonTerminal', 'ABNFRepetition', 'ABNFChar',
+             'ABNFCharRange', 'ABNFCharConcat', 'ABNFComment', 'ABNF'],
+    'BNF': ['BNFRule', 'BNFTerminal', 'BNFNonTerminal', 'BNF'],
+    'EBNF': ['EBNFTerminal', 'EBNFDefinitionList', 'EBNFNonTerminal', 'EBNFConcat', 'EBNFRule', 'EBNFRepetition',
+             'EBNFFixedRepetition', 'EBNFSpecialSequence', 'EBNF'],
+    'RBNF': ['symbols_mapping', 'RBNFObject', 'RBNFConstruct', 'RBNFMessage', 'RBNFRule', 'RBNFConcat',
+             'RBNFRepetition', 'RBNF']
+}.items():
+    _exports.update(dict.fromkeys(_names, _module))
+
+# Only the metalanguages themselves are exported. The classes and functions defined in mlangpy.grammar can still be
+# got from here, as the modules all import them, but not what mlangpy.grammar imports itself (e.g. copy).
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name in _exports:
+        module = importlib.import_module(f'{__name__}.{_exports[name]}')
+        value = globals()[name] = vars(module)[name]
+        return value
+    value = vars(grammar).get(name)
+    if not name.startswith('_') and getattr(value, '__module__', None) == grammar.__name__:
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class _Package(types.ModuleType):
+    """ Some of the modules are named after the class they define. Importing them would normally replace that name
+    here with the module, so keep it for the class. """
+
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and name in _exports:
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -1,267 +1,630 @@
-from lark import Lark, Transformer, Discard
+import hashlib
+import importlib
+import os
+import pickle
+import stat
+import tempfile
+import threading
+from collections import namedtuple
+
 from mlangpy.grammar import *
 from mlangpy.metalanguages.EBNF import *
 from mlangpy.metalanguages.RBNF import *
 from mlangpy.metalanguages.BNF import *
 from mlangpy.metalanguages.ABNF import *
+from mlangpy.metalanguages.Metalanguage import Metalanguage
+
+# Lark, and the modules that only parsing needs, are imported by the functions that use them, so that importing this
+# module stays cheap. These names are still available from here, and are imported when they're first used.
+_deferred = {
+    'BuildBNF': 'mlangpy.builders',
+    'BuildEBNF': 'mlangpy.builders',
+    'BuildABNF': 'mlangpy.builders',
+    'BuildRBNF': 'mlangpy.builders',
+    'detect_metalanguage': 'mlangpy.detection',
+    'iter_rules': 'mlangpy.splitting',
+    'split_rules': 'mlangpy.splitting'
+}
 
 
-def validate_BNF(grammar_string):
-    l = Lark.open('./lark_grammars/bnf.lark', rel_to=__file__)
-    return l.parse(grammar_string)
+def __getattr__(name):
+    if name in _deferred:
+        value = globals()[name] = getattr(importlib.import_module(_deferred[name]), name)
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+# Names of the grammars bundled in lark_grammars/, without the .lark extension.
+GRAMMARS = ('bnf', 'abnf', 'abnf_faithful', 'ebnf', 'ebnf_faithful', 'rbnf', 'bnf_lalr', 'abnf_lalr', 'rbnf_lalr')
+
+# Grammars that build the same parse tree as their Earley counterparts, but can be parsed with LALR(1).
+# ebnf.lark is terminated by ';' so it already is one.
+LALR_GRAMMARS = {
+    'bnf': 'bnf_lalr',
+    'abnf': 'abnf_lalr',
+    'ebnf': 'ebnf',
+    'rbnf': 'rbnf_lalr'
+}
+
+PARSERS = ('earley', 'lalr', 'auto')
+
+# Compiled Lark instances, keyed by grammar name and parser options. Building a Lark instance re-reads the .lark
+# file and recompiles the whole grammar, so each combination is only ever built once per process.
+_parsers = {}
+_parsers_lock = threading.Lock()
+
+# Compiled LALR(1) parsers are also saved to disk so that new processes can load them instead of building them.
+# Lark can't serialise Earley parsers, so those are always built. Bump the format version whenever the layout of the
+# cache files changes. Loading a cache file unpickles it, which runs whatever code it says to, so they're only loaded
+# from a directory that no other user can write to (see _private).
+_CACHE_FORMAT = 1
+_cache_dir = os.environ.get(
+    'MLANGPY_CACHE_DIR',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'mlangpy')
+)
+
+
+def set_cache_dir(path):
+    """ Change where compiled parsers are cached on disk. Defaults to $MLANGPY_CACHE_DIR, or mlangpy/ under the
+    user's cache directory.
+
+    Args:
+        path: The new cache directory, which is created (with mode 0700) when it's first written to. Parsers are
+            only cached in a directory that belongs to the current user and no one else can write to. Pass None to
+            stop caching parsers on disk.
+    """
+    global _cache_dir
+    _cache_dir = path
+
+
+def get_cache_dir():
+    """ Returns the versioned directory compiled parsers are cached in, or None if disk caching is off. """
+    if _cache_dir is None:
+        return None
+    return os.path.join(_cache_dir, f'v{_CACHE_FORMAT}')
+
+
+def _parser_key(grammar, options):
+    return grammar, tuple(sorted(options.items()))
+
+
+def _grammar_path(grammar):
+    return os.path.join(os.path.dirname(__file__), 'lark_grammars', f'{grammar}.lark')
+
+
+def _cache_path(grammar, options, source=None):
+    """ Returns the path of the cache file for grammar and options, or None if the parser can't be cached.
+
+    The file name includes a hash of the grammar source (read from lark_grammars/ unless it's given), the Lark version
+    and the options, so editing a .lark file or upgrading Lark leaves the old entry behind rather than loading it.
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None or options.get('parser') != 'lalr':
+        return None
+
+    # Only options with a stable textual form can be part of the key, e.g. not transformer instances.
+    if not all(isinstance(value, (str, int, bool, type(None))) for value in options.values()):
+        return None
+
+    digest = hashlib.sha256()
+    if source is None:
+        with open(_grammar_path(grammar), 'rb') as f:
+            digest.update(f.read())
+    else:
+        digest.update(source.encode())
+    import lark
+
+    digest.update(lark.__version__.encode())
+    digest.update(repr(sorted(options.items())).encode())
+
+    return os.path.join(cache_dir, f'{grammar}-{digest.hexdigest()[:32]}.pickle')
+
+
+def _private(path, st=None):
+    """ Returns True if path (or whatever st is the result of os.stat for) is owned by the current user, and no other
+    user can write to it: for a directory, that it has mode 0700.
+
+    This is the trust model for the disk cache. Unpickling a cache file runs whatever code it says to, so only files
+    that the current user (or root) could have written are loaded. Where there are no user IDs, e.g. on Windows, the
+    cache directory is taken to be as private as the user's profile it's in.
+    """
+    if not hasattr(os, 'getuid'):
+        return True
+    if st is None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+    if st.st_uid != os.getuid():
+        return False
+    if stat.S_ISDIR(st.st_mode):
+        return stat.S_IMODE(st.st_mode) & 0o077 == 0
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _load_cached_parser(path):
+    """ Returns the parser saved at path, or None if there isn't a usable (or trustworthy, see _private) one. """
+    from lark import Lark
+
+    cache_dir = os.path.dirname(path)
+    if not (_private(os.path.dirname(cache_dir)) and _private(cache_dir)):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            if not _private(path, os.fstat(f.fileno())) or pickle.load(f) != os.path.basename(path):
+                return None
+            return Lark.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated by a crashed writer, or otherwise corrupt: it'll be rebuilt and overwritten.
+        return None
+
+
+def _save_cached_parser(path, parser):
+    """ Atomically write parser to path, so concurrent processes never see a partial file. Nothing's written unless
+    the cache directories are private (see _private), as it couldn't be loaded again. """
+    cache_dir = os.path.dirname(path)
+    try:
+        # Only the directories themselves are made private: the ones above them are left to the user
+        os.makedirs(os.path.dirname(cache_dir), mode=0o700, exist_ok=True)
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not (_private(os.path.dirname(cache_dir)) and _private(cache_dir)):
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # Lead with the file name so that a file that's been copied or renamed isn't trusted.
+                pickle.dump(os.path.basename(path), f)
+                parser.save(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        # A read-only or full cache directory shouldn't stop anything from being parsed.
+        pass
+
+
+def _build_parser(grammar, options, source=None):
+    from lark import Lark
+
+    path = _cache_path(grammar, options, source)
+    if path is not None:
+        parser = _load_cached_parser(path)
+        if parser is not None:
+            return parser
+
+    if source is None:
+        parser = Lark.open(_grammar_path(grammar), **options)
+    else:
+        parser = Lark(source, **options)
+
+    if path is not None:
+        _save_cached_parser(path, parser)
+
+    return parser
+
+
+def _with_transformer(parser, transformer):
+    """ Returns a copy of an LALR(1) parser that calls transformer's methods as it reduces each rule, rather than
+    building a parse tree. """
+    from lark import Lark
+    from lark.grammar import Rule as LarkRule
+    from lark.lexer import TerminalDef
+
+    data, memo = parser.memo_serialize([TerminalDef, LarkRule])
+    return Lark.deserialize(data, {'Rule': LarkRule, 'TerminalDef': TerminalDef}, memo, transformer=transformer)
+
+
+def get_parser(grammar, **options):
+    """ Return the compiled Lark parser for one of the bundled grammars, building it on first use.
+
+    Args:
+        grammar (str):  Name of a grammar in lark_grammars/ (see GRAMMARS), e.g. 'abnf'.
+        **options:      Keyword arguments passed on to Lark. Values must be hashable as they form part of the
+                        cache key.
+
+    Returns:
+        A Lark instance shared by every caller asking for the same grammar and options.
+    """
+    if grammar not in GRAMMARS:
+        raise ValueError(f'Unknown grammar {grammar!r}, expected one of {", ".join(GRAMMARS)}.')
+
+    key = _parser_key(grammar, options)
+    parser = _parsers.get(key)
+    if parser is None:
+        # Parsers with a transformer are copies of the plain parser, so that they can share its disk cache entry.
+        plain_parser = None
+        if options.get('transformer') is not None:
+            plain_parser = get_parser(grammar, **{k: v for k, v in options.items() if k != 'transformer'})
+
+        with _parsers_lock:
+            # Another thread may have built the parser while we were waiting for the lock.
+            parser = _parsers.get(key)
+            if parser is None:
+                if plain_parser is not None:
+                    parser = _with_transformer(plain_parser, options['transformer'])
+                else:
+                    parser = _build_parser(grammar, options)
+                _parsers[key] = parser
 
+    return parser
 
-def validate_ABNF_faithful(grammar_string):
-    l = Lark.open('./lark_grammars/abnf_faithful.lark', rel_to=__file__)
-    return l.parse(grammar_string)
 
+def warm_parsers(grammars=GRAMMARS, **options):
+    """ Compile parsers ahead of time so that the first validate_* or parse_* call doesn't pay for it.
 
-def validate_ABNF(grammar_string):
-    l = Lark.open('./lark_grammars/abnf.lark', rel_to=__file__)
-    return l.parse(grammar_string)
+    Args:
+        grammars:   Iterable of grammar names to compile. Defaults to every bundled grammar.
+        **options:  Keyword arguments passed on to Lark, see get_parser.
+    """
+    for grammar in grammars:
+        get_parser(grammar, **options)
 
 
-def validate_EBNF(grammar_string):
-    l = Lark.open('./lark_grammars/ebnf.lark', rel_to=__file__)
-    return l.parse(grammar_string)
+# Compiled parsers for dialects, keyed by _dialect_key of their syntax
+_dialect_parsers = {}
 
-def validate_EBNF_faithful(grammar_string):
-    l = Lark.open('./lark_grammars/ebnf_faithful.lark', rel_to=__file__)
-    return l.parse(grammar_string)
 
-def validate_RBNF(grammar_string):
-    l = Lark.open('./lark_grammars/rbnf.lark', rel_to=__file__)
-    p = l.parse(grammar_string)
-    return p
+def _dialect_key(syntax):
+    """ A hashable key for syntax, equal for any two syntaxes with the same entries. """
+    return tuple(sorted(syntax.items(), key=lambda item: (item[0].__module__, item[0].__qualname__)))
 
 
-# TODO update for DefinitionLists
-class BuildBNF(Transformer):
+def get_dialect_parser(syntax):
+    """ Return a compiled LALR(1) parser for grammars written in syntax (see dialects.py), building it on first use.
 
-    def start(self, args):
-        return BNF(args[0])
+    Parsers are cached by the entries of the syntax, so every Metalanguage with the same syntax shares one. The
+    parser builds a Ruleset directly as it parses, rather than a parse tree. Parsers for syntaxes that are written the
+    same way share a disk cache entry.
 
-    def syntax(self, args):
-        return Ruleset(args)
+    Args:
+        syntax (dict):  The syntax of a Metalanguage.
+    """
+    key = _dialect_key(syntax)
+    parser = _dialect_parsers.get(key)
+    if parser is None:
+        from mlangpy.dialects import build_lark_grammar, build_transformer
 
-    def rule(self, args):
-        return BNFRule(args[0], args[1])
+        source = build_lark_grammar(syntax)
+        plain_parser = _build_parser('dialect', {'parser': 'lalr'}, source)
+        with _parsers_lock:
+            parser = _dialect_parsers.get(key)
+            if parser is None:
+                parser = _dialect_parsers[key] = _with_transformer(plain_parser, build_transformer(syntax))
 
-    def elements(self, args):
-        return args[0]
+    return parser
 
-    def alternation(self, args):
-        return DefList(args)
 
-    def concatenation(self, args):
-        return Concat(args)
+def parse_dialect(grammar_string, syntax):
+    """ Parse grammar_string, written in syntax, with get_dialect_parser(syntax).
 
-    def element(self, args):
-        return args[0]
+    Args:
+        grammar_string (str):   Text to be parsed.
+        syntax:                 The syntax of a Metalanguage, or a Metalanguage to use the syntax of.
 
-    def non_terminal(self, args):
-        return BNFNonTerminal(args[0])
+    Returns:
+        A Metalanguage sharing the syntax, whose ruleset is the parsed grammar.
+    """
+    if isinstance(syntax, Metalanguage):
+        syntax = syntax.syntax
+    return Metalanguage(get_dialect_parser(syntax).parse(grammar_string), syntax_dict=syntax)
 
-    def terminal(self, args):
-        return BNFTerminal(args[0])
 
+def clear_parser_cache(disk=False):
+    """ Discard every compiled parser. They'll be rebuilt on next use.
 
+    Args:
+        disk (bool): Also delete the parsers cached on disk.
+    """
+    with _parsers_lock:
+        _parsers.clear()
+        _dialect_parsers.clear()
 
-class BuildEBNF(Transformer):
+        cache_dir = get_cache_dir()
+        if disk and cache_dir is not None and os.path.isdir(cache_dir):
+            for filename in os.listdir(cache_dir):
+                try:
+                    os.remove(os.path.join(cache_dir, filename))
+                except FileNotFoundError:
+                    pass
 
-    def start(self, args):
-        return EBNF(args[0])
 
-    def syntax(self, args):
-        return Ruleset(args)
+def _validate(grammar, grammar_string, parser):
+    """ Parse grammar_string with one of the bundled grammars.
 
-    def lark_grammars__ebnf__syntax_rule(self, args):
-        # TODO this doesn't look right!!
-        return EBNFRule(EBNFSequence([args[0]]), DefinitionList(args[1]))
+    Args:
+        grammar (str):          Name of the grammar, as used by the Earley parser.
+        grammar_string (str):   Text to be parsed.
+        parser (str):           'earley' to use the original grammar, 'lalr' to use its LALR(1) counterpart, or
+                                'auto' to try LALR(1) first and only fall back to Earley if that fails.
+    """
+    from lark.exceptions import UnexpectedInput
 
-    def lark_grammars__ebnf__non_terminal(self, args):
-        return EBNFNonTerminal(" ".join(args))
+    if parser == 'earley':
+        return get_parser(grammar).parse(grammar_string)
+    elif parser == 'lalr':
+        return get_parser(LALR_GRAMMARS[grammar], parser='lalr').parse(grammar_string)
+    elif parser == 'auto':
+        try:
+            return get_parser(LALR_GRAMMARS[grammar], parser='lalr').parse(grammar_string)
+        except UnexpectedInput:
+            return get_parser(grammar).parse(grammar_string)
+    else:
+        raise ValueError(f'Unknown parser {parser!r}, expected one of {", ".join(PARSERS)}.')
 
-    def lark_grammars__ebnf__def_list(self, args):
-        # TODO This method always creates a DefinitionList, regardless of whether there are any alternatives.
-        # It's unclear if this is necessary, investigate. Could check the number of args and skip making the
-        # DefinitionList.
-        return DefinitionList(args)
 
-    def lark_grammars__ebnf__def(self, args):
-        return EBNFSequence(args)
+def validate_BNF(grammar_string, parser='earley'):
+    return _validate('bnf', grammar_string, parser)
 
-    def lark_grammars__ebnf__term(self, args):
-        return args[0]
 
-    def lark_grammars__ebnf__factor(self, args):
-        return args[0]
+def validate_ABNF_faithful(grammar_string):
+    return get_parser('abnf_faithful').parse(grammar_string)
 
-    def lark_grammars__ebnf__primary(self, args):
-        # why are there sometimes no args?
-        if len(args) != 0:
-            return args[0]
-        else:
-            return Terminal("")
 
-    def lark_grammars__ebnf__terminal(self, args):
-        return EBNFTerminal(" ".join(args))
+def validate_ABNF(grammar_string, parser='earley'):
+    return _validate('abnf', grammar_string, parser)
 
-    def lark_grammars__ebnf__comment(self, args):
-        # just drop comments for now
-        raise Discard
 
-    def lark_grammars__ebnf__optional_sequence(self, args):
-        return Optional(args[0])
+def validate_EBNF(grammar_string, parser='earley'):
+    return _validate('ebnf', grammar_string, parser)
 
-    def lark_grammars__ebnf__grouped_sequence(self, args):
-        return Group(args[0])
 
-    def lark_grammars__ebnf__repeated_sequence(self, args):
-        return EBNFRepetition(args[0])
+def validate_EBNF_faithful(grammar_string):
+    return get_parser('ebnf_faithful').parse(grammar_string)
 
 
-class BuildABNF(Transformer):
-    """ Generate a metalanguages.ABNF.ABNF instance from a parse tree built using abnf.lark. """
+def validate_RBNF(grammar_string, parser='earley'):
+    return _validate('rbnf', grammar_string, parser)
 
-    def start(self, args):
-        return ABNF(args[0])
 
-    def syntax(self, args):
-        return Ruleset(args)
+def _builder(grammar):
+    """ The shared builder for grammar (see mlangpy.builders), which is only imported once something is parsed. """
+    from mlangpy.builders import _builders
+    return _builders[grammar]
 
-    def rule(self, args):
-        return ABNFRule(args[0], args[1])
 
-    def inc_rule(self, args):
-        return ABNFIncRule(args[0], args[1])
+def _parse(grammar, grammar_string, builder, parser, fused, intern=False):
+    """ Parse grammar_string and build a Metalanguage from it using builder.
 
-    def rulename(self, args):
-        return ABNFNonTerminal(args[0])
+    Args:
+        grammar (str):          Name of the grammar, as used by the Earley parser.
+        grammar_string (str):   Text to be parsed.
+        builder (Transformer):  Transformer that turns the parse tree into a Metalanguage instance.
+        parser (str):           'earley', 'lalr' or 'auto', see _validate.
+        fused (bool):           If True, the LALR(1) parser calls the builder as it goes rather than building a parse
+                                tree for it to walk afterwards. Only LALR(1) can do this, so with parser='auto' a
+                                grammar that needs Earley is still parsed to a tree first.
+        intern (bool):          If True, equal terminals and non-terminals share one instance (see
+                                grammar.SymbolTable). This saves memory on large grammars, but means symbols mustn't
+                                be changed in place.
+    """
+    if not intern:
+        return _build(grammar, grammar_string, builder, parser, fused)
 
-    def elements(self, args):
-        return args[0]
+    from mlangpy.builders import _interning
 
-    def alternation(self, args):
-        return ABNFDefList(args)
+    previous = getattr(_interning, 'table', None)
+    _interning.table = SymbolTable()
+    try:
+        return _build(grammar, grammar_string, builder, parser, fused)
+    finally:
+        _interning.table = previous
 
-    def concatenation(self, args):
-        return Concat(args)
 
-    def repetition(self, args):
-        return args[0]
+def _build(grammar, grammar_string, builder, parser, fused):
+    from lark.exceptions import UnexpectedInput
 
-    def element(self, args):
-        return args[0]
+    if not fused:
+        return builder.transform(_validate(grammar, grammar_string, parser))
 
-    def char_val(self, args):
-        return ABNFTerminal(args[0])
+    if parser not in PARSERS:
+        raise ValueError(f'Unknown parser {parser!r}, expected one of {", ".join(PARSERS)}.')
+    if parser == 'earley':
+        raise ValueError('Fused parsing is only available with the LALR(1) parser.')
 
-    def num_val(self, args):
-        return args[0]
+    fused_parser = get_parser(LALR_GRAMMARS[grammar], parser='lalr', transformer=_builder(grammar))
+    try:
+        return fused_parser.parse(grammar_string)
+    except UnexpectedInput:
+        if parser == 'lalr':
+            raise
+        return builder.transform(get_parser(grammar).parse(grammar_string))
 
-    def hex_val(self, args):
-        return args[0]
 
-    def hex_single(self, args):
-        return ABNFChar('h', args[0])
+def parse_BNF(grammar_string, parser='earley', fused=False, intern=False) -> BNF:
+    return _parse('bnf', grammar_string, _builder('bnf'), parser, fused, intern)
 
-    def hex_range(self, args):
-        return ABNFCharRange(ABNFChar('h', args[0]), ABNFChar('h', args[1]))
 
-    def c_nl(self, args):
-        raise Discard
+def parse_EBNF(grammar_string, parser='earley', fused=False, intern=False) -> EBNF:
+    return _parse('ebnf', grammar_string, _builder('ebnf'), parser, fused, intern)
 
-    def repetition(self, args):
-        if len(args) != 2:
-            return args[0]
 
-        rep_type_tree = args[0].children[0]
-        if rep_type_tree.data == 'specific':
-            return ABNFRepetition(args[1], left=int(rep_type_tree.children[0]), right=int(rep_type_tree.children[0]))
-        elif rep_type_tree.data == 'variable':
-            if len(rep_type_tree.children) == 3:
-                return ABNFRepetition(args[1], left=int(rep_type_tree.children[0]), right=int(rep_type_tree.children[2]))
-            elif len(rep_type_tree.children) == 1:
-                return ABNFRepetition(args[1])
-            else:
-                if rep_type_tree.children[0].type == 'DEC_NUM':
-                    return ABNFRepetition(args[1], left=int(rep_type_tree.children[0]))
-                else:
-                    return ABNFRepetition(args[1], right=int(rep_type_tree.children[1]))
-        else:
-            raise NotImplementedError()
+def parse_ABNF(grammar_string, parser='earley', fused=False, intern=False) -> ABNF:
+    return _parse('abnf', grammar_string, _builder('abnf'), parser, fused, intern)
+
+
+def parse_RBNF(grammar_string, parser='earley', fused=False, intern=False) -> RBNF:
+    return _parse('rbnf', grammar_string, _builder('rbnf'), parser, fused, intern)
+
+
+def _iter_parse(grammar, stream, builder, parser, fused, chunk_size):
+    """ Parse the grammar in stream one rule at a time, yielding each Rule as soon as it's been read.
+
+    The text is split into rules by mlangpy.splitting, so only the rule currently being read is kept in memory. Errors
+    are raised with their positions relative to the whole stream rather than the rule they were found in.
+
+    Args:
+        grammar (str):          Name of the grammar, as used by the Earley parser.
+        stream:                 A text file or any other object with a read(size) method returning str.
+        builder (Transformer):  Transformer that turns each rule's parse tree into a Metalanguage instance.
+        parser (str):           'earley', 'lalr' or 'auto', see _validate.
+        fused (bool):           See _parse.
+        chunk_size (int):       Number of characters to read from stream at a time.
+    """
+    from mlangpy.splitting import iter_rules
+
+    for piece in iter_rules(stream, grammar, chunk_size):
+        yield from _parse_piece(grammar, piece, builder, parser, fused)
+
+
+def _parse_piece(grammar, piece, builder, parser, fused):
+    """ Parse the RuleText piece, see _parse.
+
+    Returns:
+        A list of the rules in piece.
+    """
+    from lark.exceptions import UnexpectedInput, UnexpectedEOF
+
+    try:
+        metalanguage = _parse(grammar, piece.text, builder, parser, fused)
+    except (UnexpectedInput, UnexpectedEOF) as e:
+        _shift_error(e, piece)
+        raise
+    return metalanguage.ruleset.rules
+
+
+def _shift_error(error, piece):
+    """ Move the position of error from the start of piece to the start of the whole input. """
+    # Some errors (e.g. at the end of the input) don't have a position
+    if not isinstance(getattr(error, 'line', None), int):
+        return
+    if error.line == 1:
+        error.column += piece.column - 1
+    error.line += piece.line - 1
+    if error.pos_in_stream is not None:
+        error.pos_in_stream += piece.offset
+
+
+def iter_parse_BNF(stream, parser='earley', fused=False, chunk_size=65536):
+    return _iter_parse('bnf', stream, _builder('bnf'), parser, fused, chunk_size)
+
+
+def iter_parse_EBNF(stream, parser='earley', fused=False, chunk_size=65536):
+    return _iter_parse('ebnf', stream, _builder('ebnf'), parser, fused, chunk_size)
+
+
+def iter_parse_ABNF(stream, parser='earley', fused=False, chunk_size=65536):
+    return _iter_parse('abnf', stream, _builder('abnf'), parser, fused, chunk_size)
+
+
+def iter_parse_RBNF(stream, parser='earley', fused=False, chunk_size=65536):
+    return _iter_parse('rbnf', stream, _builder('rbnf'), parser, fused, chunk_size)
+
+
+class RuleError(namedtuple('RuleError', ['line', 'column', 'offset', 'message', 'text', 'exception'])):
+    """ A syntax error found by one of the parse_*_recovering functions.
+
+    Attributes:
+        line (int):         Line the error was found on, counting from 1.
+        column (int):       Column the error was found at, counting from 1.
+        offset (int):       Position of the error in the whole input.
+        message (str):      A short description of the error.
+        text (str):         The text of the rule that was skipped because of the error.
+        exception:          The exception Lark raised. Its line, column and pos_in_stream attributes are moved to match
+                            the whole input, but its message still refers to the rule on its own.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return f'line {self.line}, column {self.column}: {self.message}'
+
+
+def _rule_error(e, piece):
+    """ Make a RuleError for the exception e, raised (and moved into place by _shift_error) while parsing piece. """
+    from lark.exceptions import UnexpectedCharacters, UnexpectedToken
 
-    def group(self, args):
-        return Group(args[0])
+    if isinstance(getattr(e, 'line', None), int):
+        line, column, offset = e.line, e.column, e.pos_in_stream
+    else:
+        # No position is given, but the end of the rule is where the problem was found
+        line = piece.line + piece.text.count('\n')
+        column = len(piece.text.rsplit('\n', 1)[-1]) + (piece.column if line == piece.line else 1)
+        offset = piece.end
 
-    def option(self, args):
-        return Optional(args[0])
+    if isinstance(e, UnexpectedCharacters):
+        message = f'Unexpected character {piece.text[offset - piece.offset]!r}'
+    elif isinstance(e, UnexpectedToken) and e.token.type != '$END':
+        message = f'Unexpected {e.token.type} {str(e.token)!r}'
+    else:
+        message = 'Unexpected end of rule'
 
+    return RuleError(line, column, offset, message, piece.text, e)
 
-class BuildRBNF(Transformer):
 
-    def start(self, args):
-        return RBNF(args[0])
+def _parse_recovering(grammar, grammar_string, builder, parser, fused):
+    """ Parse grammar_string a rule at a time, skipping any rule that can't be parsed rather than stopping.
 
-    def syntax(self, args):
-        return Ruleset(args)
+    Args:
+        See _parse.
 
-    def rule(self, args):
-        return RBNFRule(args[0], args[1])
+    Returns:
+        A tuple of a Metalanguage holding every rule that could be parsed, and a list of RuleError for the rest.
+    """
+    from lark.exceptions import UnexpectedInput, UnexpectedEOF
+    from mlangpy.splitting import split_rules
 
-    def rulename(self, args):
-        return args[0]
+    rules = []
+    errors = []
+    for piece in split_rules(grammar_string, grammar):
+        try:
+            rules += _parse_piece(grammar, piece, builder, parser, fused)
+        except (UnexpectedInput, UnexpectedEOF) as e:
+            errors.append(_rule_error(e, piece))
 
-    def message(self, args):
-        return RBNFMessage(args[0])
+    return builder.start([Ruleset(rules)]), errors
 
-    def elements(self, args):
-        return args[0]
 
-    def alternation(self, args):
-        return DefList(args)
+def parse_BNF_recovering(grammar_string, parser='earley', fused=False):
+    return _parse_recovering('bnf', grammar_string, _builder('bnf'), parser, fused)
 
-    def concatenation(self, args):
-        return Concat(args)
 
-    def element(self, args):
-        return args[0]
+def parse_EBNF_recovering(grammar_string, parser='earley', fused=False):
+    return _parse_recovering('ebnf', grammar_string, _builder('ebnf'), parser, fused)
 
-    def object(self, args):
-        return RBNFObject(args[0])
 
-    def construct(self, args):
-        return RBNFConstruct(args[0])
+def parse_ABNF_recovering(grammar_string, parser='earley', fused=False):
+    return _parse_recovering('abnf', grammar_string, _builder('abnf'), parser, fused)
 
-    def option(self, args):
-        return Optional(args[0])
 
-    def group(self, args):
-        return Group(args[0])
+def parse_RBNF_recovering(grammar_string, parser='earley', fused=False):
+    return _parse_recovering('rbnf', grammar_string, _builder('rbnf'), parser, fused)
 
-    def repetition(self, args):
-        return RBNFRepetition(args[0])
 
+def parse_any(grammar_string, parser='earley', fused=False, intern=False):
+    """ Parse grammar_string without knowing which metalanguage it's written in.
 
-def parse_BNF(grammar_string) -> Metalanguage:
-    parsed = validate_BNF(grammar_string)
-    return BuildBNF(visit_tokens=False).transform(parsed)
+    The metalanguages are tried in the order given by detection.detect_metalanguage, leaving out any that don't look
+    at all likely (unless none do), until one of them parses.
 
+    Args:
+        grammar_string (str):   Text to be parsed.
+        parser (str):           'earley', 'lalr' or 'auto', see _validate.
+        fused (bool):           See _parse.
+        intern (bool):          See _parse.
 
-def parse_EBNF(grammar_string) -> EBNF:
-    parsed = validate_EBNF(grammar_string)
-    return BuildEBNF(visit_tokens=False).transform(parsed)
+    Returns:
+        A BNF, EBNF, ABNF or RBNF instance.
 
+    Raises:
+        The error from the most likely metalanguage, if none of them could parse grammar_string.
+    """
+    from lark.exceptions import UnexpectedInput, UnexpectedEOF
+    from mlangpy.detection import detect_metalanguage
 
-def parse_ABNF(grammar_string):
-    parsed = validate_ABNF(grammar_string)
-    return BuildABNF().transform(parsed)
+    parse_methods = {'bnf': parse_BNF, 'ebnf': parse_EBNF, 'abnf': parse_ABNF, 'rbnf': parse_RBNF}
 
+    candidates = detect_metalanguage(grammar_string)
+    likely = [candidate for candidate in candidates if candidate.confidence > 0] or candidates
 
-def parse_RBNF(grammar_string) -> RBNF:
-    parsed = validate_RBNF(grammar_string)
-    return BuildRBNF().transform(parsed)
+    first_error = None
+    for candidate in likely:
+        try:
+            return parse_methods[candidate.metalanguage](grammar_string, parser=parser, fused=fused, intern=intern)
+        except (UnexpectedInput, UnexpectedEOF) as e:
+            first_error = first_error or e
+    raise first_error
 
 
 if __name__ == '__main__':
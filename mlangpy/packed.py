@@ -0,0 +1,244 @@
+""" A read-only, array-backed form of a Ruleset, for analysing very large grammars without a Python object per node.
+
+A PackedGrammar keeps one entry per node in flat typed arrays (from the array module) rather than an object graph.
+Nodes are numbered breadth first with the rules first, so rule i is node i, and the children of a node always have
+consecutive numbers, given by first_child and child_count. Everything else about a node is in tables that are shared
+between nodes: its class, its fields other than its children (its layout), and, for symbols, which symbol it is.
+"""
+
+from array import array
+
+from mlangpy.binary import _has_dict, _node, _UNSET_VALUE
+from mlangpy.grammar import Ruleset, Symbol, _StructuralHash, _slot_names
+
+
+class _Child:
+    """ Marks a field in a layout whose value is the node's next child. """
+
+    def __repr__(self):
+        return '_CHILD'
+
+
+class _Children:
+    """ Marks a field in a layout whose value is a list of the node's remaining children (apart from any that are
+    taken by _CHILD fields after it). """
+
+    def __repr__(self):
+        return '_CHILDREN'
+
+
+_CHILD = _Child()
+_CHILDREN = _Children()
+
+
+class PackedGrammar:
+    """ The rules of a Ruleset, packed into flat arrays. Make one with pack().
+
+    Attributes:
+        kinds (array):          Index into classes of each node's class.
+        first_child (array):    Number of each node's first child.
+        child_count (array):    Number of children each node has.
+        layouts (array):        Index into layout_table of each node's layout: the values of its fields, with _CHILD
+                                or _CHILDREN in place of the ones that hold its children.
+        symbols (array):        Index into symbol_table of each Symbol node, and -1 for everything else.
+        classes (list):         The classes of the nodes.
+        layout_table (list):    Each distinct layout, as a tuple.
+        symbol_table (list):    Each distinct symbol, as a (class, subject) tuple.
+    """
+
+    def __init__(self, rule_count):
+        self.rule_count = rule_count
+        self.kinds = array('H')
+        self.first_child = array('I')
+        self.child_count = array('I')
+        self.layouts = array('I')
+        self.symbols = array('i')
+        self.classes = []
+        self.layout_table = []
+        self.symbol_table = []
+        # (class, fields, has_dict) of each class, and the index of each symbol in symbol_table
+        self._class_info = []
+        self._symbol_ids = {}
+
+    def __len__(self):
+        """ Number of rules. """
+        return self.rule_count
+
+    @property
+    def node_count(self):
+        return len(self.kinds)
+
+    def kind(self, node):
+        """ The class of node. """
+        return self.classes[self.kinds[node]]
+
+    def children(self, node):
+        """ The numbers of node's children, in order. """
+        first = self.first_child[node]
+        return range(first, first + self.child_count[node])
+
+    def descendants(self, node):
+        """ Yield node and every node below it, in depth-first (pre-)order. """
+        first_child = self.first_child
+        child_count = self.child_count
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            first = first_child[node]
+            stack += range(first + child_count[node] - 1, first - 1, -1)
+
+    def symbols_in(self, node):
+        """ The symbol_table indexes of the symbols in and below node, in order. """
+        symbols = self.symbols
+        return [symbols[n] for n in self.descendants(node) if symbols[n] >= 0]
+
+    def find_symbol(self, cls, subject):
+        """ The symbol_table index of the symbol cls(subject), or -1 if it isn't in the grammar. """
+        try:
+            return self._symbol_ids[(cls, subject)]
+        except KeyError:
+            return -1
+
+    def node(self, node):
+        """ Rebuild node (and everything below it) as grammar objects. """
+        nodes = list(self.descendants(node))
+        built = {}
+        # Children are numbered after their parents, so build from the highest number down
+        for n in sorted(nodes, reverse=True):
+            built[n] = self._build(n, [built.pop(child) for child in self.children(n)])
+        return built[node]
+
+    def rule(self, index):
+        """ Rebuild rule index as a Rule. """
+        if index < 0:
+            index += self.rule_count
+        if not 0 <= index < self.rule_count:
+            raise IndexError('Rule index out of range.')
+        return self.node(index)
+
+    def to_ruleset(self):
+        """ Rebuild the whole grammar as a Ruleset, equal to the one it was packed from. """
+        built = [None] * self.node_count
+        first_child = self.first_child
+        child_count = self.child_count
+        for n in range(self.node_count - 1, -1, -1):
+            first = first_child[n]
+            end = first + child_count[n]
+            built[n] = self._build(n, built[first:end])
+            # Only the rules need to be kept
+            built[first:end] = [None] * (end - first)
+        return Ruleset(built[:self.rule_count])
+
+    def _build(self, node, children):
+        cls, fields, has_dict = self._class_info[self.kinds[node]]
+        layout = self.layout_table[self.layouts[node]]
+
+        values = []
+        taken = 0
+        for value in layout:
+            if value is _CHILD:
+                values.append(children[taken])
+                taken += 1
+            elif value is _CHILDREN:
+                count = len(children) - layout.count(_CHILD)
+                values.append(children[taken:taken + count])
+                taken += count
+            else:
+                values.append(value)
+
+        built = _node(cls, fields, values)
+        if has_dict:
+            built.__dict__.update(values[-1])
+        return built
+
+
+def pack(ruleset):
+    """ Pack the rules of ruleset into a PackedGrammar.
+
+    Every node has to be one of the grammar classes, with at most one field holding a list of nodes (like
+    Sequence.terms). Lists of anything other than nodes can't be packed.
+
+    Args:
+        ruleset:    A Ruleset, or any iterable of Rule.
+
+    Returns:
+        A PackedGrammar.
+    """
+    nodes = list(ruleset)
+    packed = PackedGrammar(len(nodes))
+    kinds = packed.kinds
+    first_child = packed.first_child
+    child_count = packed.child_count
+    layouts = packed.layouts
+    symbols = packed.symbols
+
+    class_ids = {}
+    class_info = packed._class_info
+    layout_ids = {}
+    symbol_ids = packed._symbol_ids
+
+    # nodes grows as each node's children are added to the end of it, which numbers them breadth first
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        i += 1
+        cls = node.__class__
+        if not isinstance(node, _StructuralHash):
+            raise ValueError(f"Can't pack {cls.__name__} objects.")
+
+        kind = class_ids.get(cls)
+        if kind is None:
+            kind = class_ids[cls] = len(class_info)
+            class_info.append((cls, _slot_names(cls), _has_dict(cls)))
+            packed.classes.append(cls)
+        _, fields, has_dict = class_info[kind]
+
+        first = len(nodes)
+        layout = []
+        for name in fields:
+            value = getattr(node, name, _UNSET_VALUE)
+            if isinstance(value, _StructuralHash):
+                layout.append(_CHILD)
+                nodes.append(value)
+            elif isinstance(value, list):
+                if _CHILDREN in layout:
+                    raise ValueError(f"Can't pack {cls.__name__} objects, which have more than one list of nodes.")
+                if not all(isinstance(item, _StructuralHash) for item in value):
+                    raise ValueError(f"Can't pack a {cls.__name__} containing anything other than grammar nodes.")
+                layout.append(_CHILDREN)
+                nodes += value
+            else:
+                layout.append(value)
+        if has_dict:
+            layout.append(dict(node.__dict__))
+
+        layout = tuple(layout)
+        try:
+            layout_id = layout_ids.get(layout)
+            if layout_id is None:
+                layout_id = layout_ids[layout] = len(packed.layout_table)
+                packed.layout_table.append(layout)
+        except TypeError:
+            # Unhashable values can't be shared
+            layout_id = len(packed.layout_table)
+            packed.layout_table.append(layout)
+
+        symbol = -1
+        if isinstance(node, Symbol):
+            key = (cls, node.subject)
+            symbol = symbol_ids.get(key)
+            if symbol is None:
+                symbol = symbol_ids[key] = len(packed.symbol_table)
+                packed.symbol_table.append(key)
+
+        kinds.append(kind)
+        first_child.append(first)
+        child_count.append(len(nodes) - first)
+        layouts.append(layout_id)
+        symbols.append(symbol)
+
+        # Let go of nodes as they're done with, so only the frontier is kept alive
+        nodes[i - 1] = None
+
+    return packed
@@ -0,0 +1,364 @@
+""" Find the boundaries between rules in grammar text without parsing it.
+
+Each rule can then be parsed on its own, which lets grammars be parsed a rule at a time as they're read from a file.
+The boundaries follow the same conventions as the bundled Lark grammars:
+
+    * BNF and RBNF rules start at a non-terminal followed by '::='.
+    * ABNF rules start at a line beginning with a rule name followed by '=' or '=/', unless the line before ends with
+      a comment with no text, which the Earley parser carries on to the next line.
+    * EBNF rules end with ';'. Quoted strings, special sequences and comments are skipped over. A terminal string
+      that isn't closed by the end of its line also ends the rule, since it can't be valid. A comment between two
+      rules keeps them together, since comments are only allowed before the first rule and after the last.
+
+Each piece is then parsed on its own, so a boundary is only put where parsing the pieces either side of it rejects
+the same text as parsing the whole grammar would. Where that can't be told, the text is kept in one piece: e.g. text
+before the first rule is only split off if it's blank, i.e. ignored by the grammar with either parser.
+
+"""
+
+import re
+from collections import namedtuple
+
+
+class RuleText(namedtuple('RuleText', ['text', 'offset', 'line', 'column'])):
+    """ The source text of a single rule (plus any surrounding comments and whitespace).
+
+    Attributes:
+        text (str):     The text itself.
+        offset (int):   Position of the first character in the whole input.
+        line (int):     Line number of the first character, counting from 1.
+        column (int):   Column of the first character, counting from 1.
+    """
+    __slots__ = ()
+
+    @property
+    def end(self):
+        """ Position just after the last character in the whole input. """
+        return self.offset + len(self.text)
+
+
+class RuleSplitter:
+    """ Abstract base for incrementally splitting text into rules.
+
+    Text is passed in with feed() as it's read, and complete rules come out as RuleText instances. Only the text of
+    the rule currently being read is held on to: rules are sliced out of the buffer as they're found, and what's
+    left is moved to the front of it once per feed(), so splitting takes linear time however many rules each chunk
+    has in it.
+
+    Attributes:
+        keep_blank (bool):  If True, text with nothing but whitespace and comments is returned as well, so that the
+                            pieces returned cover the whole input.
+    """
+
+    keep_blank = False
+
+    def __init__(self):
+        self.buffer = ''
+        # Position in the buffer of the rule being read; everything before it has been returned already
+        self.start = 0
+        # Where _boundaries carries on looking from
+        self.scan_pos = 0
+        self.offset = 0
+        self.line = 1
+        self.column = 1
+
+    def feed(self, text):
+        """ Add text to the end of the input.
+
+        Returns:
+            A list of RuleText for the rules completed by text.
+        """
+        self.buffer += text
+        pieces = []
+        for end in self._boundaries():
+            pieces.append(self._take(end))
+
+        if self.start:
+            self.buffer = self.buffer[self.start:]
+            self.scan_pos -= self.start
+            self.start = 0
+        return [piece for piece in pieces if self.keep_blank or not self.is_blank(piece.text)]
+
+    def close(self):
+        """ Signal the end of the input.
+
+        Returns:
+            A list containing a RuleText for whatever is left, unless it's empty or (without keep_blank) only
+            whitespace and comments.
+        """
+        piece = self._take(len(self.buffer))
+        if not piece.text or not self.keep_blank and self.is_blank(piece.text):
+            return []
+        return [piece]
+
+    def is_blank(self, text):
+        """ Returns True if text has nothing but the whitespace (and comments, where they're recognised) that the
+        grammar ignores between rules in it. """
+        return _BLANK.fullmatch(text) is not None
+
+    def _boundaries(self):
+        """ Yield the positions in self.buffer at which a rule ends, in ascending order. Each one is taken before the
+        next is looked for. """
+        raise NotImplementedError()
+
+    def _take(self, end):
+        """ Return the text from the start of the rule being read up to position end of the buffer as a RuleText, and
+        start the next rule there. """
+        text = self.buffer[self.start:end]
+        self.start = end
+        piece = RuleText(text, self.offset, self.line, self.column)
+
+        self.offset += len(text)
+        newlines = text.count('\n')
+        if newlines:
+            self.line += newlines
+            self.column = len(text) - text.rindex('\n')
+        else:
+            self.column += len(text)
+
+        return piece
+
+
+class StartSplitter(RuleSplitter):
+    """ Splits text where a rule starts, i.e. just before each match of start_pattern.
+
+    Args:
+        start_pattern (str):    Regular expression that matches the start of a rule.
+        resume_from (str):      Any match that's still incomplete at the end of the buffer can only begin at the last
+                                occurrence of this string (or just after it, if resume_after is set).
+        resume_after (bool):    See resume_from.
+    """
+
+    def __init__(self, start_pattern, resume_from, resume_after=False):
+        super().__init__()
+        self.start_pattern = re.compile(start_pattern, re.MULTILINE)
+        self.resume_from = resume_from
+        self.resume_after = resume_after
+        # Whether a rule has started yet
+        self.in_rules = False
+
+    def _boundaries(self):
+        while True:
+            match = self.start_pattern.search(self.buffer, self.scan_pos)
+            if match is None:
+                break
+
+            # Everything before the match is a complete rule, or text before the first rule, which is only split off
+            # if it's blank (otherwise the first rule has to be parsed along with it).
+            starts_rule = self._starts_rule(match.start())
+            if starts_rule and match.start() > self.start and \
+                    (self.in_rules or self.is_blank(self.buffer[self.start:match.start()])):
+                yield match.start()
+            self.in_rules = self.in_rules or starts_rule
+            # Carry on from just after the start of the match
+            self.scan_pos = match.start() + 1
+
+        # Nothing after this point can start an incomplete match, so don't look through it again.
+        resume = self.buffer.rfind(self.resume_from, self.scan_pos)
+        if resume != -1 and self.resume_after:
+            resume += len(self.resume_from)
+        self.scan_pos = max(self.scan_pos, resume)
+
+    def _starts_rule(self, position):
+        """ Returns True if the match of start_pattern at position in the buffer really is the start of a rule. """
+        return True
+
+
+class ABNFSplitter(StartSplitter):
+
+    def __init__(self):
+        super().__init__(r'^[ \t]*[A-Za-z][A-Za-z0-9-]*[ \t]*=', '\n', resume_after=True)
+
+    def is_blank(self, text):
+        return _ABNF_BLANK.fullmatch(text) is not None
+
+    def _starts_rule(self, position):
+        # A comment needs some text, so after one that has none the Earley parser takes the next line as its text
+        before = self.buffer[self.start:position].rstrip()
+        if not before.endswith(';'):
+            return True
+        line = before[before.rfind('\n') + 1:]
+        return _abnf_comment_start(line) != len(line) - 1
+
+
+class BNFSplitter(StartSplitter):
+
+    def __init__(self):
+        super().__init__(r'<[^<>|":=\n]+>\s*::=', '<')
+
+
+class RBNFSplitter(StartSplitter):
+
+    def __init__(self):
+        super().__init__(r'<[^<>]*>\s*::=', '<')
+
+
+class EBNFSplitter(RuleSplitter):
+    """ Splits text after each ';' that isn't in a terminal string, special sequence or comment, once the next rule
+    starts without a comment before it. Whatever follows the last rule is a piece of its own. """
+
+    def __init__(self):
+        super().__init__()
+        self.quote = None
+        self.comment_depth = 0
+        # Length from self.start of the rule ended by the last ';', if no other rule has started since, and whether
+        # there's been a comment after it
+        self.pending = None
+        self.commented = False
+
+    def _boundaries(self):
+        buffer = self.buffer
+        i = self.scan_pos
+        while i < len(buffer):
+            c = buffer[i]
+
+            if self.comment_depth:
+                if buffer.startswith('*)', i):
+                    self.comment_depth -= 1
+                    i += 1
+                elif buffer.startswith('(*', i):
+                    self.comment_depth += 1
+                    i += 1
+                elif i == len(buffer) - 1 and c in '*(':
+                    # Could be the first half of a bracket, wait for more text
+                    break
+            elif self.quote:
+                if c == self.quote:
+                    self.quote = None
+                elif c == '\n' and self.quote != '?':
+                    # Terminal strings can't run over a line, so the rule is broken. End it here rather than letting
+                    # it take every rule after it along with it.
+                    self.quote = None
+                    yield i + 1
+            elif c == '(' and i == len(buffer) - 1:
+                # Could be the start of a comment, wait for more text
+                break
+            elif c == '(' and buffer[i + 1] == '*':
+                self.commented = self.pending is not None
+                self.comment_depth += 1
+                i += 1
+            elif not c.isspace():
+                if self.pending is not None and not self.commented:
+                    yield self.start + self.pending
+                # The rules either side of a comment are kept together, so that it's rejected as it would be in the
+                # whole grammar
+                self.pending = None
+                self.commented = False
+                if c in '\'"?':
+                    self.quote = c
+                elif c == ';':
+                    self.pending = i + 1 - self.start
+
+            i += 1
+
+        self.scan_pos = i
+
+    def close(self):
+        # Comments are allowed after the last rule, so they're split off from it
+        if self.pending is not None:
+            last = [self._take(self.start + self.pending)]
+            self.pending = None
+            self.commented = False
+            return [piece for piece in last if self.keep_blank or not self.is_blank(piece.text)] + super().close()
+        return super().close()
+
+    def is_blank(self, text):
+        return _ebnf_blank(text)
+
+
+# Text each grammar ignores between rules: spaces and newlines, and in ABNF comments as well
+_BLANK = re.compile(r'(?: |\r?\n)*')
+_ABNF_BLANK = re.compile(r'(?: |\r?\n|;[ \x21-\x7E]+\r?\n)*')
+
+# Characters allowed in EBNF comments, besides spaces, newlines and nested comments
+_EBNF_COMMENT_CHARACTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+                                     ',=|()[]{}-*;:+_%@&#$<>\\^`~')
+
+
+def _abnf_comment_start(line):
+    """ Position of the ';' starting the comment on line of ABNF, or -1 if there isn't one. """
+    close = None
+    for i, c in enumerate(line):
+        if close:
+            if c == close:
+                close = None
+        elif c == '"':
+            close = '"'
+        elif c == '<':
+            close = '>'
+        elif c == ';':
+            return i
+    return -1
+
+
+def _ebnf_blank(text):
+    """ Returns True if text has nothing but spaces, newlines and (possibly nested) bracketed comments in it. """
+    depth = 0
+    i = 0
+    while i < len(text):
+        if text.startswith('(*', i):
+            depth += 1
+            i += 2
+        elif depth and text.startswith('*)', i):
+            depth -= 1
+            i += 2
+        else:
+            c = text[i]
+            if not (c in ' \r\n' or depth and c in _EBNF_COMMENT_CHARACTERS):
+                return False
+            i += 1
+    return not depth
+
+
+# Characters fed to a splitter at a time by split_rules and iter_rules
+CHUNK_SIZE = 65536
+
+SPLITTERS = {
+    'bnf': BNFSplitter,
+    'abnf': ABNFSplitter,
+    'ebnf': EBNFSplitter,
+    'rbnf': RBNFSplitter
+}
+
+
+def _splitter(metalanguage):
+    try:
+        return SPLITTERS[metalanguage.lower()]()
+    except KeyError:
+        raise ValueError(f'Unknown metalanguage {metalanguage!r}, expected one of {", ".join(SPLITTERS)}.')
+
+
+def split_rules(text, metalanguage, chunk_size=CHUNK_SIZE):
+    """ Split grammar text into its rules.
+
+    Args:
+        text (str):             The grammar.
+        metalanguage (str):     'bnf', 'abnf', 'ebnf' or 'rbnf'.
+        chunk_size (int):       Number of characters to feed the splitter at a time, which bounds the text it holds.
+
+    Returns:
+        A list of RuleText, one per rule. Comments and whitespace between rules are attached to one of the rules
+        either side of them; text with nothing but comments and whitespace is left out.
+    """
+    splitter = _splitter(metalanguage)
+    pieces = []
+    for start in range(0, len(text), chunk_size):
+        pieces += splitter.feed(text[start:start + chunk_size])
+    return pieces + splitter.close()
+
+
+def iter_rules(stream, metalanguage, chunk_size=CHUNK_SIZE):
+    """ Like split_rules, but read the grammar from stream a chunk at a time, yielding each rule once it's complete.
+
+    Args:
+        stream:             A text file or any other object with a read(size) method returning str.
+        metalanguage (str): 'bnf', 'abnf', 'ebnf' or 'rbnf'.
+        chunk_size (int):   Number of characters to read at a time.
+    """
+    splitter = _splitter(metalanguage)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
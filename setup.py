@@ -18,6 +18,9 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
-    include_package_data=True
+    python_requires='>=3.7',
+    include_package_data=True,
+    entry_points={
+        'console_scripts': ['mlangpy=mlangpy.cli:main']
+    }
 )
@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+from mlangpy.batch import *
+from mlangpy.metaparsers import parse_ABNF, parse_EBNF
+
+
+class TestParseDirectory(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.grammars = ['a = b\n', '= b\n', 'c = "d" / e\n', 'f = 1*g\n']
+        for i, grammar_string in enumerate(self.grammars):
+            with open(os.path.join(self.directory, f'{i}.abnf'), 'w') as f:
+                f.write(grammar_string)
+        os.mkdir(os.path.join(self.directory, 'subdirectory'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_results(self, results):
+        self.assertEqual([os.path.basename(result.path) for result in results],
+                         [f'{i}.abnf' for i in range(len(self.grammars))])
+        for result, grammar_string in zip(results, self.grammars):
+            if result.ok:
+                self.assertEqual(str(result.metalanguage.ruleset), str(parse_ABNF(grammar_string).ruleset))
+            else:
+                self.assertIsNone(result.metalanguage)
+                self.assertEqual(result.error.line, 1)
+
+        self.assertEqual([result.ok for result in results], [True, False, True, True])
+
+    def test_in_process(self):
+        self.check_results(list(parse_directory(self.directory, 'abnf', workers=1)))
+
+    def test_pool(self):
+        self.check_results(list(parse_directory(self.directory, 'ABNF', workers=2, parser='lalr', fused=True)))
+
+    def test_unordered(self):
+        results = list(parse_directory(self.directory, 'abnf', workers=2, ordered=False))
+        self.check_results(sorted(results, key=lambda result: result.path))
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            parse_directory(self.directory, 'xbnf')
+        with self.assertRaises(ValueError):
+            parse_directory(self.directory, 'abnf', parser='cyk')
+        with self.assertRaises(ValueError):
+            parse_directory(self.directory, 'abnf', fused=True)
+
+
+class TestPoolMetalanguages(TestCase):
+    """ Results from worker processes are pickled, so every metalanguage's has to be. """
+
+    def check_pool(self, metalanguage, directory, exclude=()):
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name not in exclude)
+        in_process = list(parse_files(paths, metalanguage, workers=1, parser='auto'))
+        pooled = list(parse_files(paths, metalanguage, workers=2, parser='auto'))
+        self.assertEqual([result.error for result in pooled], [None] * len(paths))
+        self.assertEqual([str(result.metalanguage.ruleset) for result in pooled],
+                         [str(result.metalanguage.ruleset) for result in in_process])
+        self.assertEqual([type(result.metalanguage) for result in pooled],
+                         [type(result.metalanguage) for result in in_process])
+
+    def test_bnf(self):
+        self.check_pool('bnf', '../sample_grammars/bnfs')
+
+    def test_ebnf(self):
+        # Neither of the parsers can read the comments in ebnf_self_define.txt
+        self.check_pool('ebnf', '../sample_grammars/ebnfs', exclude=['ebnf_self_define.txt'])
+
+    def test_abnf(self):
+        self.check_pool('abnf', '../sample_grammars/abnfs')
+
+    def test_rbnf(self):
+        self.check_pool('rbnf', '../sample_grammars/rbnfs')
+
+    @skipUnless(multiprocessing.get_start_method() == 'fork', 'workers have to inherit the patch')
+    def test_unpicklable_result(self):
+        paths = sorted(os.path.join('../sample_grammars/rbnfs', name)
+                       for name in os.listdir('../sample_grammars/rbnfs'))
+        with patch('mlangpy.metalanguages.RBNF.grouped_repetition', lambda x: x):
+            results = list(parse_files(paths, 'rbnf', workers=2))
+        # Each file fails on its own, and the rest still come back
+        self.assertEqual([result.path for result in results], paths)
+        self.assertTrue(all(result.error is not None and result.metalanguage is None for result in results))
+
+
+class TestConvertFiles(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'out')
+        self.paths = []
+        for i, grammar_string in enumerate(['a = 2*3b\n', '= b\n', 'c = [d] / *e\n']):
+            path = os.path.join(self.directory, f'{i}.abnf')
+            with open(path, 'w') as f:
+                f.write(grammar_string)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, name):
+        with open(os.path.join(self.output, name)) as f:
+            return f.read()
+
+    def check_results(self, results):
+        self.assertEqual([result.path for result in results], self.paths)
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertEqual(results[0].output, os.path.join(self.output, '0.ebnf'))
+        self.assertEqual(results[1].error.line, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.output, '1.ebnf')))
+
+        # EBNF can write ABNF's optionals, but not its repetitions
+        for name, rules in [('0.ebnf', 2), ('2.ebnf', 2)]:
+            self.assertEqual(len(parse_EBNF(self.read(name)).ruleset), rules)
+        self.assertIn('[d]', self.read('2.ebnf'))
+        self.assertEqual([result.rules for result in results], [2, None, 2])
+
+    def test_in_process(self):
+        self.check_results(list(convert_files(self.paths, 'abnf', 'ebnf', self.output, workers=1)))
+
+    def test_pool(self):
+        self.check_results(list(convert_files(self.paths, 'ABNF', 'EBNF', self.output, workers=2)))
+
+    def test_skip_up_to_date(self):
+        list(convert_files(self.paths, 'abnf', 'ebnf', self.output, workers=1))
+        results = list(convert_files(self.paths, 'abnf', 'ebnf', self.output, workers=1))
+        # Only the file that failed is tried again
+        self.assertEqual([result.path for result in results], [self.paths[1]])
+        results = list(convert_files(self.paths, 'abnf', 'ebnf', self.output, workers=1, force=True))
+        self.assertEqual(len(results), 3)
+
+    def test_desugar(self):
+        list(convert_files(self.paths[2:], 'abnf', 'ebnf', self.output, workers=1, desugar=True))
+        self.assertEqual(self.read('2.ebnf'), 'c = op 0 | rep 0 ;\nop 0 = d |  ;\nrep 0 = e, rep 0 |  ;\n')
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            convert_files(self.paths, 'abnf', 'xbnf', self.output)
+        with self.assertRaises(ValueError):
+            convert_files(self.paths, 'abnf', 'ebnf', self.output, parser='cyk')
+        with self.assertRaises(ValueError):
+            convert_files(self.paths + [os.path.join(self.output, '0.rbnf')], 'abnf', 'ebnf', self.output)
+
+
+class TestRoundTrip(TestCase):
+    """ Every sample grammar, converted to every metalanguage, is read back by that metalanguage's parser. """
+
+    # The conversions that fail because the target can't write something in the grammar
+    UNWRITABLE = {
+        ('ebnf_self_define_no_comments.txt', 'bnf'),    # Exceptions
+        ('ebnf_self_define_no_comments.txt', 'abnf'),
+        ('ebnf_self_define_no_comments.txt', 'rbnf'),
+        ('abnf1.txt', 'bnf'),                           # Quotes and spaces
+        ('abnf_self_define.txt', 'bnf'),
+        ('core_abnf.txt', 'bnf'),                       # Control characters
+        ('core_abnf.txt', 'rbnf')
+    }
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def test_samples(self):
+        for source in PARSE_METHODS:
+            directory = os.path.join('../sample_grammars', source + 's')
+            # ebnf_self_define.txt can't be parsed at all
+            paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                     if name != 'ebnf_self_define.txt']
+            for target in PARSE_METHODS:
+                output = os.path.join(self.output, source)
+                for result in convert_files(paths, source, target, output, workers=1):
+                    name = os.path.basename(result.path)
+                    with self.subTest(path=result.path, target=target):
+                        if (name, target) in self.UNWRITABLE:
+                            self.assertEqual(result.error.type, 'ConversionError')
+                            continue
+                        self.assertIsNone(result.error)
+                        with open(result.output) as f:
+                            parsed = PARSE_METHODS[target](f.read())
+                        self.assertEqual(len(parsed.ruleset), result.rules)
@@ -0,0 +1,152 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+from mlangpy import binary
+from mlangpy.grammar import *
+from mlangpy.metalanguages import EBNF
+from mlangpy.metaparsers import parse_ABNF, parse_BNF, parse_EBNF, parse_RBNF
+
+
+class Shouting(Terminal):
+    """ Has an instance __dict__, unlike the grammar classes. """
+
+    def __init__(self, subject):
+        super().__init__(subject)
+        self.volume = 11
+
+
+class TestBinary(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # For Shouting
+        binary.register_module(__name__)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'grammar.mlpy')
+        self.abnf = parse_ABNF(open('../sample_grammars/abnfs/abnf_self_define.txt').read(), parser='lalr')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSame(self, a, b):
+        self.assertEqual(a, b)
+        self.assertEqual(str(a), str(b))
+        # Saving again covers every class and field, boundaries and all
+        self.assertEqual(binary.dumps(a), binary.dumps(b))
+
+    def test_round_trip(self):
+        for parse_method, grammar in [
+            (parse_BNF, '<a> ::= <b> c | d\n<b> ::= e'),
+            (parse_EBNF, "a = 'b', [c], {d | 3 * e} ;"),
+            (parse_ABNF, 'a = *2("b" / c) %x41-42 [3d]\n'),
+            (parse_RBNF, '<a> ::= <B> [<c>] ...')
+        ]:
+            with self.subTest(metalanguage=parse_method.__name__):
+                metalanguage = parse_method(grammar)
+                loaded = binary.loads(binary.dumps(metalanguage))
+                self.assertIs(loaded.__class__, metalanguage.__class__)
+                self.assertSame(loaded.ruleset, metalanguage.ruleset)
+                # RBNF's syntax has a function in it, which comes from RBNF.__init__ rather than the file
+                self.assertEqual(loaded.syntax.keys(), metalanguage.syntax.keys())
+                self.assertEqual({k: v for k, v in loaded.syntax.items() if isinstance(v, type)},
+                                 {k: v for k, v in metalanguage.syntax.items() if isinstance(v, type)})
+
+    def test_file(self):
+        with open(self.path, 'wb') as f:
+            binary.dump(self.abnf, f)
+        loaded = binary.load(self.path)
+        self.assertSame(loaded.ruleset, self.abnf.ruleset)
+
+    def test_lazy(self):
+        with open(self.path, 'wb') as f:
+            binary.dump(self.abnf.ruleset, f)
+
+        with binary.GrammarFile(self.path) as f:
+            self.assertEqual(len(f), len(self.abnf.ruleset))
+            self.assertEqual(f[3], self.abnf.ruleset[3])
+            self.assertEqual(f[-1], self.abnf.ruleset[-1])
+            self.assertIsNot(f[3], f[3])
+            with self.assertRaises(IndexError):
+                f[len(f)]
+            rule = f[0]
+        self.assertEqual(str(rule), str(self.abnf.ruleset[0]))
+
+    def test_rulesets(self):
+        ruleset = Ruleset([
+            Rule(NonTerminal('a'), [Concat([Terminal('b'), Optional(Concat([NonTerminal('a')]))])]),
+            Rule(NonTerminal('c'), [Concat([Except(Terminal('d'), Terminal('e'))]), Concat([])])
+        ])
+        self.assertSame(binary.loads(binary.dumps(ruleset)), ruleset)
+
+        persistent = ruleset.freeze()
+        loaded = binary.loads(binary.dumps(persistent))
+        self.assertIsInstance(loaded, PersistentRuleset)
+        self.assertEqual(loaded, persistent)
+
+    def test_interning(self):
+        ruleset = Ruleset([Rule(NonTerminal('a'), [Concat([NonTerminal('a'), NonTerminal('a')])])])
+        data = binary.dumps(ruleset)
+
+        rule = binary.loads(data)[0]
+        self.assertIsNot(rule.left[0], rule.right[0][0])
+        rule.left[0].subject = 'b'
+        self.assertEqual(rule.right[0][0].subject, 'a')
+
+        rule = binary.loads(data, intern=True)[0]
+        self.assertIs(rule.left[0], rule.right[0][0])
+        self.assertIs(rule.right[0][0], rule.right[0][1])
+
+    def test_metalanguage_settings(self):
+        ml = EBNF(Ruleset([Rule(NonTerminal('a'), [Concat([Terminal('b')])])]))
+        ml.grp_count = 3
+        loaded = binary.loads(binary.dumps(ml))
+        self.assertEqual(loaded.grp_count, 3)
+        self.assertEqual(loaded.syntax, ml.syntax)
+
+    def test_instance_dict(self):
+        ruleset = Ruleset([Rule(NonTerminal('a'), [Concat([Shouting('b')])])])
+        loaded = binary.loads(binary.dumps(ruleset))
+        self.assertIs(loaded[0].right[0][0].__class__, Shouting)
+        self.assertEqual(loaded[0].right[0][0].volume, 11)
+
+    def test_deep_nesting(self):
+        feature = Terminal('x')
+        for _ in range(sys.getrecursionlimit() * 2):
+            feature = Group(Concat([feature]))
+        ruleset = Ruleset([Rule(NonTerminal('a'), [Concat([feature])])])
+        self.assertEqual(str(binary.loads(binary.dumps(ruleset))), str(ruleset))
+
+    def test_local_classes(self):
+        class Local(Terminal):
+            __slots__ = ()
+
+        with self.assertRaises(ValueError):
+            binary.dumps(Ruleset([Rule(NonTerminal('a'), [Concat([Local('b')])])]))
+
+    def test_bad_files(self):
+        data = binary.dumps(self.abnf)
+        for bad in [b'', b'MLPY', b'XXXX' + data[4:], data[:4] + b'\x63\x00' + data[6:],
+                    data.replace(b'mlangpy.grammar:Rule', b'subprocess:Popen\x00\x00\x00\x00')]:
+            with self.subTest(data=bad[:8]):
+                with self.assertRaises(ValueError):
+                    binary.loads(bad)
+
+        open(self.path, 'wb').close()
+        with self.assertRaises(ValueError):
+            binary.load(self.path)
+
+    def test_modules_not_imported(self):
+        # The module is checked before it's imported, so a file naming one can't run it. 'this' prints when imported.
+        data = binary.dumps(self.abnf).replace(b'mlangpy.grammar:Rule', b'this:Rule'.ljust(20, b'\x00'))
+        with self.assertRaises(ValueError):
+            binary.loads(data)
+        self.assertNotIn('this', sys.modules)
+
+        data = binary.dumps(self.abnf).replace(b'mlangpy.grammar:Rule', b'mlangpyx:Rule'.ljust(20, b'\x00'))
+        with self.assertRaises(ValueError):
+            binary.loads(data)
@@ -0,0 +1,59 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from mlangpy.cli import main
+from mlangpy.metaparsers import parse_ABNF
+
+
+class TestConvert(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'grammars')
+        self.output = os.path.join(self.directory, 'out')
+        os.mkdir(self.source)
+        for name, grammar_string in [('a.txt', '<a> ::= <b> c\n'), ('b.txt', '<d> ::= e | <d> e\n')]:
+            with open(os.path.join(self.source, name), 'w') as f:
+                f.write(grammar_string)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_main(self, *args):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            status = main(['convert', '--from', 'bnf', '--to', 'abnf', '-o', self.output] + list(args))
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_directory(self):
+        status, stdout, stderr = self.run_main(self.source, '-j', '2')
+        self.assertEqual(status, 0)
+        self.assertIn('Converted 2 files (2 rules)', stdout)
+        self.assertIn('0 skipped, 0 failed', stdout)
+        self.assertEqual(stderr, '')
+        self.assertEqual(sorted(os.listdir(self.output)), ['a.abnf', 'b.abnf'])
+        with open(os.path.join(self.output, 'b.abnf')) as f:
+            self.assertEqual(str(parse_ABNF(f.read()).ruleset), 'd = "e" / d "e" ')
+
+        status, stdout, _ = self.run_main(self.source)
+        self.assertEqual(status, 0)
+        self.assertIn('Converted 0 files', stdout)
+        self.assertIn('2 skipped', stdout)
+
+        _, stdout, _ = self.run_main(self.source, '--force')
+        self.assertIn('Converted 2 files', stdout)
+
+    def test_failure(self):
+        bad = os.path.join(self.directory, 'bad.txt')
+        with open(bad, 'w') as f:
+            f.write('<a> ::=\n<')
+        status, stdout, stderr = self.run_main(bad, os.path.join(self.source, 'a.txt'), '-j', '1')
+        self.assertEqual(status, 1)
+        self.assertIn('Converted 1 files', stdout)
+        self.assertIn('1 failed', stdout)
+        self.assertTrue(stderr.startswith(bad + ':'))
+        self.assertEqual(os.listdir(self.output), ['a.abnf'])
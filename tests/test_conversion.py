@@ -0,0 +1,63 @@
+from unittest import TestCase
+from mlangpy.conversion import *
+from mlangpy.metaparsers import parse_ABNF, parse_BNF, parse_EBNF, parse_RBNF
+
+
+class TestConvert(TestCase):
+
+    def convert(self, metalanguage, target):
+        return str(convert(metalanguage, target).ruleset)
+
+    def test_incremental_rules(self):
+        abnf = parse_ABNF('a = "b"\nc = d\nA =/ "e" / c\n')
+        self.assertEqual(self.convert(abnf, 'abnf'), 'a = "b" / "e" / c \nc = d ')
+        self.assertEqual(self.convert(abnf, 'ebnf'), 'a = "b" | "e" | c ;\nc = d ;')
+        # The ruleset that was converted is left as it was
+        self.assertEqual(len(abnf.ruleset), 3)
+
+    def test_characters(self):
+        abnf = parse_ABNF('a = %x41 / %x61-63\nb = %x0D\n')
+        self.assertEqual(self.convert(abnf, 'abnf'), 'a = %x41 / %x61-63 \nb = %x0D ')
+        self.assertEqual(self.convert(abnf, 'ebnf'), 'a = "A" | ("a" | "b" | "c") ;\nb = ?%x0D? ;')
+        self.assertEqual(str(convert(parse_ABNF('a = %x41 / %x61-63\n'), 'rbnf').ruleset),
+                         '<a> ::= <A> | (<A> | <B> | <C>) ')
+        with self.assertRaises(ConversionError):
+            convert(abnf, 'bnf')
+        with self.assertRaises(ConversionError):
+            convert(parse_ABNF('a = %x00-FFFF\n'), 'ebnf')
+
+    def test_empty_alternatives(self):
+        ebnf = parse_EBNF('a = b | ; b = "c", [d | ] ;')
+        self.assertEqual(self.convert(ebnf, 'ebnf'), 'a = b |  ;\nb = "c", [d | ] ;')
+        self.assertEqual(self.convert(ebnf, 'abnf'), 'a = [b] \nb = "c" [[d]] ')
+        self.assertEqual(self.convert(ebnf, 'bnf'), '<a> ::= <b> | "" \n<b> ::= c <op 0> \n<op 0> ::= <d> | "" ')
+        self.assertEqual(str(parse_BNF('<a> ::= b | ""').ruleset), '<a> ::= b | "" ')
+        with self.assertRaises(ConversionError):
+            convert(parse_EBNF('a = ;'), 'rbnf')
+
+    def test_names(self):
+        bnf = parse_BNF('<if statement> ::= <if-statement> <rep 1>\n<if-statement> ::= x')
+        # Names the target can read keep them
+        self.assertEqual(self.convert(bnf, 'abnf'), 'if-statement-2 = if-statement rep-1 \nif-statement = "x" ')
+        self.assertEqual(self.convert(bnf, 'ebnf'), 'if statement = if statement 2, rep 1 ;\nif statement 2 = "x" ;')
+        self.assertEqual(self.convert(bnf, 'rbnf'), '<if statement> ::= <if-statement> <rep one> \n'
+                                                    '<if-statement> ::= <X> ')
+        # The same rule, however its name is written, in ABNF
+        self.assertEqual(self.convert(parse_ABNF('A-b = a-B "x"\n'), 'ebnf'), 'A b = A b, "x" ;')
+
+    def test_terminals(self):
+        ebnf = parse_EBNF('a = "it\'s", \'"\', ";" ;')
+        self.assertEqual(self.convert(ebnf, 'abnf'), 'a = "it\'s" %x22 ";" ')
+        self.assertEqual(self.convert(ebnf, 'rbnf'), '<a> ::= <IT_APOSTROPHE_S> <QUOTATION_MARK> <SEMICOL> ')
+        self.assertEqual(self.convert(parse_RBNF('<a> ::= <B_C>'), 'ebnf'), 'a = "B_C" ;')
+        with self.assertRaises(ConversionError):
+            convert(ebnf, 'bnf')
+
+    def test_unwritable(self):
+        ebnf = parse_EBNF('a = b-"c" | 2 * d | ? e ? ;')
+        self.assertEqual(self.convert(ebnf, 'ebnf'), 'a = b-"c" | 2 * d | ? e ? ;')
+        with self.assertRaises(ConversionError):
+            convert(ebnf, 'abnf')
+        self.assertEqual(self.convert(parse_EBNF('a = 2 * d ;'), 'abnf'), 'a = d d ')
+        with self.assertRaises(ValueError):
+            convert(ebnf, 'xbnf')
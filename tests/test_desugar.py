@@ -0,0 +1,90 @@
+from unittest import TestCase
+from unittest.mock import patch
+from mlangpy.grammar import *
+from mlangpy.metalanguages import *
+from mlangpy.metaparsers import parse_ABNF, parse_EBNF, parse_RBNF
+
+
+class TestDesugar(TestCase):
+
+    def setUp(self):
+        self.ruleset = Ruleset([
+            Rule(NonTerminal('a'), [Concat([Optional([Terminal('b')]), Repetition(Concat([NonTerminal('c')]))])]),
+            Rule(NonTerminal('c'), [Concat([Group(DefList([Concat([Terminal('d')]), Concat([Terminal('e')])])),
+                                            Group([Terminal('f'), Terminal('g')])])]),
+            Rule(NonTerminal('op 0'), [Concat([Optional([Terminal('b')]), Terminal('h')])])
+        ])
+        self.original = str(self.ruleset)
+
+    def test_constructs(self):
+        ml = Metalanguage(self.ruleset)
+        self.assertEqual(ml.desugar(), 3)
+        self.assertEqual(str(ml.ruleset).splitlines(), [
+            '/a/ -> /op 1/ /rep 0/ ',
+            '/c/ -> /grp 0/ f g ',
+            '/op 0/ -> /op 1/ h ',
+            '/op 1/ -> b |  ',
+            '/rep 0/ -> /c/ /rep 0/ |  ',
+            '/grp 0/ -> d | e '
+        ])
+        self.assertEqual(str(self.ruleset), self.original)
+
+    def test_nested_and_shared(self):
+        ml = parse_ABNF('a = [*b] 2*3c\nd = [*b] *(c / e) 1*f\n', parser='lalr')
+        ml.desugar()
+        self.assertEqual(str(ml.ruleset).splitlines(), [
+            'a = op 0 c c op 1 ',
+            'd = op 0 rep 1 f rep 2 ',
+            'rep 0 = b rep 0 /  ',
+            'op 0 = rep 0 /  ',
+            'op 1 = c /  ',
+            'grp 0 = c / e ',
+            'rep 1 = grp 0 rep 1 /  ',
+            'rep 2 = f rep 2 /  '
+        ])
+
+    def test_rbnf_repetition(self):
+        ml = parse_RBNF('<a> ::= <b>... [<c>...]\n<d> ::= <b>...\n', parser='lalr')
+        ml.desugar()
+        self.assertEqual(str(ml.ruleset).splitlines()[:3], [
+            '<a> ::= <rep 0> <op 0> ', '<d> ::= <rep 0> ', '<rep 0> ::= <b> <rep 0> | <b> '
+        ])
+
+    def test_syntax_concat(self):
+        # Rewritten rules are written the same way as the helpers, without needing to be normalised
+        ml = parse_EBNF("a = [b], {c}, d | e ;\nf = g, h ;", parser='lalr')
+        ml.desugar()
+        self.assertEqual(str(ml.ruleset).splitlines()[0], 'a = op 0, rep 0, d | e ;')
+        self.assertEqual(str(ml.ruleset).splitlines()[2], 'op 0 = b |  ;')
+
+    def test_names_continue(self):
+        ml = Metalanguage(self.ruleset)
+        ml.desugar()
+        ml.ruleset += Rule(NonTerminal('x'), [Concat([Optional([Terminal('y')])])])
+        self.assertEqual(ml.desugar(), 1)
+        self.assertEqual(str(ml.ruleset[-1]), '/op 2/ -> y |  ')
+
+    def test_bad_repetition(self):
+        ml = Metalanguage(Ruleset([Rule(NonTerminal('a'), [Concat([ABNFRepetition(Terminal('b'), 3, 2)])])]))
+        with self.assertRaises(GrammarException):
+            ml.desugar()
+
+    @patch('os.cpu_count', return_value=3)
+    def test_parallel(self, cpu_count):
+        text = open('../sample_grammars/rbnfs/pathmessage.txt').read() + '<x> ::= [<Integrity>] <y>...\n'
+        serial = parse_RBNF(text * 5, parser='lalr')
+        parallel = parse_RBNF(text * 5, parser='lalr')
+        self.assertEqual(serial.desugar(), parallel.desugar(workers=3))
+        self.assertEqual(str(parallel.ruleset), str(serial.ruleset))
+
+    def test_some_constructs(self):
+        ml = parse_RBNF('<a> ::= [<b>...] (<c> | <d>)\n<e> ::= <c>\n', parser='lalr')
+        e = ml.ruleset[1]
+        ml.desugar(constructs=[RBNFRepetition])
+        self.assertEqual(str(ml.ruleset).splitlines(), [
+            '<a> ::= [<rep 0>] (<c> | <d>) ', '<e> ::= <c> ', '<rep 0> ::= <b> <rep 0> | <b> '
+        ])
+        self.assertIs(ml.ruleset[1], e)
+
+        with self.assertRaises(ValueError):
+            ml.desugar(constructs=[Terminal])
@@ -0,0 +1,101 @@
+import os
+from unittest import TestCase
+from lark import Lark
+from mlangpy.dialects import *
+from mlangpy.grammar import *
+from mlangpy.metalanguages import BNF, EBNF, RBNF
+from mlangpy.metalanguages.Metalanguage import Metalanguage
+from mlangpy.metaparsers import parse_BNF, parse_EBNF, parse_RBNF, parse_dialect, get_dialect_parser, \
+    clear_parser_cache
+
+
+class Angled(NonTerminal):
+    __slots__ = ()
+
+    def __init__(self, subject):
+        super().__init__(subject, left_bound='{', right_bound='}')
+
+
+class Arrow(Rule):
+    __slots__ = ()
+
+    def __init__(self, left, right):
+        super().__init__(left, right, production=':=', terminator='.')
+
+
+class Star(Operator):
+    __slots__ = ()
+
+    def __init__(self, subject):
+        super().__init__(subject, operator_sym='*')
+
+
+# A dialect none of the bundled grammars can read
+SYNTAX = {
+    Concat: Concat,
+    DefList: DefList,
+    Rule: Arrow,
+    NonTerminal: Angled,
+    Terminal: Terminal,
+    Optional: Optional,
+    Star: Star,
+    Except: Except
+}
+
+
+class TestDialects(TestCase):
+
+    def setUp(self):
+        self.samples = '../sample_grammars'
+
+    def check_round_trip(self, parse_method, directory, names):
+        for name in names:
+            with self.subTest(name=name):
+                metalanguage = parse_method(open(os.path.join(self.samples, directory, name)).read(), parser='lalr')
+                metalanguage.normalise()
+                text = str(metalanguage.ruleset)
+                self.assertEqual(str(parse_dialect(text, metalanguage).ruleset), text)
+
+    def test_bnf(self):
+        self.check_round_trip(parse_BNF, 'bnfs', ['algol.txt', 'ant.txt', 'if.txt'])
+
+    def test_ebnf(self):
+        self.check_round_trip(parse_EBNF, 'ebnfs', ['ebnf_if.txt', 'testing.txt'])
+
+    def test_rbnf(self):
+        self.check_round_trip(parse_RBNF, 'rbnfs', ['pathmessage.txt', 'flow_desc1.txt'])
+
+    def test_custom_dialect(self):
+        metalanguage = parse_dialect('{a} := {b} c [d] e* | .\n{b} := (c).', SYNTAX)
+        a, b = metalanguage.ruleset
+        self.assertEqual(str(a), '{a} := {b} c [d] e* |  .')
+        self.assertIsInstance(a, Arrow)
+        self.assertIsInstance(a.left.terms[0], Angled)
+        self.assertEqual(a.right.terms[0].terms[2], Optional(Concat([Terminal('d')])))
+        self.assertIsInstance(a.right.terms[0].terms[3], Star)
+        self.assertIs(metalanguage.syntax, parse_dialect('', metalanguage).syntax)
+
+        # Unterminated rules, but nothing in brackets
+        self.assertEqual(len(parse_dialect('<a> ::= b <c>\n<c> ::= d', BNF(Ruleset([])).syntax).ruleset), 2)
+
+    def test_grammar_is_lalr(self):
+        for syntax in (SYNTAX, EBNF(Ruleset([])).syntax, RBNF(Ruleset([])).syntax, Metalanguage(Ruleset([])).syntax):
+            Lark(build_lark_grammar(syntax), parser='lalr')
+
+    def test_notation(self):
+        form = notation(SYNTAX)
+        self.assertEqual((form.production, form.terminator, form.separator, form.alternation), (':=', '.', '', '|'))
+        self.assertEqual([(s.left, s.right) for s in form.symbols], [('{', '}'), ('', '')])
+        self.assertEqual(form.rule_names, [0])
+        # Except can't be made from a single subject
+        self.assertEqual([(b.open, b.close, b.single) for b in form.brackets], [('[', ']', False), ('', '*', True)])
+
+    def test_parser_cache(self):
+        clear_parser_cache()
+        parser = get_dialect_parser(SYNTAX)
+        self.assertIs(get_dialect_parser(dict(SYNTAX)), parser)
+        metalanguage = Metalanguage(Ruleset([]), syntax_dict=dict(SYNTAX))
+        self.assertIs(get_dialect_parser(metalanguage.syntax), parser)
+        metalanguage.syntax[Rule] = Rule
+        self.assertIsNot(get_dialect_parser(metalanguage.syntax), parser)
+        self.assertEqual(str(parse_dialect('{a} -> b', metalanguage).ruleset), '{a} -> b ')
@@ -1,3 +1,5 @@
+import io
+import sys
 from unittest import TestCase
 from mlangpy.grammar import *
 
@@ -287,4 +289,380 @@ class TestRuleset(TestCase):
             [Concat([Terminal('b')])]
         )
         matches = self.ruleset.find_rules(looking_for)
-        self.assertNotIn(looking_for, matches)
\ No newline at end of file
+        self.assertNotIn(looking_for, matches)
+
+class Annotated(Terminal):
+    """ A subclass with an instance dict, which has to be at the top level to be pickled. """
+
+
+class TestSlots(TestCase):
+
+    def setUp(self):
+        t = Terminal('b')
+        self.features = [
+            t, NonTerminal('a'), Optional([t]), Group([t]), Repetition(Concat([t])),
+            Operator(t, '*'), Except(t, t), TernaryOperator(t, t, t, '?', ':'),
+            Concat([t]), DefList([Concat([t])]), DefinitionList([Concat([t])]),
+            Rule(NonTerminal('a'), [Concat([t])])
+        ]
+
+    def test_no_instance_dict(self):
+        for feature in self.features:
+            with self.subTest(cls=feature.__class__.__name__):
+                self.assertFalse(hasattr(feature, '__dict__'))
+
+    def test_copy(self):
+        import pickle
+        for feature in self.features:
+            with self.subTest(cls=feature.__class__.__name__):
+                self.assertEqual(str(copy.deepcopy(feature)), str(feature))
+                self.assertEqual(str(pickle.loads(pickle.dumps(feature))), str(feature))
+
+    def test_pickle_unset_and_dict(self):
+        import pickle
+        unset = Terminal.__new__(Terminal)
+        unset.subject = 'x'
+        clone = pickle.loads(pickle.dumps(unset))
+        self.assertEqual(clone.subject, 'x')
+        self.assertFalse(hasattr(clone, 'left_bound'))
+
+        annotated = Annotated('x')
+        annotated.note = 'hi'
+        clone = pickle.loads(pickle.dumps(annotated))
+        self.assertEqual((clone, clone.note), (annotated, 'hi'))
+
+    def test_subclass_attributes(self):
+        # Subclasses that don't declare __slots__ can still have attributes of their own
+        class Annotated(Terminal):
+            pass
+
+        a = Annotated('x')
+        a.note = 'hi'
+        self.assertEqual(a.note, 'hi')
+
+
+class TestHashing(TestCase):
+
+    def setUp(self):
+        self.rule = Rule(NonTerminal('a'), [Concat([Terminal('b'), Optional([NonTerminal('c')])])])
+        self.other = Rule(NonTerminal('a', '<', '>'), [Concat([Terminal('b', '"', '"'), Optional([NonTerminal('c')])])])
+
+    def test_equal_objects_hash_equal(self):
+        pairs = [
+            (Symbol('a'), Terminal('a')),
+            (Terminal('a', '"', '"'), Terminal('a')),
+            (Optional([Terminal('a')]), Optional([Terminal('a')], '(', ')')),
+            (Sequence([Terminal('a')]), Concat([Terminal('a')])),
+            (Except(Terminal('a'), Terminal('b')), Except(Terminal('a'), Terminal('b'), ' - ')),
+            (TernaryOperator(1, 2, Terminal('a'), '*', ''), TernaryOperator(1, 2, Terminal('a'), '#', '')),
+            (self.rule, self.other)
+        ]
+        for a, b in pairs:
+            with self.subTest(a=a, b=b):
+                self.assertEqual(a, b)
+                self.assertEqual(hash(a), hash(b))
+
+    def test_dict_and_set(self):
+        rules = {self.rule: 1}
+        self.assertEqual(rules[self.other], 1)
+        self.assertEqual(len({Terminal('a'), Terminal('a', "'", "'"), Terminal('b')}), 2)
+        self.assertEqual(hash(Ruleset([self.rule])), hash(Ruleset([self.other])))
+
+    def test_item_assignment_invalidates(self):
+        h = hash(self.rule)
+        self.rule.right[0][0] = Terminal('x')
+        self.assertNotEqual(hash(self.rule), h)
+        self.assertNotEqual(self.rule, self.other)
+
+        self.rule.right[0][0] = Terminal('b')
+        self.assertEqual(hash(self.rule), h)
+        self.assertEqual(self.rule, self.other)
+
+    def test_attribute_assignment_invalidates(self):
+        h = hash(self.rule)
+        self.rule.left = Concat([NonTerminal('z')])
+        self.assertNotEqual(hash(self.rule), h)
+
+    def test_leaf_attribute_assignment_invalidates(self):
+        # Changing a symbol inside a hashed rule changes the rule's hash too
+        h = hash(self.rule)
+        symbol = self.rule.right[0][0]
+        symbol.subject = 'x'
+        self.assertNotEqual(hash(self.rule), h)
+        symbol.subject = 'b'
+        self.assertEqual(hash(self.rule), h)
+
+        for feature, name, value in [
+            (Terminal('a'), 'subject', 'b'),
+            (Optional(Concat([Terminal('a')])), 'subject', Concat([Terminal('b')])),
+            (Operator(Terminal('a'), '*'), 'subject', Terminal('b')),
+            (Except(Terminal('a'), Terminal('b')), 'right', Terminal('c')),
+            (TernaryOperator(Terminal('a'), Terminal('b'), Terminal('c'), '?', ':'), 'middle', Terminal('d')),
+            (Concat([Terminal('a')]), 'terms', [Terminal('b')]),
+            (DefinitionList([Concat([Terminal('a')])]), 'definitions', [Concat([Terminal('b')])])
+        ]:
+            with self.subTest(cls=feature.__class__.__name__):
+                h = hash(feature)
+                setattr(feature, name, value)
+                self.assertNotEqual(hash(feature), h)
+
+    def test_iadd_invalidates(self):
+        concat = Concat([Terminal('a')])
+        h = hash(concat)
+        concat += Terminal('b')
+        self.assertNotEqual(hash(concat), h)
+        self.assertEqual(concat, Concat([Terminal('a'), Terminal('b')]))
+
+    def test_invalidate_hashes(self):
+        h = hash(self.rule)
+        self.rule.right[0].terms.append(Terminal('x'))
+        invalidate_hashes()
+        self.assertNotEqual(hash(self.rule), h)
+
+    def test_copies_rehash(self):
+        import pickle
+        hash(self.rule)
+        self.assertIsNone(copy.deepcopy(self.rule)._hash)
+        self.assertIsNone(pickle.loads(pickle.dumps(self.rule))._hash)
+        self.assertEqual(hash(copy.deepcopy(self.rule)), hash(self.rule))
+
+
+class TestRulesetIndex(TestCase):
+
+    def setUp(self):
+        self.rules = [Rule(NonTerminal(f'r{i}'), [Concat([Terminal(str(i % 3))])]) for i in range(6)]
+        self.ruleset = Ruleset(self.rules)
+
+    def test_find_rules_for_in_order(self):
+        matches = self.ruleset.find_rules_for(DefList([Concat([Terminal('1')])]))
+        self.assertEqual([rule.left[0].subject for rule in matches], ['r1', 'r4'])
+
+    def test_find_rules_named(self):
+        self.assertEqual(self.ruleset.find_rules_named(NonTerminal('r2')), [self.rules[2]])
+        self.assertEqual(self.ruleset.find_rules_named(NonTerminal('x')), [])
+
+    def test_duplicates(self):
+        ruleset = Ruleset([self.rules[0], self.rules[1], self.rules[0]])
+        self.assertEqual(ruleset.find_rules(self.rules[0]), [self.rules[0], self.rules[0]])
+
+    def test_setitem(self):
+        self.assertTrue(self.ruleset.rule_exists(self.rules[0]))
+        new = Rule(NonTerminal('new'), [Concat([Terminal('x')])])
+        self.ruleset[0] = new
+        self.assertFalse(self.ruleset.rule_exists(self.rules[0]))
+        self.assertEqual(self.ruleset.find_rules(new), [new])
+
+    def test_iadd(self):
+        self.assertFalse(self.ruleset.find_rules_named(NonTerminal('new')))
+        new = Rule(NonTerminal('new'), [Concat([Terminal('x')])])
+        ruleset = self.ruleset
+        ruleset += new
+        self.assertIs(ruleset, self.ruleset)
+        self.assertEqual(self.ruleset.find_rules_named(NonTerminal('new')), [new])
+
+        ruleset += Ruleset([new])
+        self.assertEqual(len(self.ruleset.find_rules(new)), 2)
+
+    def test_direct_list_changes(self):
+        self.assertTrue(self.ruleset.rule_exists(self.rules[5]))
+        del self.ruleset.rules[5]
+        self.assertFalse(self.ruleset.rule_exists(self.rules[5]))
+        self.ruleset.rules[0:0] = [self.rules[5]]
+        self.assertEqual(self.ruleset.find_rules_for(self.rules[2].right), [self.rules[5], self.rules[2]])
+
+    def test_rules_changed_in_place(self):
+        right = DefList([Concat([Terminal('z')])])
+        self.assertFalse(self.ruleset.find_rules_for(right))
+        self.rules[3].right[0][0] = Terminal('z')
+        self.assertEqual(self.ruleset.find_rules_for(right), [self.rules[3]])
+
+        self.rules[3].right[0][0] = Terminal('y')
+        self.ruleset.reindex(self.rules[3])
+        self.assertFalse(self.ruleset.find_rules_for(right))
+        self.assertEqual(self.ruleset.find_rules_for(DefList([Concat([Terminal('y')])])), [self.rules[3]])
+
+    def test_unhashable_rules(self):
+        ruleset = Ruleset([Rule(['a'], [Concat(['b'])])] + self.rules)
+        self.assertEqual(ruleset.find_rules(self.rules[1]), [self.rules[1]])
+
+    def test_copy(self):
+        self.ruleset.rule_exists(self.rules[0])
+        clone = copy.deepcopy(self.ruleset)
+        self.assertEqual(clone.find_rules(self.rules[0]), [clone.rules[0]])
+
+
+class TestSymbolTable(TestCase):
+
+    def test_symbol(self):
+        table = SymbolTable()
+        a = table.symbol(NonTerminal, 'a')
+        self.assertIs(table.symbol(NonTerminal, 'a'), a)
+        self.assertIsNot(table.symbol(Terminal, 'a'), a)
+        self.assertIsNot(table.symbol(NonTerminal, 'a', '<', '>'), a)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(str(table.symbol(NonTerminal, 'a', '<', '>')), '<a>')
+
+
+class TestRulesetCopy(TestCase):
+
+    def setUp(self):
+        self.rules = [Rule(NonTerminal(name), [Concat([Terminal('x')])]) for name in 'abc']
+        self.ruleset = Ruleset(self.rules)
+
+    def test_shares_rules(self):
+        clone = self.ruleset.copy()
+        self.assertEqual(clone, self.ruleset)
+        self.assertIs(clone[0], self.rules[0])
+
+    def test_changes_kept_apart(self):
+        clone = self.ruleset.copy()
+        new = Rule(NonTerminal('d'), [Concat([Terminal('y')])])
+        clone += new
+        clone[0] = new
+        self.ruleset.rules.append(new)
+        self.assertEqual([rule.left[0].subject for rule in clone], ['d', 'b', 'c', 'd'])
+        self.assertEqual([rule.left[0].subject for rule in self.ruleset], ['a', 'b', 'c', 'd'])
+
+    def test_index_of(self):
+        self.assertEqual(self.ruleset.index_of(self.rules[2]), 2)
+        with self.assertRaises(ValueError):
+            # Equal, but not the same rule
+            self.ruleset.index_of(Rule(NonTerminal('a'), [Concat([Terminal('x')])]))
+
+
+class TestPersistentRuleset(TestCase):
+
+    def setUp(self):
+        self.rules = [Rule(NonTerminal(f'r{i}'), [Concat([Terminal('x'), NonTerminal('y')]), Concat([Terminal('z')])])
+                      for i in range(100)]
+        self.ruleset = PersistentRuleset(self.rules)
+
+    def test_read(self):
+        self.assertEqual(len(self.ruleset), 100)
+        self.assertEqual(list(self.ruleset), self.rules)
+        self.assertIs(self.ruleset[-1], self.rules[-1])
+        self.assertEqual(self.ruleset[1:3], self.rules[1:3])
+        with self.assertRaises(IndexError):
+            self.ruleset[100]
+
+    def test_set(self):
+        new = Rule(NonTerminal('new'), [Concat([Terminal('x')])])
+        version = self.ruleset.set(50, new)
+        self.assertIs(version[50], new)
+        self.assertIs(self.ruleset[50], self.rules[50])
+        self.assertTrue(all(version[i] is self.rules[i] for i in range(100) if i != 50))
+        self.assertNotEqual(version, self.ruleset)
+
+    def test_replace_shares_untouched_nodes(self):
+        version = self.ruleset.replace(7, ('right', 0, 1), NonTerminal('w'))
+        old, new = self.ruleset[7], version[7]
+        self.assertEqual(str(new), '/r7/ -> x /w/ | z ')
+        self.assertEqual(str(old), '/r7/ -> x /y/ | z ')
+        self.assertIs(new.left, old.left)
+        self.assertIs(new.right[1], old.right[1])
+        self.assertIs(new.right[0][0], old.right[0][0])
+
+    def test_append_and_add(self):
+        new = Rule(NonTerminal('new'), [Concat([Terminal('x')])])
+        version = self.ruleset.append(new)
+        self.assertEqual(len(version), 101)
+        self.assertEqual(len(self.ruleset), 100)
+        self.assertEqual(version, self.ruleset + new)
+        self.assertEqual(len(self.ruleset + Ruleset([new, new])), 102)
+
+    def test_delete(self):
+        version = self.ruleset.delete(0)
+        self.assertEqual(list(version), self.rules[1:])
+
+    def test_ruleset_interop(self):
+        ruleset = self.ruleset.thaw()
+        self.assertIsInstance(ruleset, Ruleset)
+        self.assertEqual(ruleset, self.ruleset)
+        self.assertEqual(self.ruleset, ruleset)
+        self.assertEqual(hash(ruleset), hash(self.ruleset))
+        self.assertEqual(ruleset.freeze(), self.ruleset)
+
+    def test_immutable(self):
+        with self.assertRaises(TypeError):
+            self.ruleset[0] = self.rules[1]
+        with self.assertRaises(AttributeError):
+            self.ruleset.rules
+
+    def test_copies(self):
+        import pickle
+        hash(self.ruleset)
+        clone = pickle.loads(pickle.dumps(self.ruleset))
+        self.assertEqual(clone, self.ruleset)
+        self.assertEqual(hash(clone), hash(self.ruleset))
+
+    def test_replace_at(self):
+        rule = self.rules[0]
+        new = replace_at(rule, ('left', 0), NonTerminal('renamed'))
+        self.assertEqual(str(new.left), '/renamed/')
+        self.assertEqual(str(rule.left), '/r0/')
+        self.assertIs(new.right, rule.right)
+        self.assertIs(replace_at(rule, (), new), new)
+
+
+class TestSerialisation(TestCase):
+
+    def setUp(self):
+        self.ruleset = Ruleset([
+            Rule(NonTerminal('a'), [Concat([Optional(Concat([Terminal('b')])), NonTerminal('c')]),
+                                    Concat([Except(Terminal('d'), Terminal('e'))])]),
+            Rule(NonTerminal('c'), [Concat([Group(DefList([Concat([Terminal('f')]), Concat([Terminal('g')])]))])]),
+            Rule(NonTerminal('h'), [Concat([Repetition(Concat([Terminal('i'), Terminal('j')]))])])
+        ])
+
+    def test_str(self):
+        self.assertEqual(str(self.ruleset), '/a/ -> [b] /c/ | d-e \n/c/ -> (f | g) \n/h/ -> {i j} ')
+
+    def test_iter_str(self):
+        for rule in self.ruleset:
+            with self.subTest(rule=str(rule)):
+                self.assertEqual(''.join(iter_str(rule)), str(rule))
+
+    def test_write(self):
+        for buffer_size in (1, 10, 65536):
+            with self.subTest(buffer_size=buffer_size):
+                stream = io.StringIO()
+                self.ruleset.write(stream, buffer_size=buffer_size)
+                self.assertEqual(stream.getvalue(), str(self.ruleset))
+
+    def test_write_persistent(self):
+        stream = io.StringIO()
+        self.ruleset.freeze().write(stream)
+        self.assertEqual(stream.getvalue(), str(self.ruleset))
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit() * 2
+        feature = Terminal('x')
+        for _ in range(depth):
+            feature = Group(Concat([feature]))
+        rule = Rule(NonTerminal('a'), [Concat([feature])])
+
+        self.assertEqual(str(rule), '/a/ -> ' + '(' * depth + 'x' + ')' * depth + ' ')
+        stream = io.StringIO()
+        Ruleset([rule]).write(stream)
+        self.assertEqual(stream.getvalue(), str(rule))
+
+    def test_overridden_str(self):
+        class Shouting(Terminal):
+            __slots__ = ()
+
+            def __str__(self):
+                return self.subject.upper()
+
+        class Loud(Group):
+            __slots__ = ()
+
+            def __str__(self):
+                return 'LOUD'
+
+        rule = Rule(NonTerminal('a'), [Concat([Shouting('b'), Loud(Concat([Terminal('c')]))])])
+        self.assertEqual(str(rule), '/a/ -> B LOUD ')
+
+    def test_definition_list(self):
+        definitions = DefinitionList([Sequence([Terminal('a'), Terminal('b')]), Sequence([Terminal('c')])],
+                                     alternation='/')
+        self.assertEqual(str(definitions), 'a b / c')
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+
+class TestImports(TestCase):
+
+    def loaded(self, statement):
+        """ The lark and mlangpy modules loaded by running statement in a new interpreter. """
+        code = f'{statement}\nimport sys\nprint(" ".join(m for m in sys.modules if m.split(".")[0] in ("lark", "mlangpy")))'
+        return set(subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True,
+                                  universal_newlines=True).stdout.split())
+
+    def test_grammar(self):
+        self.assertEqual(self.loaded('import mlangpy.grammar'), {'mlangpy', 'mlangpy.grammar'})
+
+    def test_metalanguage(self):
+        self.assertEqual(self.loaded('import mlangpy.metalanguages.ABNF'),
+                         {'mlangpy', 'mlangpy.grammar', 'mlangpy.metalanguages', 'mlangpy.metalanguages.ABNF',
+                          'mlangpy.metalanguages.Metalanguage'})
+
+    def test_metalanguage_exports(self):
+        import mlangpy.grammar
+        import mlangpy.metalanguages
+        self.assertIn('EBNF', mlangpy.metalanguages.__all__)
+        self.assertIn('RBNFObject', mlangpy.metalanguages.__all__)
+        self.assertNotIn('Rule', mlangpy.metalanguages.__all__)
+        # Classes from mlangpy.grammar can still be got from here, but not what it imports
+        self.assertIs(mlangpy.metalanguages.Rule, mlangpy.grammar.Rule)
+        for name in ('copy', 'insort'):
+            with self.assertRaises(AttributeError):
+                getattr(mlangpy.metalanguages, name)
+
+    def test_metaparsers(self):
+        loaded = self.loaded('from mlangpy.metaparsers import RuleError')
+        self.assertFalse({'lark', 'mlangpy.builders', 'mlangpy.detection', 'mlangpy.splitting'} & loaded)
+
+        # They're imported once they're needed
+        loaded = self.loaded('from mlangpy.metaparsers import parse_any\nparse_any("<a> ::= b", parser="lalr")')
+        self.assertLessEqual({'lark', 'mlangpy.builders', 'mlangpy.detection'}, loaded)
+        self.assertIn('BuildABNF', self.loaded('from mlangpy.metaparsers import BuildABNF\nprint(BuildABNF.__name__)'))
@@ -0,0 +1,126 @@
+from random import Random
+from unittest import TestCase
+from lark.exceptions import UnexpectedEOF, UnexpectedInput
+from mlangpy.incremental import ParseSession
+from mlangpy.metaparsers import parse_ABNF, parse_BNF, parse_EBNF, parse_RBNF
+
+
+class TestParseSession(TestCase):
+
+    def setUp(self):
+        self.ebnf = ''.join(f"r{i} = 'x', r{i + 1} ;\n" for i in range(20))
+
+    def assertParsed(self, session, parse_method, parser='earley'):
+        self.assertEqual([str(rule) for rule in session.ruleset.rules],
+                         [str(rule) for rule in parse_method(session.text, parser=parser).ruleset.rules])
+
+    def edit(self, session, old, new):
+        offset = session.text.index(old)
+        return session.edit(offset, len(old), new)
+
+    def test_only_edited_rules_change(self):
+        session = ParseSession(self.ebnf, 'ebnf')
+        rules = list(session.ruleset.rules)
+
+        new_rules = self.edit(session, 'r10 =', 's10 =')
+        self.assertEqual([str(rule) for rule in new_rules], ["r9 = 'x' r10 ;", "s10 = 'x' r11 ;"])
+        self.assertParsed(session, parse_EBNF)
+
+        unchanged = [i for i, rule in enumerate(session.ruleset.rules) if rule is rules[i]]
+        self.assertEqual(unchanged, [i for i in range(20) if i not in (9, 10)])
+
+    def test_edits_across_rules(self):
+        session = ParseSession(self.ebnf, 'ebnf', parser='lalr')
+        # Join two rules together, split them apart again, and comment out the last one
+        self.edit(session, " ;\nr5 = 'x', ", ', ')
+        self.assertEqual(len(session.ruleset.rules), 19)
+        self.edit(session, "r5, r6", "r5 ;\nr5 = 'x', r6")
+        self.assertEqual(len(session.ruleset.rules), 20)
+        self.edit(session, "r19 = 'x', r20 ;", '(* r19 *)')
+        self.assertEqual(len(session.ruleset.rules), 19)
+        self.assertParsed(session, parse_EBNF, parser='lalr')
+
+    def test_rule_starts(self):
+        session = ParseSession('<a> ::= b\n<c> ::= d\n<e> ::= f\n', 'bnf')
+        # Removing '::=' joins a rule onto the one before
+        self.edit(session, '<c> ::=', '<c>')
+        self.assertParsed(session, parse_BNF)
+        self.assertEqual(len(session.ruleset.rules), 2)
+
+        session = ParseSession('a = b\nc = d\ne = f\n', 'abnf')
+        # Indenting a rule makes it a continuation of the one before
+        self.edit(session, 'c = d', ' c d')
+        self.edit(session, 'e = f\n', 'e = f\ng = h\n')
+        self.assertParsed(session, parse_ABNF)
+        self.assertEqual(len(session.ruleset.rules), 3)
+
+    def test_many_edits(self):
+        # Edits back and forth through the text, adding and removing rules, so spans move both ways past the last edit
+        random = Random(5)
+        session = ParseSession(self.ebnf, 'ebnf', parser='lalr')
+        for i in range(200):
+            rule = random.randrange(len(session.ruleset.rules))
+            offset = session.text.index(f'{session.ruleset.rules[rule].left} =')
+            choice = random.randrange(3)
+            if choice == 0:
+                session.edit(offset, 0, f"n{i} = 'y' ;\n")
+            elif choice == 1 and len(session.ruleset.rules) > 5:
+                session.edit(offset, session.text.index(';', offset) + 2 - offset, '')
+            else:
+                session.edit(offset, 0, 'm')
+            self.assertParsed(session, parse_EBNF, parser='lalr')
+
+    def test_error(self):
+        session = ParseSession(self.ebnf, 'ebnf')
+        rules = list(session.ruleset.rules)
+        with self.assertRaises(UnexpectedInput) as error:
+            self.edit(session, 'r3 =', 'r3 = =')
+        self.assertEqual((error.exception.line, error.exception.column), (4, 6))
+
+        # The session is left as it was
+        self.assertEqual(session.text, self.ebnf)
+        self.assertEqual(session.ruleset.rules, rules)
+
+        # Earley reports a rule that stops short as the end of the input, which isn't an UnexpectedInput
+        with self.assertRaises(UnexpectedEOF):
+            self.edit(session, "r19 = 'x', r20 ;", "r19 = 'x',")
+        self.assertEqual(session.text, self.ebnf)
+
+        # Columns are counted from the last newline, even when it's spans before the one with the error
+        session = ParseSession("a = 'x' ; b = 'y' ;\nc = 'z' ; d = 'w' ;\n", 'ebnf')
+        with self.assertRaises(UnexpectedInput) as error:
+            self.edit(session, 'd =', 'd = =')
+        self.assertEqual((error.exception.line, error.exception.column), (2, 15))
+
+    def test_rejects_as_whole(self):
+        # Grammars whose rules each parse on their own, though the whole grammar doesn't (or the other way round)
+        parse_methods = {'bnf': parse_BNF, 'ebnf': parse_EBNF, 'abnf': parse_ABNF, 'rbnf': parse_RBNF}
+        cases = [('bnf', '\t<a> ::= b'), ('rbnf', '\t<a> ::= <b>'), ('ebnf', 'a = b ; (* c *) d = e ;'),
+                 ('ebnf', 'a = b ; (* c'), ('abnf', 'a = b\n;\nc = d\n'), ('abnf', '; a\tb\nc = d\n')]
+        for metalanguage, text in cases:
+            for parser in ('earley', 'lalr'):
+                with self.subTest(metalanguage=metalanguage, text=text, parser=parser):
+                    try:
+                        expected = [str(rule) for rule in parse_methods[metalanguage](text, parser=parser).ruleset]
+                    except (UnexpectedInput, UnexpectedEOF):
+                        expected = None
+                    try:
+                        rules = [str(rule) for rule in ParseSession(text, metalanguage, parser=parser).ruleset]
+                    except (UnexpectedInput, UnexpectedEOF):
+                        rules = None
+                    self.assertEqual(rules, expected)
+
+        # Edits that join rules with a comment, or leave one unclosed
+        session = ParseSession(self.ebnf, 'ebnf')
+        for old, new in [('r3 = ', '(* c *) r3 = '), (" ;\nr19 = 'x', r20 ;", ' ; (* c')]:
+            with self.assertRaises((UnexpectedInput, UnexpectedEOF)):
+                self.edit(session, old, new)
+        self.assertEqual(session.text, self.ebnf)
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            ParseSession('', 'xbnf')
+        with self.assertRaises(ValueError):
+            ParseSession('', 'bnf', parser='earley', fused=True)
+        with self.assertRaises(ValueError):
+            ParseSession('<a> ::= b', 'bnf').edit(5, 10, '')
@@ -1,6 +1,13 @@
+import os
+import pickle
+import shutil
+import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 from mlangpy.grammar import *
 from mlangpy.metalanguages import *
+from mlangpy.metalanguages.Metalanguage import _umask
+from mlangpy.metaparsers import parse_RBNF
 
 class TestMetalanguage(TestCase):
 
@@ -28,4 +35,325 @@ class TestMetalanguage(TestCase):
         r = self.ml.remove_groups_from(self.ml.ruleset[1])
         self.assertEqual(len(r), 1)
         self.assertEqual(r[0].left[0], NonTerminal('grp 0'))
-        self.assertEqual(r[0].right[0][0], Terminal('a'))
\ No newline at end of file
+        self.assertEqual(r[0].right[0][0], Terminal('a'))
+
+    def test_remove_replaces_rule(self):
+        rule = self.ml.ruleset[0]
+        self.ml.remove_optionals(rule)
+        # The rule passed in is left as it was, and a changed copy takes its place
+        self.assertIsInstance(rule.right[0][0], Optional)
+        self.assertIsNot(self.ml.ruleset[0], rule)
+        self.assertEqual(self.ml.ruleset[0].right[0][0], NonTerminal('op 0'))
+        self.assertEqual(len(self.ml.ruleset), 3)
+
+        # The rule made for an optional is used for the same optional elsewhere
+        self.ml.ruleset += Rule(Concat([NonTerminal('C')]), DefList([Concat([Optional(Concat([Terminal('a')]))])]))
+        self.ml.remove_optionals(self.ml.ruleset[3])
+        self.assertEqual(self.ml.ruleset[3].right[0][0], NonTerminal('op 0'))
+        self.assertEqual(len(self.ml.ruleset), 4)
+
+    def test_remove_from_rule_not_in_ruleset(self):
+        rule = Rule(Concat([NonTerminal('B')]), DefList([Concat([Repetition(Concat([Terminal('b')]))])]))
+        self.ml.remove_repetitions(rule)
+        self.assertEqual(rule.right[0][0], NonTerminal('rep 0'))
+
+class TestCopyOnWrite(TestCase):
+
+    def setUp(self):
+        self.ruleset = Ruleset([
+            Rule(NonTerminal('a'), [Concat([NonTerminal('b'), Optional([Terminal('c')])]), Concat([Terminal('d')])]),
+            Rule(NonTerminal('b'), [Concat([Group([Terminal('d')])])]),
+            Rule(NonTerminal('c'), [Concat([Terminal('d')])])
+        ])
+        self.original = str(self.ruleset)
+
+    def test_rules_shared(self):
+        ml = Metalanguage(self.ruleset)
+        for rule, original in zip(ml.ruleset, self.ruleset):
+            self.assertIs(rule, original)
+
+    def test_normalise(self):
+        ml = Metalanguage(self.ruleset)
+        ml.syntax[NonTerminal] = BNFNonTerminal
+        ml.syntax[Rule] = BNFRule
+        ml.normalise()
+        self.assertEqual(str(ml.ruleset).splitlines()[0], '<a> ::= <b> [c] | d ')
+        self.assertEqual(str(self.ruleset), self.original)
+
+    def test_only_changed_rules_copied(self):
+        ml = Metalanguage(self.ruleset)
+        ml.remove_groups_from(ml.ruleset[1])
+        self.assertEqual(str(ml.ruleset[1]), '/b/ -> /c/ ')
+        self.assertIsNot(ml.ruleset[1], self.ruleset[1])
+        self.assertIs(ml.ruleset[0], self.ruleset[0])
+        self.assertIs(ml.ruleset[2], self.ruleset[2])
+        self.assertEqual(str(self.ruleset), self.original)
+
+    def test_adding_rules(self):
+        ml = Metalanguage(self.ruleset)
+        ml.ruleset += Rule(NonTerminal('e'), [Concat([Terminal('f')])])
+        ml.ruleset.rules.append(Rule(NonTerminal('g'), [Concat([Terminal('h')])]))
+        self.assertEqual(len(ml.ruleset), 5)
+        self.assertEqual(len(self.ruleset), 3)
+
+    def test_rules_got_before_copy(self):
+        rules = self.ruleset.rules
+        ml = Metalanguage(self.ruleset)
+        rules.append(Rule(NonTerminal('e'), [Concat([Terminal('f')])]))
+        self.assertEqual(len(self.ruleset), 4)
+        self.assertEqual(len(ml.ruleset), 3)
+
+        # Changing the copy's list doesn't change the one that was handed out
+        ml.ruleset.rules.pop()
+        self.assertEqual(len(rules), 4)
+
+
+class TestNormalise(TestCase):
+
+    def setUp(self):
+        self.ruleset = Ruleset([
+            Rule(NonTerminal('a'), [Concat([NonTerminal('b'), Optional([Terminal('c')])]), Concat([Terminal('d')])]),
+            Rule(NonTerminal('b'), [Concat([Group([EBNFTerminal('d')])])])
+        ])
+
+    def test_most_specific_class(self):
+        ml = Metalanguage(self.ruleset)
+        ml.syntax[Terminal] = BNFTerminal
+        ml.syntax[EBNFTerminal] = ABNFTerminal
+        ml.normalise()
+        self.assertIsInstance(ml.ruleset[0].right[0][1].subject[0], BNFTerminal)
+        self.assertIsInstance(ml.ruleset[1].right[0][0].subject[0], ABNFTerminal)
+
+    def test_cache_invalidated(self):
+        changes = [
+            lambda syntax: syntax.__setitem__(Terminal, BNFTerminal),
+            lambda syntax: syntax.update({Terminal: BNFTerminal}),
+            lambda syntax: syntax.__ior__({Terminal: BNFTerminal}),
+            lambda syntax: syntax.pop(Terminal),
+            lambda syntax: syntax.__delitem__(Terminal),
+            lambda syntax: syntax.popitem(),
+            lambda syntax: syntax.clear(),
+        ]
+        for change in changes:
+            ml = Metalanguage(self.ruleset)
+            syntax = ml.syntax
+            self.assertIs(syntax.constructor(Terminal), Terminal)
+            version = syntax.version
+            with self.subTest(change=change):
+                change(syntax)
+                self.assertGreater(syntax.version, version)
+                self.assertIs(syntax.constructor(Terminal), syntax.get(Terminal))
+
+        syntax = Metalanguage(self.ruleset).syntax
+        del syntax[Terminal]
+        syntax.setdefault(Terminal, BNFTerminal)
+        self.assertIs(syntax.constructor(EBNFTerminal), BNFTerminal)
+
+    def test_pickle(self):
+        ml = Metalanguage(self.ruleset)
+        ml.syntax[Terminal] = BNFTerminal
+        ml.syntax.constructor(Terminal)
+        loaded = pickle.loads(pickle.dumps(ml))
+        self.assertEqual(loaded.syntax, ml.syntax)
+        self.assertEqual(loaded.syntax.version, ml.syntax.version)
+        self.assertIs(loaded.syntax.constructor(EBNFTerminal), BNFTerminal)
+
+    def test_unchanged_reused(self):
+        ml = Metalanguage(self.ruleset)
+        ml.normalise()
+        # Rule makes its left-hand side a Sequence, which has to become a Concat, but the rest is already normal
+        self.assertIsNot(ml.ruleset[0], self.ruleset[0])
+        self.assertIs(ml.ruleset[0].right, self.ruleset[0].right)
+        # EBNFTerminal('d') is rebuilt as a Terminal, and so is everything containing it
+        self.assertEqual(str(ml.ruleset[1]), '/b/ -> (d) ')
+        self.assertIsNot(ml.ruleset[1], self.ruleset[1])
+
+        rules = list(ml.ruleset)
+        ml.normalise()
+        for rule, before in zip(ml.ruleset, rules):
+            self.assertIs(rule, before)
+
+    def test_bounds_reset(self):
+        ml = Metalanguage(Ruleset([Rule(NonTerminal('a'), [Concat([Terminal('b', left_bound='<'), Terminal('c')])])]))
+        ml.normalise()
+        self.assertEqual(str(ml.ruleset[0]), '/a/ -> b c ')
+
+
+class TestIncrementalNormalise(TestCase):
+
+    def setUp(self):
+        self.ml = Metalanguage(Ruleset([
+            Rule(NonTerminal('a'), [Concat([NonTerminal('b'), Optional([Terminal('c')])])]),
+            Rule(NonTerminal('b'), [Concat([NonTerminal('d')])]),
+            Rule(NonTerminal('d'), [Concat([Group([Terminal('e')])])])
+        ]))
+        self.ml.normalise()
+        self.rules = list(self.ml.ruleset)
+
+    def test_syntax_change(self):
+        self.ml.syntax[Terminal] = BNFTerminal
+        self.ml.normalise()
+        self.assertIsNot(self.ml.ruleset[0], self.rules[0])
+        self.assertIs(self.ml.ruleset[1], self.rules[1])
+        self.assertIsNot(self.ml.ruleset[2], self.rules[2])
+        self.assertIsInstance(self.ml.ruleset[2].right[0][0].subject[0], BNFTerminal)
+
+    def test_unused_key(self):
+        # There aren't any EBNFTerminals, so nothing needs looking at again
+        self.ml.syntax[EBNFTerminal] = BNFTerminal
+        self.ml.normalise()
+        for rule, before in zip(self.ml.ruleset, self.rules):
+            self.assertIs(rule, before)
+
+    def test_removed_key(self):
+        del self.ml.syntax[Group]
+        self.ml.syntax[Terminal] = BNFTerminal
+        self.ml.normalise()
+        # Without a constructor, the Group isn't looked inside
+        self.assertIs(self.ml.ruleset[2], self.rules[2])
+        self.assertIsInstance(self.ml.ruleset[0].right[0][1].subject[0], BNFTerminal)
+
+    def test_rule_form_change(self):
+        self.ml.syntax[Rule] = BNFRule
+        self.ml.normalise()
+        for rule in self.ml.ruleset:
+            self.assertEqual(rule.prod, '::=')
+
+    def test_replaced_and_added_rules(self):
+        self.ml.ruleset[1] = Rule(NonTerminal('b'), [Concat([EBNFTerminal('f')])])
+        self.ml.ruleset += Rule(NonTerminal('g'), [Concat([EBNFTerminal('h')])])
+        self.ml.normalise()
+        self.assertEqual(str(self.ml.ruleset[1]), '/b/ -> f ')
+        self.assertEqual(self.ml.ruleset[3].right[0][0].__class__, Terminal)
+        self.assertIs(self.ml.ruleset[0], self.rules[0])
+
+    def test_mark_changed(self):
+        rule = self.ml.ruleset[1]
+        rule.right[0][0] = EBNFTerminal('f')
+        self.ml.normalise()
+        self.assertIsInstance(self.ml.ruleset[1].right[0][0], EBNFTerminal)
+
+        self.ml.mark_changed(rule)
+        self.ml.normalise()
+        self.assertEqual(self.ml.ruleset[1].right[0][0].__class__, Terminal)
+
+    def test_matches_full_normalise(self):
+        self.ml.syntax[Terminal] = EBNFTerminal
+        self.ml.syntax[NonTerminal] = BNFNonTerminal
+        self.ml.normalise()
+        fresh = Metalanguage(Ruleset(self.rules))
+        fresh.syntax = self.ml.syntax
+        fresh.normalise()
+        self.assertEqual(str(self.ml.ruleset), str(fresh.ruleset))
+
+
+class TestParallelNormalise(TestCase):
+
+    @patch('os.cpu_count', return_value=2)
+    def test_same_as_serial(self, cpu_count):
+        ruleset = parse_RBNF(open('../sample_grammars/rbnfs/pathmessage.txt').read() * 3, parser='lalr').ruleset
+        for metalanguage in (BNF, ABNF, RBNF):
+            with self.subTest(metalanguage=metalanguage.__name__):
+                serial = Metalanguage(ruleset)
+                serial.syntax = metalanguage(Ruleset([])).syntax
+                serial.normalise()
+                parallel = Metalanguage(ruleset)
+                parallel.syntax = metalanguage(Ruleset([])).syntax
+                parallel.normalise(workers=2)
+                self.assertEqual(str(parallel.ruleset), str(serial.ruleset))
+                self.assertEqual([rule.__class__ for rule in parallel.ruleset],
+                                 [rule.__class__ for rule in serial.ruleset])
+
+                # Both know that nothing needs doing again
+                rules = list(parallel.ruleset)
+                parallel.normalise(workers=2)
+                for rule, before in zip(parallel.ruleset, rules):
+                    self.assertIs(rule, before)
+
+    @patch('os.cpu_count', return_value=1)
+    def test_one_cpu(self, cpu_count):
+        ruleset = parse_RBNF(open('../sample_grammars/rbnfs/pathmessage.txt').read(), parser='lalr').ruleset
+        serial = BNF(ruleset)
+        serial.normalise()
+        parallel = BNF(ruleset)
+        # Without a second CPU, the rules are normalised in this process
+        with patch('multiprocessing.Pool', side_effect=AssertionError):
+            parallel.normalise(workers=2)
+        self.assertEqual(str(parallel.ruleset), str(serial.ruleset))
+
+
+class TestSlots(TestCase):
+
+    def test_no_instance_dict(self):
+        t = Terminal('a')
+        features = [
+            ABNFChar('x', 41), ABNFCharRange(ABNFChar('x', 41), ABNFChar('x', 42)), ABNFRepetition(t, 1, 2),
+            ABNFTerminal('a'),
+            ABNFRule(ABNFNonTerminal('a'), [Concat([t])]), EBNFFixedRepetition(3, t), EBNFSpecialSequence(Concat([t])),
+            RBNFObject('a'), RBNFConstruct('a'), RBNFMessage('a'), RBNFRepetition(t), BNFNonTerminal('a')
+        ]
+        for feature in features:
+            with self.subTest(cls=feature.__class__.__name__):
+                self.assertFalse(hasattr(feature, '__dict__'))
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'grammar.txt')
+        self.ml = Metalanguage(Ruleset([
+            Rule(NonTerminal('a'), [Concat([Terminal('b'), NonTerminal('c')])]),
+            Rule(NonTerminal('c'), [Concat([Terminal('d')]), Concat([Terminal('e')])])
+        ]))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_export_ruleset(self):
+        for atomic in (False, True):
+            with self.subTest(atomic=atomic):
+                self.ml.export_ruleset(self.path, atomic=atomic)
+                with open(self.path) as f:
+                    self.assertEqual(f.read(), str(self.ml.ruleset))
+                self.assertEqual(os.listdir(self.directory), ['grammar.txt'])
+
+    def test_atomic_failure_leaves_file(self):
+        with open(self.path, 'w') as f:
+            f.write('old')
+
+        class Broken(Terminal):
+            __slots__ = ()
+
+            def __str__(self):
+                raise RuntimeError()
+
+        self.ml.ruleset += Rule(NonTerminal('f'), [Concat([Broken('g')])])
+        with self.assertRaises(RuntimeError):
+            self.ml.export_ruleset(self.path, atomic=True)
+
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'old')
+        self.assertEqual(os.listdir(self.directory), ['grammar.txt'])
+
+    def test_atomic_permissions(self):
+        # New files get the permissions open() would give them, and existing files keep theirs
+        plain = os.path.join(self.directory, 'plain.txt')
+        self.ml.export_ruleset(plain)
+        self.ml.export_ruleset(self.path, atomic=True)
+        self.assertEqual(os.stat(self.path).st_mode, os.stat(plain).st_mode)
+        os.chmod(self.path, 0o640)
+        self.ml.export_ruleset(self.path, atomic=True)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+
+        # Without /proc, the umask is found from a new file instead, which only shows the bits that affect files
+        umask = _umask(os.path.join(self.directory, 'probe'))
+        with patch('mlangpy.metalanguages.Metalanguage.open', side_effect=OSError, create=True):
+            self.assertEqual(_umask(os.path.join(self.directory, 'probe')), umask & 0o666)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['grammar.txt', 'plain.txt'])
+
+    def test_export_lark_file(self):
+        ml = EBNF(Ruleset([]))
+        ml.export_lark_file(self.path, atomic=True)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), ml.build_lark_grammar())
@@ -0,0 +1,63 @@
+import sys
+from unittest import TestCase
+from mlangpy.binary import dumps
+from mlangpy.grammar import *
+from mlangpy.metaparsers import parse_ABNF, parse_EBNF
+from mlangpy.packed import pack
+
+
+class TestPackedGrammar(TestCase):
+
+    def setUp(self):
+        self.ruleset = Ruleset([
+            Rule(NonTerminal('a'), [Concat([Terminal('b'), Optional([NonTerminal('c')])]), Concat([NonTerminal('c')])]),
+            Rule(NonTerminal('c'), [Concat([Except(Terminal('d'), Terminal('e'))])])
+        ])
+        self.packed = pack(self.ruleset)
+
+    def test_round_trip(self):
+        abnf = parse_ABNF(open('../sample_grammars/abnfs/abnf_self_define.txt').read(), parser='lalr').ruleset
+        ebnf = parse_EBNF("a = 'b', [c], {d | 3 * e} ;\nc = 'x' ;").ruleset
+        for ruleset in (self.ruleset, abnf, ebnf):
+            with self.subTest(ruleset=str(ruleset[0])):
+                unpacked = pack(ruleset).to_ruleset()
+                self.assertEqual(unpacked, ruleset)
+                # Covers every class and field, boundaries and all
+                self.assertEqual(dumps(unpacked), dumps(ruleset))
+
+    def test_layout(self):
+        p = self.packed
+        self.assertEqual(len(p), 2)
+        # Rules, then the left- and right-hand side of each, then what's in those, and so on
+        self.assertEqual([p.kind(n) for n in range(6)], [Rule, Rule, Sequence, DefList, Sequence, DefList])
+        self.assertEqual(list(p.children(0)), [2, 3])
+        self.assertEqual([p.kind(n) for n in p.children(3)], [Concat, Concat])
+        self.assertEqual(p.node_count, len(list(p.descendants(0))) + len(list(p.descendants(1))))
+
+    def test_symbols(self):
+        p = self.packed
+        c = p.find_symbol(NonTerminal, 'c')
+        self.assertEqual(p.symbol_table[c], (NonTerminal, 'c'))
+        self.assertEqual(p.symbols_in(0).count(c), 2)
+        self.assertEqual(p.find_symbol(Terminal, 'c'), -1)
+        self.assertEqual(sum(1 for s in p.symbols if s == c), 3)
+
+    def test_rules(self):
+        self.assertEqual(self.packed.rule(1), self.ruleset[1])
+        self.assertEqual(str(self.packed.rule(-1)), str(self.ruleset[1]))
+        self.assertIsNot(self.packed.rule(0), self.packed.rule(0))
+        with self.assertRaises(IndexError):
+            self.packed.rule(2)
+
+    def test_deep_nesting(self):
+        feature = Terminal('x')
+        for _ in range(sys.getrecursionlimit() * 2):
+            feature = Group(Concat([feature]))
+        ruleset = Ruleset([Rule(NonTerminal('a'), [Concat([feature])])])
+        p = pack(ruleset)
+        self.assertEqual(str(p.to_ruleset()), str(ruleset))
+        self.assertEqual(str(p.rule(0)), str(ruleset[0]))
+
+    def test_unpackable(self):
+        with self.assertRaises(ValueError):
+            pack(Ruleset([Rule(NonTerminal('a'), [Concat(['b'])])]))
@@ -1,6 +1,13 @@
+import io
 import os
+import tempfile
+from random import Random
 from unittest import TestCase
+from unittest.mock import patch
+from lark.exceptions import UnexpectedEOF, UnexpectedInput
 from mlangpy.metaparsers import *
+from mlangpy.splitting import split_rules, iter_rules, SPLITTERS
+from mlangpy.detection import detect_metalanguage
 
 def parse_all(grammar_directory, parse_method):
     for filename in os.listdir(grammar_directory):
@@ -158,4 +165,398 @@ class TestGrammars(TestCase):
         validate_EBNF_faithful(open(os.path.join(self.ebnfs, 'ebnf_self_define_no_comments.txt')).read())
 
     def test_ebnf_ebnf_testing(self):
-        validate_EBNF_faithful(open(os.path.join(self.ebnfs, 'testing.txt')).read())
\ No newline at end of file
+        validate_EBNF_faithful(open(os.path.join(self.ebnfs, 'testing.txt')).read())
+
+class TestParserCache(TestCase):
+
+    def setUp(self):
+        clear_parser_cache()
+
+    def test_same_parser_reused(self):
+        self.assertIs(get_parser('abnf'), get_parser('abnf'))
+
+    def test_options_are_part_of_key(self):
+        self.assertIsNot(get_parser('bnf'), get_parser('bnf', propagate_positions=True))
+
+    def test_unknown_grammar(self):
+        with self.assertRaises(ValueError):
+            get_parser('nope')
+
+    def test_warm_and_clear(self):
+        warm_parsers(['bnf', 'rbnf'])
+        bnf = get_parser('bnf')
+        clear_parser_cache()
+        self.assertIsNot(bnf, get_parser('bnf'))
+
+    def test_threads_share_parser(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(8) as pool:
+            parsers = list(pool.map(lambda _: get_parser('ebnf'), range(16)))
+        self.assertTrue(all(p is parsers[0] for p in parsers))
+
+
+class TestDiskCache(TestCase):
+
+    def setUp(self):
+        self.old_cache_dir = get_cache_dir()
+        self.tmp = tempfile.TemporaryDirectory()
+        set_cache_dir(self.tmp.name)
+        clear_parser_cache()
+
+    def tearDown(self):
+        set_cache_dir(os.path.dirname(self.old_cache_dir) if self.old_cache_dir else None)
+        clear_parser_cache()
+        self.tmp.cleanup()
+
+    def cache_files(self):
+        return os.listdir(get_cache_dir()) if os.path.isdir(get_cache_dir()) else []
+
+    def test_lalr_parser_saved(self):
+        get_parser('abnf_lalr', parser='lalr')
+        self.assertEqual(len(self.cache_files()), 1)
+
+    def test_earley_parser_not_saved(self):
+        get_parser('abnf')
+        self.assertEqual(self.cache_files(), [])
+
+    def test_loaded_parser_parses(self):
+        text = open('../sample_grammars/abnfs/core_abnf.txt').read()
+        expected = str(parse_ABNF(text, parser='lalr').ruleset)
+        clear_parser_cache()
+        self.assertEqual(str(parse_ABNF(text, parser='lalr').ruleset), expected)
+
+    def test_corrupt_entry_rebuilt(self):
+        get_parser('rbnf_lalr', parser='lalr')
+        path = os.path.join(get_cache_dir(), self.cache_files()[0])
+        with open(path, 'wb') as f:
+            f.write(b'not a parser')
+        clear_parser_cache()
+
+        parse_RBNF('<a> ::= <B>', parser='lalr')
+        with open(path, 'rb') as f:
+            self.assertNotEqual(f.read(), b'not a parser')
+
+    def test_misplaced_entry_ignored(self):
+        get_parser('rbnf_lalr', parser='lalr')
+        rbnf_file = self.cache_files()[0]
+        get_parser('bnf_lalr', parser='lalr')
+        bnf_file = [f for f in self.cache_files() if f != rbnf_file][0]
+        os.replace(os.path.join(get_cache_dir(), rbnf_file), os.path.join(get_cache_dir(), bnf_file))
+        clear_parser_cache()
+
+        self.assertEqual(len(parse_BNF('<a> ::= b', parser='lalr').ruleset), 1)
+
+    def test_directory_private(self):
+        get_parser('abnf_lalr', parser='lalr')
+        for path in (self.tmp.name, get_cache_dir()):
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+
+    def test_shared_directory_not_trusted(self):
+        get_parser('rbnf_lalr', parser='lalr')
+        path = os.path.join(get_cache_dir(), self.cache_files()[0])
+        os.chmod(get_cache_dir(), 0o777)
+        clear_parser_cache()
+
+        # Anyone could have written the entry, so it's not loaded, or replaced
+        with patch('lark.Lark.load') as load:
+            get_parser('rbnf_lalr', parser='lalr')
+        load.assert_not_called()
+        self.assertEqual(os.listdir(get_cache_dir()), [os.path.basename(path)])
+        os.chmod(get_cache_dir(), 0o700)
+
+    def test_other_users_entry_not_trusted(self):
+        get_parser('rbnf_lalr', parser='lalr')
+        clear_parser_cache()
+        with patch('os.getuid', return_value=os.getuid() + 1), patch('lark.Lark.load') as load:
+            get_parser('rbnf_lalr', parser='lalr')
+        load.assert_not_called()
+
+    def test_disabled(self):
+        set_cache_dir(None)
+        get_parser('abnf_lalr', parser='lalr')
+        self.assertIsNone(get_cache_dir())
+
+    def test_clear_disk(self):
+        get_parser('abnf_lalr', parser='lalr')
+        clear_parser_cache(disk=True)
+        self.assertEqual(self.cache_files(), [])
+
+
+class TestParserModes(TestCase):
+
+    def setUp(self):
+        self.samples = [
+            ('../sample_grammars/abnfs', parse_ABNF),
+            ('../sample_grammars/bnfs', parse_BNF),
+            ('../sample_grammars/ebnfs', parse_EBNF),
+            ('../sample_grammars/rbnfs', parse_RBNF)
+        ]
+
+    def assertSameRuleset(self, grammar_string, parse_method):
+        earley = parse_method(grammar_string, parser='earley')
+        for parser in ('lalr', 'auto'):
+            for fused in (False, True):
+                other = parse_method(grammar_string, parser=parser, fused=fused)
+                self.assertEqual(earley.__class__, other.__class__)
+                self.assertEqual(str(earley.ruleset), str(other.ruleset))
+
+    def test_samples(self):
+        for directory, parse_method in self.samples:
+            for filename in os.listdir(directory):
+                grammar_string = open(os.path.join(directory, filename)).read()
+                try:
+                    parse_method(grammar_string)
+                except UnexpectedInput:
+                    continue
+                with self.subTest(filename=filename):
+                    self.assertSameRuleset(grammar_string, parse_method)
+
+    def test_rule_boundaries(self):
+        self.assertSameRuleset('<a> ::= x y <b> ::= z', parse_BNF)
+        self.assertSameRuleset('<a> ::= <b> | c\n\n<b>\n::= d', parse_BNF)
+        self.assertSameRuleset('a = b\n   c\nd = e\nd =/ f ; comment\n', parse_ABNF)
+        self.assertSameRuleset('<a> ::= <b>... <c>\n<b> ::= <D>', parse_RBNF)
+
+    def test_rbnf_names(self):
+        # <A> and <AB> are ambiguous between messages, constructs and objects
+        self.assertSameRuleset('<a> ::= <A> <AB> <A_B> <Ab Cd> <a-b> <A B>', parse_RBNF)
+
+    def test_ebnf_features(self):
+        self.assertSameRuleset("a = 'x \"y\"', ? special ? | [b] - c | 3 * {d} | ;", parse_EBNF)
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            parse_BNF('<a> ::= b', parser='cyk')
+
+    def test_fused_needs_lalr(self):
+        with self.assertRaises(ValueError):
+            parse_BNF('<a> ::= b', parser='earley', fused=True)
+
+    def test_auto_reraises(self):
+        with self.assertRaises(UnexpectedInput):
+            parse_ABNF('= b\n', parser='auto')
+        with self.assertRaises(UnexpectedInput):
+            parse_ABNF('= b\n', parser='auto', fused=True)
+
+
+class TestInterning(TestCase):
+
+    def symbols(self, metalanguage):
+        return [term for rule in metalanguage.ruleset.rules for sequence in [rule.left] + list(rule.right)
+                for term in sequence.terms if isinstance(term, Symbol)]
+
+    def test_same_ruleset(self):
+        samples = [
+            ('a = b c / "x"\nb = c %x41 %x42\n', parse_ABNF),
+            ('<a> ::= <b> c | <b>\n<b> ::= c', parse_BNF),
+            ("a = b, 'x' | b, \"x\" ;\nb = a ;", parse_EBNF),
+            ('<a> ::= <b> <C> [<b>]\n<b> ::= <C>', parse_RBNF)
+        ]
+        for grammar_string, parse_method in samples:
+            for parser, fused in (('earley', False), ('lalr', True)):
+                with self.subTest(grammar_string=grammar_string, parser=parser):
+                    plain = parse_method(grammar_string, parser=parser, fused=fused)
+                    interned = parse_method(grammar_string, parser=parser, fused=fused, intern=True)
+                    self.assertEqual(str(plain.ruleset), str(interned.ruleset))
+                    self.assertEqual(plain.ruleset, interned.ruleset)
+
+    def test_symbols_shared(self):
+        grammar_string = '<a> ::= <b> c | <b> c\n<b> ::= c'
+        symbols = self.symbols(parse_BNF(grammar_string, intern=True))
+        self.assertEqual(len({id(symbol) for symbol in symbols}), 3)
+        symbols = self.symbols(parse_BNF(grammar_string))
+        self.assertEqual(len({id(symbol) for symbol in symbols}), len(symbols))
+
+    def test_quotes_kept_apart(self):
+        terms = self.symbols(parse_EBNF("a = 'x' | \"x\" ;", intern=True))[1:]
+        self.assertEqual([str(term) for term in terms], ["'x'", '"x"'])
+
+    def test_not_shared_between_parses(self):
+        a = self.symbols(parse_BNF('<a> ::= c', intern=True))
+        b = self.symbols(parse_BNF('<a> ::= c', intern=True))
+        self.assertIsNot(a[0], b[0])
+
+
+class TestStreaming(TestCase):
+
+    def setUp(self):
+        self.samples = [
+            ('../sample_grammars/abnfs', parse_ABNF, iter_parse_ABNF),
+            ('../sample_grammars/bnfs', parse_BNF, iter_parse_BNF),
+            ('../sample_grammars/ebnfs', parse_EBNF, iter_parse_EBNF),
+            ('../sample_grammars/rbnfs', parse_RBNF, iter_parse_RBNF)
+        ]
+
+    def test_samples(self):
+        for directory, parse_method, iter_method in self.samples:
+            for filename in os.listdir(directory):
+                grammar_string = open(os.path.join(directory, filename)).read()
+                try:
+                    expected = [str(rule) for rule in parse_method(grammar_string).ruleset.rules]
+                except UnexpectedInput:
+                    continue
+                # Small chunks make rule starts and comments straddle reads
+                for chunk_size in (1, 7, 65536):
+                    with self.subTest(filename=filename, chunk_size=chunk_size):
+                        rules = iter_method(io.StringIO(grammar_string), parser='auto', chunk_size=chunk_size)
+                        self.assertEqual([str(rule) for rule in rules], expected)
+
+    def test_split_positions(self):
+        text = '; header\n\na = b\n c\nd =/ e\n'
+        pieces = split_rules(text, 'abnf')
+        self.assertEqual([piece.text for piece in pieces], ['a = b\n c\n', 'd =/ e\n'])
+        self.assertEqual([(piece.line, piece.column) for piece in pieces], [(3, 1), (5, 1)])
+        for piece in pieces:
+            self.assertEqual(text[piece.offset:piece.end], piece.text)
+
+    def test_split_ebnf(self):
+        text = "(* a; *) a = 'x;y', ? ; ? ; b = (* (* ; *) *) c ;\n(* trailing *)"
+        for chunk_size in range(1, 8):
+            pieces = list(iter_rules(io.StringIO(text), 'ebnf', chunk_size))
+            self.assertEqual([piece.text for piece in pieces],
+                             ["(* a; *) a = 'x;y', ? ; ? ;", ' b = (* (* ; *) *) c ;'])
+
+    def test_split_chunked(self):
+        for metalanguage, rule in [('abnf', 'a = b\n'), ('bnf', '<a> ::= b\n'), ('ebnf', 'a = b;\n'),
+                                   ('rbnf', '<a> ::= <b>\n')]:
+            text = rule * 1000 + rule.rstrip()
+            expected = [piece.text for piece in split_rules(text, metalanguage)]
+            self.assertEqual(len(expected), 1001)
+            for chunk_size in (3, 100, 65536):
+                pieces = split_rules(text, metalanguage, chunk_size=chunk_size)
+                self.assertTrue([piece.text for piece in pieces] == expected)
+                self.assertTrue(all(text[piece.offset:piece.end] == piece.text for piece in pieces))
+
+    def test_splitter_holds_one_rule(self):
+        splitter = SPLITTERS['ebnf']()
+        pieces = splitter.feed('a = b;\n' * 1000 + 'c = ')
+        self.assertEqual(len(pieces), 1000)
+        # The rules found were dropped from the buffer, leaving the one still being read
+        self.assertEqual(splitter.buffer, '\nc = ')
+        # A rule is complete once the next one starts
+        self.assertEqual(splitter.feed('d;'), [])
+        self.assertEqual(splitter.feed('\ne')[0].text, '\nc = d;')
+
+    def test_rejects_as_whole(self):
+        # Grammars that split into pieces that each parse on their own, though the whole grammar doesn't (or the
+        # other way round)
+        cases = [
+            ('bnf', '\t<a> ::= b'), ('rbnf', '\t<a> ::= <b>'),
+            ('ebnf', 'a = b ; (* c *) d = e ;'), ('ebnf', "a = b ; (* it's *)"), ('ebnf', 'a = b ;\t'),
+            ('ebnf', 'a = b ; (* c'), ('ebnf', 'a = b ; (* c *)'),
+            ('abnf', 'a = b\n;\nc = d\n'), ('abnf', 'a = b ;\nc = d\n'), ('abnf', '; a\tb\nc = d\n'),
+            ('abnf', 'a = ";"\nc = d\n'),
+        ]
+        # And some made at random from the samples
+        random = Random(3)
+        for metalanguage, directory in [('bnf', 'bnfs'), ('ebnf', 'ebnfs'), ('abnf', 'abnfs'), ('rbnf', 'rbnfs')]:
+            directory = os.path.join('../sample_grammars', directory)
+            for filename in sorted(os.listdir(directory))[:3]:
+                text = open(os.path.join(directory, filename)).read()[:300]
+                for _ in range(3):
+                    i = random.randrange(len(text))
+                    cases.append((metalanguage, text[:i] + random.choice(' \t\n;(*)<>="') + text[i + 1:]))
+
+        for metalanguage, text in cases:
+            for parser in ('earley', 'lalr'):
+                with self.subTest(metalanguage=metalanguage, text=text, parser=parser):
+                    parse_method = globals()[f'parse_{metalanguage.upper()}']
+                    try:
+                        expected = [str(rule) for rule in parse_method(text, parser=parser).ruleset.rules]
+                    except (UnexpectedInput, UnexpectedEOF):
+                        expected = None
+
+                    iter_method = globals()[f'iter_parse_{metalanguage.upper()}']
+                    try:
+                        rules = [str(rule) for rule in iter_method(io.StringIO(text), parser=parser, chunk_size=5)]
+                    except (UnexpectedInput, UnexpectedEOF):
+                        rules = None
+                    self.assertEqual(rules, expected)
+
+                    parsed, errors = globals()[f'parse_{metalanguage.upper()}_recovering'](text, parser=parser)
+                    self.assertEqual(not errors, expected is not None)
+
+    def test_unknown_metalanguage(self):
+        with self.assertRaises(ValueError):
+            split_rules('a', 'xbnf')
+
+    def test_error_position(self):
+        grammar_string = '<a> ::= b\n<c> ::= d |\n  | ::= e'
+        with self.assertRaises(UnexpectedInput) as whole:
+            parse_BNF(grammar_string)
+        with self.assertRaises(UnexpectedInput) as streamed:
+            list(iter_parse_BNF(io.StringIO(grammar_string), chunk_size=4))
+        self.assertEqual((streamed.exception.line, streamed.exception.column),
+                         (whole.exception.line, whole.exception.column))
+
+
+class TestRecovery(TestCase):
+
+    def test_ebnf(self):
+        grammar_string = "a = 'x' ;\nb = = ;\nc = 'unclosed ;\nd = e ;\nf = (g ;\nh = i ;\nj = k"
+        for parser in PARSERS:
+            with self.subTest(parser=parser):
+                ebnf, errors = parse_EBNF_recovering(grammar_string, parser=parser)
+                self.assertIsInstance(ebnf, EBNF)
+                self.assertEqual([str(rule) for rule in ebnf.ruleset.rules], ["a = 'x' ;", 'd = e ;', 'h = i ;'])
+                self.assertEqual([error.line for error in errors], [2, 3, 5, 7])
+                self.assertEqual(errors[0].text, '\nb = = ;')
+
+        ebnf, errors = parse_EBNF_recovering(grammar_string)
+        self.assertEqual([(error.line, error.column) for error in errors], [(2, 5), (3, 5), (5, 8), (7, 6)])
+        self.assertEqual(str(errors[0]), "line 2, column 5: Unexpected character '='")
+
+    def test_all_errors(self):
+        bad = ''.join(f'<r{i}> ::= <a> | <b\n<s{i}> ::= c\n' for i in range(50))
+        bnf, errors = parse_BNF_recovering(bad, parser='lalr', fused=True)
+        self.assertEqual(len(bnf.ruleset.rules), 50)
+        self.assertEqual(len(errors), 50)
+        for i, error in enumerate(errors):
+            self.assertEqual(error.text, f'<r{i}> ::= <a> | <b\n')
+
+    def test_valid(self):
+        grammar_string = open('../sample_grammars/abnfs/core_abnf.txt').read()
+        abnf, errors = parse_ABNF_recovering(grammar_string)
+        self.assertEqual(errors, [])
+        self.assertEqual(str(abnf.ruleset), str(parse_ABNF(grammar_string).ruleset))
+
+
+class TestDetection(TestCase):
+
+    def setUp(self):
+        self.samples = [
+            ('../sample_grammars/abnfs', 'abnf'),
+            ('../sample_grammars/bnfs', 'bnf'),
+            ('../sample_grammars/ebnfs', 'ebnf'),
+            ('../sample_grammars/rbnfs', 'rbnf')
+        ]
+
+    def test_samples(self):
+        # These only use features that RBNF shares with BNF, so are equally valid as either
+        ambiguous = ('flow_desc1.txt', 'flow_desc2.txt')
+        for directory, metalanguage in self.samples:
+            for filename in os.listdir(directory):
+                if filename in ambiguous:
+                    continue
+                candidates = detect_metalanguage(open(os.path.join(directory, filename)).read())
+                with self.subTest(filename=filename):
+                    self.assertEqual(candidates[0].metalanguage, metalanguage)
+                    self.assertAlmostEqual(sum(candidate.confidence for candidate in candidates), 1)
+
+    def test_signatures(self):
+        self.assertEqual(detect_metalanguage('a = b\na =/ %x41\n')[0].metalanguage, 'abnf')
+        self.assertEqual(detect_metalanguage("a = 'b', c ;")[0].metalanguage, 'ebnf')
+        self.assertEqual(detect_metalanguage('<a> ::= b | <c>')[0].metalanguage, 'bnf')
+        self.assertEqual(detect_metalanguage('<a> ::= <B_C> [ <d> ... ]')[0].metalanguage, 'rbnf')
+
+    def test_nothing_detected(self):
+        candidates = detect_metalanguage('')
+        self.assertEqual([candidate.confidence for candidate in candidates], [0, 0, 0, 0])
+
+    def test_parse_any(self):
+        self.assertIsInstance(parse_any('a = b\na =/ %x41\n'), ABNF)
+        self.assertIsInstance(parse_any("a = 'b', c ;", parser='lalr'), EBNF)
+        self.assertIsInstance(parse_any('<a> ::= b | <c>'), BNF)
+        self.assertIsInstance(parse_any('<a> ::= <B_C> [ <d> ... ]'), RBNF)
+        with self.assertRaises(UnexpectedInput):
+            parse_any('<a> ::= b ;\nc = %x')